@@ -0,0 +1,203 @@
+import logging  # Detector failures
+import math  # Skip factor rounding
+import os  # Segment names
+import queue  # Hand-off of the frame being analysed
+import time  # Detection timing and event timestamps
+from threading import Lock, Thread
+
+import cv2  # Resizing, colour conversion and the DNN module
+
+from . import metadata  # Per-segment detection summaries
+from .keyframes import segment_start  # Segment start time from its filename
+from .config import ANALYTICS_SIZE, ANALYTICS_CPU_SHARE, ANALYTICS_MAX_SKIP, DETECTION_THRESHOLD
+
+# Detector class names folded into the labels the API filters on
+LABEL_GROUPS = {
+    'person': 'person',
+    'bicycle': 'vehicle', 'car': 'vehicle', 'motorbike': 'vehicle', 'motorcycle': 'vehicle',
+    'bus': 'vehicle', 'truck': 'vehicle',
+}
+# Class names of the 20-class MobileNet-SSD (Caffe/VOC) model, the usual small CPU detector
+VOC_LABELS = ['background', 'aeroplane', 'bicycle', 'bird', 'boat', 'bottle', 'bus', 'car', 'cat', 'chair', 'cow',
+              'diningtable', 'dog', 'horse', 'motorbike', 'person', 'pottedplant', 'sheep', 'sofa', 'train',
+              'tvmonitor']
+
+
+class StubDetector:
+    # No model needed: moving blobs become detections (tall → person, wide → vehicle). For CPU-only testing.
+    name = 'stub'
+
+    def __init__(self, threshold=25, min_area=0.002):
+        self.threshold = threshold  # Grey-level change that counts as movement
+        self.min_area = min_area  # Fraction of the frame
+        self.previous = None
+
+    def detect(self, bgr):
+        gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+        previous, self.previous = self.previous, gray
+        if previous is None or previous.shape != gray.shape:
+            return []
+        _, binary = cv2.threshold(cv2.absdiff(gray, previous), self.threshold, 255, cv2.THRESH_BINARY)
+        binary = cv2.dilate(binary, None, iterations=2)  # Join the edges of one moving object
+        contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        height, width = gray.shape
+        detections = []
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            if w * h < self.min_area * width * height:
+                continue
+            detections.append({
+                'label': 'person' if h >= w else 'vehicle',
+                'score': 1.0,
+                'box': [round(x / width, 3), round(y / height, 3), round(w / width, 3), round(h / height, 3)],
+            })
+        return detections
+
+
+class DnnDetector:
+    # SSD-style model through OpenCV DNN (Caffe, TensorFlow or ONNX exports with [1, 1, N, 7] output)
+    name = 'dnn'
+
+    def __init__(self, model, config=None, labels=None, input_size=(300, 300), scale=1 / 127.5,
+                 mean=(127.5, 127.5, 127.5), swap_rb=False, threshold=DETECTION_THRESHOLD):
+        self.net = cv2.dnn.readNet(model, config or '')
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        self.labels = labels or VOC_LABELS
+        self.input_size = tuple(input_size)
+        self.scale = scale
+        self.mean = tuple(mean)
+        self.swap_rb = swap_rb
+        self.threshold = threshold
+
+    def detect(self, bgr):
+        blob = cv2.dnn.blobFromImage(bgr, self.scale, self.input_size, self.mean, self.swap_rb)
+        self.net.setInput(blob)
+        detections = []
+        for _, class_id, score, x1, y1, x2, y2 in self.net.forward().reshape(-1, 7):
+            if score < self.threshold or not 0 <= int(class_id) < len(self.labels):
+                continue
+            label = LABEL_GROUPS.get(self.labels[int(class_id)])
+            if label is None:
+                continue  # Only people and vehicles are tagged
+            x1, y1, x2, y2 = (min(1.0, max(0.0, float(v))) for v in (x1, y1, x2, y2))
+            detections.append({
+                'label': label,
+                'score': round(float(score), 3),
+                'box': [round(x1, 3), round(y1, 3), round(x2 - x1, 3), round(y2 - y1, 3)],
+            })
+        return detections
+
+
+def make_detector(spec):
+    if spec is None:
+        return None
+    if spec == 'stub':
+        return StubDetector()
+    spec = dict(spec)
+    kind = spec.pop('type')
+    if kind == 'stub':
+        return StubDetector(**spec)
+    if kind == 'dnn':
+        return DnnDetector(**spec)
+    raise ValueError(f'Unknown detector type: {kind}')
+
+
+class AnalyticsStage:
+    # Runs a detector on every Nth frame in its own thread; N adapts so detection stays within a CPU share
+    def __init__(self, detector, size=ANALYTICS_SIZE, cpu_share=ANALYTICS_CPU_SHARE, max_skip=ANALYTICS_MAX_SKIP):
+        self.detector = detector
+        self.size = tuple(size)  # Detector input frames (lores stream size)
+        self.cpu_share = cpu_share  # Fraction of one core the detector may use
+        self.max_skip = max_skip
+        self.use_lores = False  # True when the pipeline feeds the ISP's YUV420 lores stream
+        self.skip = 1  # Analyse one frame in `skip`
+        self.counter = 0
+        self.busy = False
+        self.frame_interval = 0.1  # Seconds between offered frames (EMA)
+        self.last_offer = None
+        self.detect_seconds = 0.0  # Time per detection (EMA)
+        self.runs = 0
+        self.lock = Lock()
+        self.latest = []  # Detections of the most recent analysed frame
+        self.latest_at = None
+        self.events = []  # (capture time, detections) not yet written to a segment
+        self.queue = queue.Queue(maxsize=1)
+        self.thread = Thread(target=self._worker, name='analytics', daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def offer(self, frame, captured_at, lores=None):
+        # Called by the stream loop for every frame; returns immediately unless this frame is due
+        if self.last_offer is not None:
+            self.frame_interval = 0.9 * self.frame_interval + 0.1 * max(0.001, captured_at - self.last_offer)
+        self.last_offer = captured_at
+        self.counter += 1
+        if self.counter < self.skip or self.busy:
+            return False
+        self.counter = 0
+        self.busy = True
+        if lores is not None:
+            small = lores  # Already downscaled by the ISP (YUV420)
+        else:
+            small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)  # Small copy; full frame stays with the stream
+        self.queue.put((small, captured_at, lores is not None))
+        return True
+
+    def _worker(self):
+        while True:
+            small, captured_at, yuv = self.queue.get()
+            started = time.monotonic()
+            try:
+                bgr = cv2.cvtColor(small, cv2.COLOR_YUV420p2BGR) if yuv else cv2.cvtColor(small, cv2.COLOR_RGB2BGR)
+                detections = self.detector.detect(bgr)
+            except Exception as e:
+                logging.warning('Detector failed: %s', str(e))
+                detections = []
+            elapsed = time.monotonic() - started
+            with self.lock:
+                self.detect_seconds = elapsed if not self.runs else 0.8 * self.detect_seconds + 0.2 * elapsed
+                self.runs += 1
+                # detect_seconds per (skip × frame_interval) seconds of video must stay within cpu_share
+                wanted = math.ceil(self.detect_seconds / (self.cpu_share * self.frame_interval))
+                self.skip = min(self.max_skip, max(1, wanted))
+                self.latest = detections
+                self.latest_at = captured_at
+                if detections:
+                    self.events.append((captured_at, detections))
+            self.busy = False
+
+    def flush_segment(self, segment_path):
+        # Segment listener: summarise detections since the previous segment into its metadata
+        start = segment_start(os.path.basename(segment_path))
+        start = start.timestamp() if start else 0.0
+        now = time.time()
+        with self.lock:
+            events = [e for e in self.events if start <= e[0] <= now]
+            self.events = [e for e in self.events if e[0] > now]
+        summary = {}
+        for captured_at, detections in events:
+            for label in {d['label'] for d in detections}:
+                entry = summary.setdefault(label, {'frames': 0, 'max_score': 0.0,
+                                                   'first': round(captured_at - start, 1), 'last': 0.0})
+                entry['frames'] += 1
+                entry['last'] = round(captured_at - start, 1)
+            for d in detections:
+                summary[d['label']]['max_score'] = max(summary[d['label']]['max_score'], d['score'])
+        if summary:  # Nothing seen: no metadata write (listings default to no labels)
+            metadata.update(segment_path, labels=sorted(summary), detections=summary)
+
+    def status(self):
+        with self.lock:
+            return {
+                'detector': self.detector.name,
+                'source': 'lores' if self.use_lores else 'main (downscaled)',
+                'size': f'{self.size[0]}x{self.size[1]}',
+                'every_nth_frame': self.skip,
+                'detect_ms': round(self.detect_seconds * 1000, 1),
+                'cpu_share_target': self.cpu_share,
+                'runs': self.runs,
+                'latest': self.latest,
+                'latest_at': self.latest_at,
+            }
@@ -1,56 +1,91 @@
-from picamera2 import Picamera2  # Main camera control interface
-from .streaming import StreamingOutput, start_stream_thread  # Live MJPEG stream via capture thread
-from .recorder import VideoRecorder  # H264 segment recorder (background thread)
-from .handlers import make_handler  # HTTP request handler factory
+import logging  # Start-up failures
+import sys  # Non-zero exit so systemd restarts a failed start
+from threading import Thread  # Background camera bring-up
+
+from .startup import STARTUP, preload, wait_for_first_frame  # Start-up timeline (first import: starts the clock)
+from .handlers import make_handler  # HTTP request handler factory (light imports only)
 from .server import StreamingServer  # Threaded HTTP server for streaming and APIs
+from .settings import SETTINGS  # Runtime-tunable settings (settings.json, /api/config)
+from .cache import API_CACHE  # Listings depend on settings such as per_page
+from .events import EVENTS  # /events: metrics are sampled once for every subscriber
+from .config import CAMERAS, RECORDINGS_DIR, DETECTOR
+
 
+def sample_system():
+    from .system import system_info  # psutil loads with the first /events subscriber, not at start-up
+    return system_info(cpu_interval=None)  # CPU since the previous sample; doesn't block
 
-def main(host: str = '', port: int = 5000, width: int = 800, height: int = 450, fps: int = 10):
-    # Create camera instance (single camera device on Pi)
-    picam2 = Picamera2()
 
-    # Maintain 16:9 aspect ratio for the main stream
-    ratio = 16 / 9
-    width = int(ratio * height)
+def bring_up_cameras(web_server, width, height, fps):
+    # Runs behind the already-serving HTTP server: heavy imports, camera init, first frame
+    try:
+        preload(STARTUP, 'cv2')  # OpenCV loads while picamera2/libcamera are imported and the sensor opens
+        from .cameras import CameraPipeline, CameraSupervisor  # Pulls in numpy and picamera2
+        STARTUP.mark('imports')
+
+        # Build one pipeline per configured camera; all share the worker pool and HTTP server
+        supervisor = CameraSupervisor()
+        pinned = {'height': height, 'fps': fps}  # Given on the command line: not overridden by settings changes
+        for index, cam in enumerate(CAMERAS):
+            supervisor.add(CameraPipeline(
+                cam['id'],
+                source=cam.get('source', 0),
+                width=cam.get('width', width),
+                height=cam.get('height', height or SETTINGS.height),
+                fps=cam.get('fps', fps or SETTINGS.fps),
+                cpu_budget=cam.get('cpu_budget', 1.0),
+                record=cam.get('record', True),
+                # First camera records straight into RECORDINGS_DIR (legacy layout)
+                recordings_dir=RECORDINGS_DIR if index == 0 else None,
+                fixed=[name for name, value in pinned.items() if name in cam or value],
+                masks=cam.get('masks', ()),
+                crop=cam.get('crop'),
+                mask_recordings=cam.get('mask_recordings', False),
+                detector=cam.get('detector', DETECTOR),
+            ))
+        STARTUP.cameras = supervisor
+        SETTINGS.listeners.append(supervisor.apply_settings)  # fps/segment length live, height via reconfigure
 
-    # Configure the camera main stream: RGB888 ensures color frames (3 channels)
-    picam2.configure(picam2.create_video_configuration(
-        main={'size': (width, height), 'format': 'RGB888'}
-    ))
+        # Start cameras, streaming threads and H264 segment recorders
+        supervisor.start_all()
+        STARTUP.mark('cameras_started')
+        if wait_for_first_frame(supervisor.default.output):
+            STARTUP.mark('first_frame')
+        else:
+            logging.warning('No frame published yet; stream stays unavailable')
+        STARTUP.ready()
+    except Exception as e:
+        STARTUP.failed(e)
+        web_server.shutdown()  # Exit so systemd restarts the service
 
-    # Apply camera controls (manual WB, gains, FPS, grayscale via saturation)
-    picam2.set_controls({
-        "AwbMode": 0,              # Disable auto white balance for consistent output
-        "ColourGains": (1.0, 1.0), # Neutral color gains
-        "FrameRate": fps,          # Target frames per second
-        "Saturation": 0.0,         # Force grayscale output (0.0 = gray, 1.0 = full color)
-    })
 
-    # Start camera and streaming thread (uses capture_array, not JPEG encoder)
-    output = StreamingOutput(picam2)  # Shared buffer for MJPEG HTTP responses
-    picam2.start()                    # Begin camera capture pipeline
-    start_stream_thread(picam2, output, fps)  # Background thread publishes JPEG frames
+def main(host: str = '', port: int = 5000, width: int = None, height: int = None, fps: int = None):
+    # width/height/fps default to the settings file; passing them pins them for this run
+    logging.basicConfig(level=logging.INFO)
+    STARTUP.mark('interpreter')
+    SETTINGS.listeners.append(API_CACHE.invalidate)
+    SETTINGS.watch()  # Hand edits of settings.json apply within a few seconds
+    EVENTS.start_metrics(sample_system)  # Idle until a page subscribes
 
-    # Start H264 segment recorder explicitly (independent of the stream)
-    recorder = VideoRecorder(picam2, segment_seconds=60)  # 1-minute segments by default
-    recorder.start_recording()                             # Launch recording thread
+    # Bind first: pages, recordings and /api/status answer while the cameras come up
+    address = (host, port)                  # Bind host/port (0.0.0.0 for LAN access)
+    handler_cls = make_handler(startup=STARTUP)  # Resolves stream buffers once the cameras exist
+    web_server = StreamingServer(address, handler_cls)  # Threaded server for concurrency
+    STARTUP.mark('http_bound')
+    print(f"Serving at http://<Pi_IP_Address>:{port}")  # Helpful runtime info
 
+    Thread(target=bring_up_cameras, args=(web_server, width, height, fps), name='bring-up', daemon=True).start()
     try:
-        address = (host, port)                  # Bind host/port (0.0.0.0 for LAN access)
-        handler_cls = make_handler(output)      # Build HTTP handler with access to stream buffer
-        web_server = StreamingServer(address, handler_cls)  # Threaded server for concurrency
-        print(f"Serving at http://<Pi_IP_Address>:{port}")  # Helpful runtime info
         web_server.serve_forever()              # Block here; handles requests until interrupted
     except KeyboardInterrupt:
         print("\nShutting down server...")
     finally:
-        # Graceful shutdown: stop recorder and camera
-        try:
-            recorder.stop_recording()  # Join background recording thread
-        except Exception:
-            pass
-        picam2.stop()                 # Stop camera pipeline
+        # Graceful shutdown: stop recorders and cameras
+        if STARTUP.cameras:
+            STARTUP.cameras.stop_all()
         print("Server stopped.")
+    if STARTUP.state == 'failed':
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,65 @@
+import gzip  # Pre-compress static pages once at startup
+import hashlib  # Strong ETags from content digests
+import time  # TTL expiry
+from threading import Lock  # Shared across handler threads
+
+try:
+    import brotli  # Optional: smaller pages for browsers that accept br
+except ImportError:
+    brotli = None
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+
+
+class EncodedResponse:
+    # Body encoded once, with gzip/brotli variants and an ETag, served as-is per request
+    def __init__(self, body: bytes, content_type: str, compress: bool = True):
+        self.content_type = content_type
+        self.etag = make_etag(body)
+        self.variants = {'identity': body}
+        if compress:
+            self.variants['gzip'] = gzip.compress(body, compresslevel=9)
+            if brotli is not None:
+                self.variants['br'] = brotli.compress(body)
+
+    @classmethod
+    def from_text(cls, text: str, content_type: str = 'text/html; charset=utf-8'):
+        return cls(text.encode('utf-8'), content_type)
+
+    def negotiate(self, accept_encoding: str):
+        # Pick the smallest variant the client accepts; returns (encoding, body)
+        accepted = {part.split(';')[0].strip() for part in (accept_encoding or '').split(',')}
+        for encoding in ('br', 'gzip'):
+            if encoding in accepted and encoding in self.variants:
+                return encoding, self.variants[encoding]
+        return 'identity', self.variants['identity']
+
+
+class ResponseCache:
+    # Short-TTL cache of encoded API responses; invalidate() when recordings change
+    def __init__(self, ttl: float = 10.0):
+        self.ttl = ttl
+        self.entries = {}  # key → (expires_at, EncodedResponse)
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    def put(self, key, response: EncodedResponse):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, response)
+        return response
+
+    def invalidate(self, *_args):
+        # Accepts and ignores listener arguments so it can be registered as a segment callback
+        with self.lock:
+            self.entries.clear()
+
+
+API_CACHE = ResponseCache(ttl=10.0)  # /api/recordings and /api/oldest-date responses
@@ -0,0 +1,359 @@
+import os  # Per-camera recordings directories
+import logging  # Reconfigure failures
+import multiprocessing  # Start method for the encode process pool
+import time  # Synthetic source pacing
+from threading import Lock  # Serialise reconfigures per camera
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor  # Shared encode/post-processing pools
+
+import numpy as np  # Synthetic frame generation
+
+from .streaming import StreamingOutput, start_stream_thread, _encode_frame  # Live MJPEG stream via capture thread
+from .recorder import VideoRecorder  # H264 segment recorder (background thread)
+from .cache import API_CACHE  # Invalidated whenever a segment closes
+from .recordings import get_index  # Per-day listing cache
+from .keyframes import index_segment  # Built once per finalized segment
+from .uploader import SegmentUploader, make_target  # Off-device copies of finished segments
+from .workers import SharedFrameRing, ProcessFramePool  # Shared memory hand-off to encode processes
+from .settings import SETTINGS  # Segment length and free-space threshold for new recorders
+from .privacy import PrivacyFilter  # Polygon masks and ROI crop
+from .analytics import AnalyticsStage, make_detector  # Optional object detection
+from .events import EVENTS  # Server-sent events for /events
+from .dvr import DvrBuffer  # Last minutes of H264 in memory for instant rewind
+from .daynight import DayNightController  # Day/night profile switching from sampled frames
+from .integrity import SegmentVerifier  # Box-level checks and repair of finished segments
+from .config import (RECORDINGS_DIR, CAMERAS_SUBDIR, WORKER_POOL_SIZE, ENCODE_MODE,
+                     PROCESS_POOL_SIZE, FRAME_RING_SLOTS, UPLOAD_TARGET, DETECTOR, ANALYTICS_SIZE, DVR_SECONDS,
+                     DAY_NIGHT, INTEGRITY_CHECK)
+
+
+class SyntheticCamera:
+    # Minimal stand-in for Picamera2 producing a moving test pattern (no sensor needed)
+    def __init__(self):
+        self.size = (800, 450)
+        self.fps = 10
+        self.started = False
+        self.frame_index = 0
+
+    def create_video_configuration(self, main=None, **kwargs):
+        return {'main': dict(main or {}), **kwargs}
+
+    def configure(self, config):
+        self.size = tuple(config.get('main', {}).get('size', self.size))
+
+    def set_controls(self, controls):
+        self.fps = controls.get('FrameRate', self.fps)
+
+    def start(self):
+        self.started = True
+
+    def stop(self):
+        self.started = False
+
+    def capture_array(self, name="main"):
+        time.sleep(1.0 / max(1, self.fps))  # Mimic sensor frame timing
+        width, height = self.size
+        frame = np.zeros((height, width, 3), dtype=np.uint8)
+        x = (self.frame_index * 8) % width
+        frame[:, x:x + 16] = 255  # Moving vertical bar
+        frame[:, :, 1] = np.linspace(0, 255, width, dtype=np.uint8)  # Horizontal gradient
+        self.frame_index += 1
+        return frame
+
+
+def open_camera(source):
+    if source == 'synthetic':
+        return SyntheticCamera()
+    from picamera2 import Picamera2  # Imported only when a real device is requested
+    return Picamera2(int(source))
+
+
+class CameraPipeline:
+    def __init__(self, cam_id: str, source=0, width: int = 800, height: int = 450, fps: int = 10,
+                 cpu_budget: float = 1.0, record: bool = True, recordings_dir: str = None, fixed=(),
+                 masks=(), crop=None, mask_recordings: bool = False, detector=DETECTOR):
+        self.cam_id = str(cam_id)
+        self.source = source
+        self.height = height
+        self.width = int(16 / 9 * height)  # Maintain 16:9 aspect ratio for the main stream
+        self.fps = fps
+        self.cpu_budget = cpu_budget  # Fraction of one core the stream loop may use
+        self.record = record and source != 'synthetic'  # Synthetic sources have no H264 encoder
+        self.recordings_dir = recordings_dir or os.path.join(RECORDINGS_DIR, CAMERAS_SUBDIR, self.cam_id)
+        self.picam2 = None
+        self.output = None
+        self.recorder = None
+        self.frame_pool = None  # ProcessFramePool when encoding runs in worker processes
+        self.uploader = None  # SegmentUploader when UPLOAD_TARGET is configured
+        self.dvr = None  # DvrBuffer while recording with DVR_SECONDS > 0
+        self.verifier = None  # SegmentVerifier while recording with INTEGRITY_CHECK
+        self.fixed = set(fixed)  # Settings pinned per camera in CAMERAS; global setting changes skip them
+        self.reconfigure_lock = Lock()
+        self.still_lock = Lock()  # Concurrent full-quality snapshot requests share one capture
+        self.still = None  # (monotonic capture time, JPEG bytes, epoch capture time)
+        self.privacy = PrivacyFilter(masks, crop)
+        self.mask_recordings = mask_recordings
+        self.size = (self.width, self.height)  # Actual main stream size (differs from width/height with an ISP crop)
+        self.detector_spec = detector
+        self.analytics = None  # AnalyticsStage when a detector is configured
+        self.daynight = None  # DayNightController when DAY_NIGHT is enabled
+        self.profile = None  # (name, profile dict) currently applied, e.g. ('night', NIGHT_PROFILE)
+
+    def _configure(self):
+        # ROI crop in the ISP when possible: the main stream then only carries the region of interest
+        scaler_crop = self.privacy.apply_isp_crop(self.picam2)
+        self.size = self.privacy.crop_size(self.height) if scaler_crop else (self.width, self.height)
+
+        # Detector frames come from the ISP's lores stream (free downscale) unless pixels must be masked
+        # or cropped in software first, which only the main stream goes through
+        software_privacy = self.privacy.masks or (self.privacy.crop and not scaler_crop)
+        use_lores = bool(self.analytics and not software_privacy and not isinstance(self.picam2, SyntheticCamera))
+        streams = {'main': {'size': self.size, 'format': 'RGB888'}}
+        if use_lores:
+            streams['lores'] = {'size': ANALYTICS_SIZE}  # YUV420
+        if self.analytics:
+            self.analytics.use_lores = use_lores
+
+        # Configure the camera main stream: RGB888 ensures color frames (3 channels)
+        self.picam2.configure(self.picam2.create_video_configuration(**streams))
+
+        # Apply camera controls (manual WB, gains, FPS, grayscale via saturation)
+        controls = {
+            "AwbMode": 0,              # Disable auto white balance for consistent output
+            "ColourGains": (1.0, 1.0), # Neutral color gains
+            "FrameRate": self._frame_rate(),  # Target frames per second (capped by the night profile)
+            "Saturation": 0.0,         # Force grayscale output (0.0 = gray, 1.0 = full color)
+        }
+        if scaler_crop:
+            controls["ScalerCrop"] = scaler_crop  # Applies to recordings too
+        self.picam2.set_controls(controls)
+
+        # Masking every buffer before the encoder also covers the recordings (and spares the stream loop)
+        if self.privacy.masks and self.mask_recordings:
+            if hasattr(self.picam2, 'pre_callback'):
+                self.picam2.pre_callback = self.privacy.pre_callback
+                self.privacy.masked_upstream = True
+            else:
+                logging.warning('Camera %s cannot mask recordings; masking the live stream only', self.cam_id)
+
+    def start(self, pool=None, process_executor=None, viewers=None):
+        self.picam2 = open_camera(self.source)
+        detector = make_detector(self.detector_spec)
+        if detector is not None:
+            self.analytics = AnalyticsStage(detector)
+            self.analytics.start()
+        self._configure()
+
+        # Start camera and streaming thread (uses capture_array, not JPEG encoder)
+        self.output = StreamingOutput(self.picam2)
+        self.output.motion_listeners.append(self._announce_motion)
+        self.picam2.start()
+        if process_executor is not None:
+            # RGB888 frames are copied once into shared memory instead of being pickled
+            ring = SharedFrameRing(self.size[0] * self.size[1] * 3, slots=FRAME_RING_SLOTS)
+            self.frame_pool = ProcessFramePool(process_executor, ring)
+        start_stream_thread(self.picam2, self.output, self.fps, pool=self.frame_pool or pool,
+                            cpu_budget=self.cpu_budget, privacy=self.privacy if self.privacy else None,
+                            analytics=self.analytics)
+        if DAY_NIGHT:
+            self.daynight = DayNightController(self)
+            self.daynight.start()
+
+        # Start H264 segment recorder explicitly (independent of the stream)
+        if self.record:
+            os.makedirs(self.recordings_dir, exist_ok=True)
+            self.dvr = DvrBuffer() if DVR_SECONDS else None
+            self.recorder = VideoRecorder(self.picam2, segment_seconds=SETTINGS.segment_seconds,
+                                          output_dir=self.recordings_dir, min_free_bytes=SETTINGS.min_free_bytes,
+                                          dvr=self.dvr)
+            if INTEGRITY_CHECK:
+                self.verifier = SegmentVerifier(self.recordings_dir)
+                self.recorder.segment_listeners.append(self.verifier.enqueue)  # Also stores the keyframe index
+                self.verifier.listeners.append(get_index(self.recordings_dir).note_segment)  # New size in listings
+                self.verifier.listeners.append(API_CACHE.invalidate)
+            else:
+                self.recorder.segment_listeners.append(index_segment)  # Keyframe index for /api/seek
+            if self.analytics:
+                self.recorder.segment_listeners.append(self.analytics.flush_segment)  # Labels for ?label=
+            self.recorder.segment_listeners.append(get_index(self.recordings_dir).note_segment)  # Rescan that day only
+            self.recorder.segment_listeners.append(API_CACHE.invalidate)  # New segment → fresh listings
+            self.recorder.segment_listeners.append(self._announce_segment)  # Recordings pages add it live
+            self.recorder.state_listeners.append(self._announce_recorder_state)
+            if self.daynight:
+                self.recorder.segment_listeners.append(self.daynight.note_segment)  # Bytes per day/night hour
+            if UPLOAD_TARGET:
+                key_prefix = '' if self.recordings_dir == RECORDINGS_DIR else f"{CAMERAS_SUBDIR}/{self.cam_id}/"
+                self.uploader = SegmentUploader(make_target(UPLOAD_TARGET), self.recordings_dir,
+                                                key_prefix=key_prefix, viewers=viewers)
+                self.recorder.segment_listeners.append(self.uploader.enqueue)
+                if self.verifier:
+                    self.verifier.listeners.append(self.uploader.enqueue)  # Upload the playable version
+                self.uploader.start()
+            if self.verifier:
+                self.verifier.start()  # After staging recovery, before the first new segment
+            self.recorder.start_recording()
+
+    def _announce_segment(self, segment_path):
+        EVENTS.publish('segment', {
+            'name': os.path.basename(segment_path),
+            'path': os.path.relpath(segment_path, self.recordings_dir).replace(os.sep, '/'),  # download/<path>
+            'bytes': os.path.getsize(segment_path),
+        }, camera=self.cam_id)
+
+    def _announce_recorder_state(self, state, last_error):
+        EVENTS.publish('recorder', {'state': state, 'last_error': last_error}, camera=self.cam_id)
+
+    def _announce_motion(self, moving, peak, timestamp):
+        EVENTS.publish('motion', {'moving': moving, 'peak': round(peak, 3), 'timestamp': timestamp}, camera=self.cam_id)
+
+    def _frame_rate(self):
+        # Configured fps, lowered while a profile caps it (night: longer exposures, smaller segments)
+        cap = self.profile[1].get('fps') if self.profile else None
+        return min(self.fps, cap) if cap else self.fps
+
+    def apply_profile(self, name, profile):
+        # Day/night profile: sensor controls plus the frame rate cap, applied in place (no restart).
+        # H264 bitrate follows the frame rate from the next segment on.
+        self.profile = (name, profile)
+        fps = self._frame_rate()
+        if self.output:
+            self.output.fps = fps
+        if not self.picam2:
+            return
+        try:
+            self.picam2.set_controls({**profile.get('controls', {}), "FrameRate": fps})
+        except Exception as e:
+            logging.warning('Camera %s rejected %s profile controls (%s); applying frame rate only', self.cam_id, name, str(e))
+            self.picam2.set_controls({"FrameRate": fps})
+        EVENTS.publish('profile', {'profile': name, 'fps': fps}, camera=self.cam_id)
+
+    def capture_still(self, max_age=1.0, quality=95):
+        # Fresh main-stream frame as a full-quality JPEG without the overlay. Captured alongside the stream
+        # and recorder (no mode switch, so the H264 encoder keeps running); reused for max_age seconds.
+        with self.still_lock:
+            if self.still and time.monotonic() - self.still[0] < max_age:
+                return self.still[1], self.still[2]
+            frame = self.picam2.capture_array("main")
+            captured_at = time.time()
+            if self.privacy:
+                frame = self.privacy.apply(frame)  # Masks and crop hold for stills too
+            jpeg = _encode_frame(frame, quality, overlay=False)
+            self.still = (time.monotonic(), jpeg, captured_at)
+            return jpeg, captured_at
+
+    def apply_settings(self, changed):
+        # Settings listener: frame rate and recorder limits apply in place; a new height reconfigures the camera
+        changed = {name: value for name, value in changed.items() if name not in self.fixed}
+        if 'fps' in changed:
+            self.fps = changed['fps']
+            if self.output:
+                self.output.fps = self._frame_rate()  # Stream loop paces itself from this on the next frame
+            if self.picam2:
+                self.picam2.set_controls({"FrameRate": self._frame_rate()})  # Sensor frame duration, no restart
+        if self.recorder:
+            if 'segment_seconds' in changed:
+                self.recorder.segment_seconds = changed['segment_seconds']
+            if 'min_free_bytes' in changed:
+                self.recorder.min_free_bytes = changed['min_free_bytes']
+        if 'height' in changed and changed['height'] != self.height:
+            self.height = changed['height']
+            self.width = int(16 / 9 * self.height)
+            if self.picam2:
+                self.reconfigure()
+
+    def reconfigure(self):
+        # Fast path for a new resolution: keep the process, threads and HTTP clients; only the
+        # camera is stopped, reconfigured and started again. The current segment ends early.
+        with self.reconfigure_lock:
+            recording = bool(self.recorder and self.recorder.recording)
+            started = time.monotonic()
+            try:
+                if recording:
+                    self.recorder.stop_recording()
+                self.picam2.stop()
+                self._configure()
+                if self.profile:
+                    self.apply_profile(*self.profile)  # Profile controls survive the new configuration
+                self.picam2.start()
+            except Exception as e:
+                logging.error('Reconfigure of camera %s failed: %s', self.cam_id, str(e))
+                raise
+            finally:
+                if recording:
+                    self.recorder.start_recording()
+            logging.info('Camera %s reconfigured to %dx%d in %.2fs', self.cam_id, self.width, self.height,
+                         time.monotonic() - started)
+
+    def stop(self):
+        try:
+            if self.recorder:
+                self.recorder.stop_recording()  # Join background recording thread
+        except Exception:
+            pass
+        if self.verifier:
+            self.verifier.stop()  # Clean shutdown: no start-up sweep next time
+        if self.picam2:
+            self.picam2.stop()  # Stop camera pipeline
+        if self.frame_pool:
+            self.frame_pool.close()  # Release the shared memory ring
+
+    def info(self):
+        return {
+            'id': self.cam_id,
+            'source': str(self.source),
+            'size': f"{self.width}x{self.height}",
+            'fps': self.fps,
+            'cpu_budget': self.cpu_budget,
+            'recording': bool(self.recorder and self.recorder.recording),
+            'recorder_state': self.recorder.status()['state'] if self.recorder else 'disabled',
+            'dvr_bytes': self.dvr.bytes if self.dvr else 0,  # Memory held by the rewind buffer
+            'profile': self.profile[0] if self.profile else None,  # 'day' / 'night'
+        }
+
+
+class CameraSupervisor:
+    # Runs several camera pipelines sharing one worker pool (and, via app.py, one HTTP server)
+    def __init__(self, pool_size: int = WORKER_POOL_SIZE, encode_mode: str = ENCODE_MODE):
+        self.pipelines = {}  # cam_id → CameraPipeline, in insertion order
+        self.pool = ThreadPoolExecutor(max_workers=max(1, pool_size), thread_name_prefix='camera-worker')
+        self.process_executor = None
+        if encode_mode == 'process':
+            # forkserver: workers start from a clean single-threaded server, not a fork of this process
+            # (which by now runs the HTTP server, settings watcher and event threads)
+            self.process_executor = ProcessPoolExecutor(max_workers=max(1, PROCESS_POOL_SIZE),
+                                                        mp_context=multiprocessing.get_context('forkserver'))
+
+    def add(self, pipeline: CameraPipeline):
+        self.pipelines[pipeline.cam_id] = pipeline
+        return pipeline
+
+    def get(self, cam_id):
+        return self.pipelines.get(str(cam_id))
+
+    @property
+    def default(self):
+        return next(iter(self.pipelines.values()), None)
+
+    def start_all(self):
+        # Cameras initialise in parallel (sensor/ISP set-up is mostly waiting), so N cameras ≈ one start-up
+        def start(pipeline):
+            pipeline.start(self.pool, self.process_executor, viewers=self.viewers)
+        with ThreadPoolExecutor(max_workers=max(1, len(self.pipelines)), thread_name_prefix='camera-start') as starter:
+            list(starter.map(start, self.pipelines.values()))  # Re-raises the first start-up failure
+
+    def stop_all(self):
+        for pipeline in self.pipelines.values():
+            pipeline.stop()
+        self.pool.shutdown(wait=False)
+        if self.process_executor:
+            self.process_executor.shutdown(wait=False)
+
+    def apply_settings(self, changed):
+        for pipeline in self.pipelines.values():
+            pipeline.apply_settings(changed)
+
+    def viewers(self):
+        # Live viewers across all cameras (uploads back off while anyone is watching)
+        return sum(p.output.clients for p in self.pipelines.values() if p.output is not None)
+
+    def info(self):
+        return [pipeline.info() for pipeline in self.pipelines.values()]
@@ -0,0 +1,178 @@
+import bisect  # Keyframe at/before the requested start
+import hashlib  # Cache keys
+import os  # Cache files, segment identity
+import subprocess  # ffmpeg
+import tempfile  # Scratch space for the re-encoded head and partial cache files
+from threading import Lock, Thread
+
+from .keyframes import keyframe_index  # Keyframe times/offsets stored per segment
+from .config import CLIP_CACHE_DIR, CLIP_CACHE_BYTES, CLIP_MAX_SECONDS
+
+READ_CHUNK = 64 * 1024
+SEEK_SLACK = 0.01  # Keyframe times are rounded to ms: nudge input seeks so ffmpeg lands on the intended keyframe
+FFMPEG = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-nostdin', '-y']
+# Fragmented MP4 can be written to a pipe and played while it is still arriving
+STREAMABLE_MP4 = ['-movflags', 'frag_keyframe+empty_moov+default_base_moof', '-f', 'mp4']
+
+
+class ClipError(ValueError):
+    pass
+
+
+def plan_clip(segment_path, start, end, accurate=False):
+    # Work out how to cut [start, end) seconds out of a segment. Returns {'start', 'end', 'head'}: the clip really
+    # starts at 'start' (the keyframe at or before the requested start unless accurate), and 'head' is the (from, to)
+    # range that must be re-encoded before the stream-copied rest, or None when everything is copied.
+    index = keyframe_index(segment_path)
+    if not index:
+        raise ClipError('Segment has no keyframe index')
+    duration = index['duration'] or end
+    end = min(end, duration)
+    if not 0 <= start < end:  # Also rejects NaN
+        raise ClipError(f'Expected 0 <= start < end <= {duration}')
+    if end - start > CLIP_MAX_SECONDS:
+        raise ClipError(f'Clips are limited to {CLIP_MAX_SECONDS} seconds')
+    times = [keyframe[0] for keyframe in index['keyframes']] or [0.0]
+    i = max(0, bisect.bisect_right(times, start) - 1)
+    if not accurate or abs(times[i] - start) < 0.001:
+        return {'start': times[i], 'end': end, 'head': None}
+    # Frame-accurate: re-encode from the requested frame up to the next keyframe, copy from there on
+    following = times[i + 1] if i + 1 < len(times) and times[i + 1] < end else end
+    return {'start': start, 'end': end, 'head': (start, following)}
+
+
+def _commands(segment_path, plan, work_dir):
+    # (preparatory commands, streaming command); output goes to stdout of the last one
+    head = plan['head']
+    if head is None:
+        return [], FFMPEG + ['-ss', f"{plan['start'] + SEEK_SLACK:.3f}", '-i', segment_path,
+                             '-t', f"{plan['end'] - plan['start']:.3f}", '-an', '-c', 'copy'] + STREAMABLE_MP4 + ['pipe:1']
+    head_from, head_to = head
+    parts = [os.path.join(work_dir, 'head.ts')]
+    prepare = [FFMPEG + ['-ss', f'{head_from:.3f}', '-i', segment_path, '-t', f'{head_to - head_from:.3f}', '-an',
+                         '-c:v', 'libx264', '-preset', 'ultrafast', '-crf', '18', '-f', 'mpegts', parts[0]]]
+    if head_to < plan['end']:
+        parts.append(os.path.join(work_dir, 'tail.ts'))
+        prepare.append(FFMPEG + ['-ss', f'{head_to + SEEK_SLACK:.3f}', '-i', segment_path,
+                                 '-t', f"{plan['end'] - head_to:.3f}", '-an', '-c', 'copy', '-f', 'mpegts', parts[1]])
+    # The two parts come from different encoders: avc3 keeps SPS/PPS in-band so players pick up the change
+    return prepare, FFMPEG + ['-i', 'concat:' + '|'.join(parts), '-c', 'copy', '-tag:v', 'avc3'] + STREAMABLE_MP4 + ['pipe:1']
+
+
+def _lower_priority():
+    os.nice(10)  # Clip cuts must not starve the stream and recorder
+
+
+def _pump(process, write):
+    # Copy ffmpeg's stdout to write() as it arrives; raises ClipError on a non-zero exit
+    try:
+        while True:
+            chunk = process.stdout.read1(READ_CHUNK)  # Whatever is ready: the client sees fragments early
+            if not chunk:
+                break
+            write(chunk)
+        errors = process.stderr.read().decode('utf-8', 'replace').strip()
+        if process.wait() != 0:
+            raise ClipError(f'ffmpeg failed: {errors}')
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+
+def mux_h264(frames, fps, write):
+    # Wrap raw H264 access units (starting at a keyframe) in a streamable MP4 without re-encoding
+    process = subprocess.Popen(FFMPEG + ['-f', 'h264', '-framerate', f'{fps:.3f}', '-i', 'pipe:0', '-an', '-c', 'copy']
+                               + STREAMABLE_MP4 + ['pipe:1'],
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               preexec_fn=_lower_priority)
+
+    def feed():
+        try:
+            for frame in frames:
+                process.stdin.write(frame)
+            process.stdin.close()
+        except (BrokenPipeError, ValueError):
+            pass  # ffmpeg exited (or was killed because the client left)
+
+    Thread(target=feed, name='mux-feed', daemon=True).start()
+    _pump(process, write)
+
+
+class ClipCache:
+    # Finished clips on disk, evicted least recently used first (last use = file mtime)
+    def __init__(self, directory=CLIP_CACHE_DIR, max_bytes=CLIP_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, segment_path, plan, accurate):
+        st = os.stat(segment_path)  # A rewritten segment (repair, re-flush) gets new cache entries
+        identity = f"{os.path.abspath(segment_path)}|{st.st_mtime_ns}|{st.st_size}|{plan['start']:.3f}|{plan['end']:.3f}|{accurate}"
+        return hashlib.sha1(identity.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        path = os.path.join(self.directory, key + '.mp4')
+        try:
+            os.utime(path)  # Mark as recently used
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    def put(self, tmp_path, key):
+        os.replace(tmp_path, os.path.join(self.directory, key + '.mp4'))
+        self.evict()
+
+    def evict(self):
+        with self.lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith('.mp4') and entry.is_file():
+                    st = entry.stat()
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+
+    def status(self):
+        try:
+            files = [entry.stat().st_size for entry in os.scandir(self.directory) if entry.name.endswith('.mp4')]
+        except OSError:
+            files = []
+        return {'entries': len(files), 'bytes': sum(files), 'max_bytes': self.max_bytes,
+                'hits': self.hits, 'misses': self.misses}
+
+    def produce(self, segment_path, plan, key, write):
+        # Cut the clip, calling write(chunk) as ffmpeg produces it; the result is cached once complete. Raises
+        # ClipError if ffmpeg fails; anything write() raises (client went away) stops ffmpeg and discards the partial
+        # file.
+        os.makedirs(self.directory, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=self.directory) as work_dir:
+            prepare, stream = _commands(segment_path, plan, work_dir)
+            for args in prepare:
+                result = subprocess.run(args, capture_output=True, text=True, preexec_fn=_lower_priority)
+                if result.returncode != 0:
+                    raise ClipError(f'ffmpeg failed: {result.stderr.strip()}')
+            partial = os.path.join(work_dir, 'clip.mp4')
+            process = subprocess.Popen(stream, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                       preexec_fn=_lower_priority)
+            with open(partial, 'wb') as f:
+                def tee(chunk):
+                    f.write(chunk)
+                    write(chunk)
+
+                _pump(process, tee)
+            self.put(partial, key)
+
+
+CLIP_CACHE = ClipCache()
@@ -3,3 +3,131 @@ import os
 # Directory for recordings
 RECORDINGS_DIR = 'recordings'
 os.makedirs(RECORDINGS_DIR, exist_ok=True)
+
+# Runtime-tunable settings (resolution, fps, JPEG quality, segment length, retention, ...).
+# Typed defaults live in low/settings.py; this JSON file holds overrides written by
+# POST /api/config or by hand (hand edits are picked up within a few seconds).
+SETTINGS_FILE = os.environ.get('LIVE_CAM_SETTINGS', 'settings.json')
+
+# Sub-directory of RECORDINGS_DIR holding per-camera recordings for extra cameras
+CAMERAS_SUBDIR = 'cam'
+
+# Long-term archive tier (scripts/archive_recordings.py). Days older than ARCHIVE_AFTER_DAYS
+# are reduced to one file per day under <recordings>/archive/YYYY-MM-DD/ before the full-rate
+# segments expire. 'keyframes' stream-copies I-frames only (no re-encode); 'timelapse'
+# re-encodes every TIMELAPSE_FACTOR-th frame.
+ARCHIVE_SUBDIR = 'archive'
+ARCHIVE_AFTER_DAYS = 5
+ARCHIVE_MODE = 'keyframes'
+TIMELAPSE_FACTOR = 60
+ARCHIVE_DAYS_TO_KEEP = 180
+
+# Camera pipelines run by the supervisor. `source` is a Picamera2 camera index
+# (CSI or USB) or 'synthetic' for a generated test pattern. The first camera keeps
+# the legacy routes (/stream.mjpg) and records straight into RECORDINGS_DIR.
+# Optional privacy keys, all in normalised (0..1) full-frame coordinates:
+#   'masks': [[(x, y), (x, y), ...], ...]  polygons blacked out in the live stream
+#   'crop': (x, y, width, height)          region of interest; done by the ISP (ScalerCrop)
+#                                          when the camera supports it, else in software
+#   'mask_recordings': True                also mask the H264 recordings (Picamera2 pre-callback)
+CAMERAS = [
+    {'id': '0', 'source': 0, 'cpu_budget': 1.0, 'record': True},
+]
+
+# Worker threads shared by all cameras for JPEG encoding and post-processing
+WORKER_POOL_SIZE = 2
+
+# Where CPU-heavy frame stages run: 'thread' (shared thread pool) or 'process'
+# (process pool fed through shared memory rings, keeps the web process responsive)
+ENCODE_MODE = 'thread'
+PROCESS_POOL_SIZE = 3  # Worker processes when ENCODE_MODE == 'process' (spare cores on a quad-core Pi)
+FRAME_RING_SLOTS = 4  # Shared memory frame slots per camera
+
+# Segment storage. With STAGING_DIR set to a tmpfs path (e.g. '/dev/shm/live-cam') the
+# encoder writes to RAM and each finished segment is copied to the card in one sequential,
+# preallocated pass; a power cut loses at most the segment being flushed.
+STAGING_DIR = None
+WRITE_BUFFER_BYTES = 1024 * 1024  # Size of each write when flushing a staged segment
+PREALLOCATE = True  # fallocate the final file before flushing (one extent, less FS metadata churn)
+
+# Off-device copies of finished segments (low/uploader.py). None disables uploading; otherwise e.g.
+#   {'type': 'directory', 'path': '/mnt/nas/live-cam'}
+#   {'type': 's3', 'bucket': 'live-cam', 'endpoint': 'http://minio.local:9000',
+#    'access_key': '...', 'secret_key': '...'}             (requires boto3)
+#   {'type': 'webdav', 'url': 'https://nas.local/dav/live-cam', 'username': '...', 'password': '...'}
+UPLOAD_TARGET = None
+UPLOAD_CONCURRENCY = 2  # Segments uploaded in parallel
+UPLOAD_RATE_BYTES = 4 * 1024 * 1024  # Bytes/s with nobody watching (0 = unlimited)
+UPLOAD_RATE_WITH_VIEWERS = 512 * 1024  # Bytes/s while live viewers are connected
+UPLOAD_PART_BYTES = 8 * 1024 * 1024  # Multipart chunk size for S3 targets
+LOCAL_DAYS_AFTER_UPLOAD = 2  # Uploaded segments older than this may be deleted locally by cleanup
+
+# Bandwidth shaping for bulk HTTP routes (low/shaping.py), keyed by route prefix:
+#   rate / rate_with_viewers: bytes/s shared by all transfers on the route (0 = unlimited); the lower
+#       rate applies while anyone watches a live stream so /stream.mjpg keeps priority
+#   client_rate: bytes/s per client address
+#   concurrency: transfers served at once; up to `queue` more wait in order for `queue_timeout`
+#       seconds, beyond that the request gets 503 + Retry-After
+ROUTE_LIMITS = {
+    '/download': {'rate': 8 * 1024 * 1024, 'rate_with_viewers': 2 * 1024 * 1024, 'client_rate': 4 * 1024 * 1024,
+                  'concurrency': 2, 'queue': 8, 'queue_timeout': 30},
+    '/api/clip': {'concurrency': 1, 'queue': 4, 'queue_timeout': 60},  # Cache misses run ffmpeg: one at a time
+}
+
+# On-device object detection (low/analytics.py), run on a small frame every Nth frame in its own
+# thread. None disables it; 'stub' tags bright blobs without a model (CPU-only testing); a dict
+# loads an SSD-style OpenCV DNN model, e.g.
+#   {'type': 'dnn', 'model': 'models/MobileNetSSD_deploy.caffemodel',
+#    'config': 'models/MobileNetSSD_deploy.prototxt'}
+# Detections are summarised per segment (labels 'person' / 'vehicle') for /api/recordings?label=.
+DETECTOR = None
+ANALYTICS_SIZE = (320, 180)  # Detector input (Picamera2 lores stream size)
+ANALYTICS_CPU_SHARE = 0.25  # Fraction of one core detection may use; N adapts to stay within it
+ANALYTICS_MAX_SKIP = 50  # Analyse at least one frame in this many
+DETECTION_THRESHOLD = 0.5  # Minimum detector confidence
+
+# Motion events on /events: a camera starts "moving" when a frame's motion score (mean absolute
+# difference, 0..1) reaches the threshold and stops after this many seconds below it
+MOTION_EVENT_THRESHOLD = 0.02
+MOTION_EVENT_HOLD = 5
+
+# Clip extraction (/api/clip, low/clips.py). Cuts are stream-copied from the keyframe at or before
+# the start; ?accurate=1 re-encodes only the partial GOP before the first keyframe. Finished clips
+# are kept in an on-disk cache, least recently used evicted first.
+CLIP_CACHE_DIR = 'clip_cache'
+CLIP_CACHE_BYTES = 256 * 1024 * 1024
+CLIP_MAX_SECONDS = 300  # Longest clip one request may cut
+
+# In-memory DVR (low/dvr.py): the last DVR_SECONDS of encoded H264 per recording camera, kept as
+# whole GOPs so every rewind point is a keyframe. Memory is capped at DVR_MAX_BYTES (the oldest
+# GOPs go first); 0 seconds disables it. /dvr.mp4 replays from it, POST /api/dvr/save persists it.
+DVR_SECONDS = 300
+DVR_MAX_BYTES = 48 * 1024 * 1024
+DVR_SAVE_SECONDS = 120  # Default length of "save the last N seconds"
+DVR_SAVE_SUBDIR = 'saved'  # Saved DVR clips: <recordings>/saved/dvr_YYYYMMDD_HHMMSS.mp4
+
+# Day/night profiles (low/daynight.py). Every DAY_NIGHT_INTERVAL seconds the stream's subsampled
+# luma plane is measured (histogram mean, noise sigma) and scaled to a reference exposure using the
+# sensor's exposure time × gain, so a long night exposure does not read as daylight. The night
+# profile applies below NIGHT_ENTER_LEVEL, the day profile above NIGHT_EXIT_LEVEL; a new reading
+# must persist for DAY_NIGHT_HOLD seconds before the camera switches. Profile controls are libcamera
+# controls; 'fps' caps the frame rate (segments started at night get a proportionally lower bitrate).
+# Off by default: profiles override the camera's own tuning (exposure, gain, white balance).
+DAY_NIGHT = False
+DAY_NIGHT_INTERVAL = 5
+DAY_NIGHT_HOLD = 60
+NIGHT_ENTER_LEVEL = 20  # Mean luma (0-255) the scene would have at REFERENCE_EXPOSURE
+NIGHT_EXIT_LEVEL = 40
+NIGHT_NOISE_SIGMA = 6.0  # Grain (grey levels) that also means night while below NIGHT_EXIT_LEVEL
+REFERENCE_EXPOSURE = 10000  # Exposure time (µs) × analogue gain the levels above are expressed at
+DAY_PROFILE = {'controls': {'AeExposureMode': 0, 'NoiseReductionMode': 1}}  # Normal AE, fast denoise
+NIGHT_PROFILE = {'fps': 5, 'controls': {'AeExposureMode': 2, 'NoiseReductionMode': 2}}  # Long AE, high-quality denoise
+
+# Segment integrity (low/integrity.py). Every finalized segment's MP4 boxes are checked in the
+# background (box headers and the moov sample tables only, no decoding). A segment cut off by a power
+# loss has no moov; it is rebuilt from the H264 left in its mdat when possible, else flagged 'broken'
+# in the listings. SESSION_FILE in each recordings directory records whether the last run shut down
+# cleanly and the newest verified segment, so the start-up sweep after a crash only checks what came after.
+INTEGRITY_CHECK = True
+SESSION_FILE = '.session.json'
+INTEGRITY_STOP_TIMEOUT = 30  # Seconds shutdown waits for queued checks; unchecked segments leave the session unclean
@@ -0,0 +1,124 @@
+import logging  # Profile switches and rejected controls
+import math  # Noise estimator constant
+import os  # Segment sizes
+import time  # Sampling interval and hold timing
+from threading import Thread
+
+import numpy as np  # Histogram and noise estimate over the whole plane at once
+
+from .config import (DAY_NIGHT_INTERVAL, DAY_NIGHT_HOLD, NIGHT_ENTER_LEVEL, NIGHT_EXIT_LEVEL, NIGHT_NOISE_SIGMA,
+                     REFERENCE_EXPOSURE, DAY_PROFILE, NIGHT_PROFILE)
+
+NOISE_SCALE = math.sqrt(math.pi / 2) / 6  # Immerkær's fast noise variance estimator
+
+
+def measure(luma):
+    # Brightness and noise of a subsampled luma plane (2-D uint8). Returns mean level (from the histogram), the
+    # fraction of near-black pixels and the noise sigma in grey levels (Immerkær: mean absolute response of a
+    # Laplacian-difference kernel).
+    histogram = np.bincount(luma.ravel(), minlength=256)
+    total = luma.size
+    mean = float(histogram @ np.arange(256)) / total
+    dark = float(histogram[:16].sum()) / total
+    p = luma.astype(np.int16)
+    response = (p[:-2, :-2] - 2 * p[:-2, 1:-1] + p[:-2, 2:]
+                - 2 * p[1:-1, :-2] + 4 * p[1:-1, 1:-1] - 2 * p[1:-1, 2:]
+                + p[2:, :-2] - 2 * p[2:, 1:-1] + p[2:, 2:])
+    sigma = NOISE_SCALE * float(np.abs(response).mean()) if response.size else 0.0
+    return {'mean': round(mean, 1), 'dark_fraction': round(dark, 3), 'noise_sigma': round(sigma, 2)}
+
+
+class DayNightController:
+    # Samples a pipeline's stream every few seconds and switches it between the day and night profiles
+    def __init__(self, pipeline, interval=DAY_NIGHT_INTERVAL, hold=DAY_NIGHT_HOLD,
+                 enter=NIGHT_ENTER_LEVEL, exit=NIGHT_EXIT_LEVEL, noise=NIGHT_NOISE_SIGMA):
+        self.pipeline = pipeline
+        self.interval = interval
+        self.hold = hold
+        self.enter = enter
+        self.exit = exit
+        self.noise = noise
+        self.profiles = {'day': DAY_PROFILE, 'night': NIGHT_PROFILE}
+        self.mode = 'day'
+        self.pending = None  # (mode the readings point to, monotonic time they started to)
+        self.reading = {}
+        self.switches = 0
+        self.switched_at = None
+        self.usage = {'day': [0, 0], 'night': [0, 0]}  # mode → [segment bytes, segments] recorded in it
+        self.thread = Thread(target=self._loop, name=f'daynight-{pipeline.cam_id}', daemon=True)
+
+    def start(self):
+        self.pipeline.apply_profile(self.mode, self.profiles[self.mode])
+        self.thread.start()
+
+    def _exposure(self):
+        # Exposure time × gain of the latest frame, or None without sensor metadata (e.g. synthetic source)
+        try:
+            metadata = self.pipeline.picam2.capture_metadata()
+            return metadata['ExposureTime'] * metadata.get('AnalogueGain', 1.0) * metadata.get('DigitalGain', 1.0)
+        except Exception:
+            return None
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            luma = self.pipeline.output.luma if self.pipeline.output else None
+            if luma is None:
+                continue
+            try:
+                self.sample(luma, self._exposure())
+            except Exception as e:
+                logging.warning('Day/night sample for camera %s failed: %s', self.pipeline.cam_id, str(e))
+
+    def sample(self, luma, exposure=None):
+        reading = measure(luma)
+        # Scene level: what the mean would be at the reference exposure (raw mean when exposure is unknown)
+        level = reading['mean'] * REFERENCE_EXPOSURE / exposure if exposure else reading['mean']
+        reading.update(level=round(level, 1), exposure=exposure)
+        self.reading = reading
+        if self.mode == 'day':
+            wanted = 'night' if level < self.enter or (level < self.exit and reading['noise_sigma'] > self.noise) else 'day'
+        else:
+            wanted = 'day' if level > self.exit else 'night'  # The gap between enter and exit is the hysteresis
+        now = time.monotonic()
+        if wanted == self.mode:
+            self.pending = None
+            return None
+        if self.pending is None or self.pending[0] != wanted:
+            self.pending = (wanted, now)
+        if now - self.pending[1] < self.hold:
+            return None
+        self.pending = None
+        self.mode = wanted
+        self.switches += 1
+        self.switched_at = time.time()
+        logging.info('Camera %s switching to %s profile (level %.1f, noise %.2f)',
+                     self.pipeline.cam_id, wanted, level, reading['noise_sigma'])
+        self.pipeline.apply_profile(wanted, self.profiles[wanted])
+        return wanted
+
+    def note_segment(self, segment_path):
+        # Segment listener: storage per mode, to compare day and night hours
+        try:
+            size = os.path.getsize(segment_path)
+        except OSError:
+            return
+        entry = self.usage[self.mode]
+        entry[0] += size
+        entry[1] += 1
+
+    def status(self):
+        segment_seconds = self.pipeline.recorder.segment_seconds if self.pipeline.recorder else None
+        return {
+            'mode': self.mode,
+            'pending': self.pending[0] if self.pending else None,
+            'reading': self.reading,
+            'thresholds': {'enter': self.enter, 'exit': self.exit, 'noise_sigma': self.noise, 'hold': self.hold},
+            'switches': self.switches,
+            'switched_at': self.switched_at,
+            'profiles': self.profiles,
+            'bytes_per_hour': {
+                mode: round(total / (count * segment_seconds) * 3600) if count and segment_seconds else None
+                for mode, (total, count) in self.usage.items()
+            },
+        }
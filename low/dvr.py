@@ -0,0 +1,106 @@
+import bisect  # Keyframe lookups by time
+import os  # Saved clip paths
+import time  # Frame arrival times and the retention window
+from collections import deque  # GOP ring
+from datetime import datetime  # Saved clip names
+from threading import Lock
+
+from picamera2.outputs import Output  # Encoder output interface (frames arrive from the encoder thread)
+
+from .clips import mux_h264  # Raw H264 → streamable MP4 (stream copy)
+from .config import DVR_SECONDS, DVR_MAX_BYTES, DVR_SAVE_SUBDIR
+
+
+class DvrBuffer(Output):
+    # The last few minutes of encoded H264 for one camera, held in memory. Frames are grouped into GOPs that each
+    # start at a keyframe, and whole GOPs are evicted from the front once they fall out of the time window or the ring
+    # exceeds max_bytes. Any replay therefore starts at a keyframe and decodes without touching the recordings on
+    # disk. The recorder adds the buffer as a second encoder output, so the buffer lives on across segments.
+    def __init__(self, seconds=DVR_SECONDS, max_bytes=DVR_MAX_BYTES):
+        super().__init__()
+        self.seconds = seconds
+        self.max_bytes = max_bytes
+        self.lock = Lock()
+        self.gops = deque()  # [start time, [(arrival time, access unit bytes)], bytes], oldest first
+        self.bytes = 0
+        self.evicted = 0  # GOPs dropped for age or memory
+
+    def outputframe(self, frame, keyframe=True, timestamp=None, *args, **kwargs):
+        # Encoder callback (signature differs between picamera2 versions; only video frames are kept)
+        if kwargs.get('audio'):
+            return
+        now = time.time()
+        data = bytes(frame)  # The encoder reuses its buffer
+        with self.lock:
+            if keyframe:
+                self.gops.append([now, [], 0])
+            elif not self.gops:
+                return  # Nothing to decode this frame against
+            gop = self.gops[-1]
+            gop[1].append((now, data))
+            gop[2] += len(data)
+            self.bytes += len(data)
+            # Keep the oldest GOP while the next one still starts inside the window, so the window stays covered
+            while len(self.gops) > 1 and (self.bytes > self.max_bytes or self.gops[1][0] <= now - self.seconds):
+                self.bytes -= self.gops.popleft()[2]
+                self.evicted += 1
+
+    def frames_since(self, since, until=None):
+        # (keyframe-aligned start time, [access units], fps) covering since..until (epoch seconds)
+        with self.lock:
+            gops = list(self.gops)
+        if not gops:
+            return None, [], 0.0
+        i = max(0, bisect.bisect_right([gop[0] for gop in gops], since) - 1)  # GOP containing `since`
+        frames = [(at, data) for gop in gops[i:] for at, data in gop[1] if until is None or at <= until]
+        if not frames:
+            return None, [], 0.0
+        span = frames[-1][0] - frames[0][0]
+        fps = (len(frames) - 1) / span if span > 0 else 1.0
+        return gops[i][0], [data for _, data in frames], fps
+
+    def replay(self, since, write, until=None):
+        # Stream MP4 from the keyframe at/before `since`; returns that keyframe's time (None when empty)
+        start, frames, fps = self.frames_since(since, until)
+        if frames:
+            mux_h264(frames, fps, write)
+        return start
+
+    def save(self, recordings_dir, seconds):
+        # Persist the last `seconds` as <recordings>/saved/dvr_<time>.mp4; returns (path, start time) or (None, None)
+        now = time.time()
+        start, frames, fps = self.frames_since(now - seconds)
+        if not frames:
+            return None, None
+        save_dir = os.path.join(recordings_dir, DVR_SAVE_SUBDIR)
+        os.makedirs(save_dir, exist_ok=True)
+        path = os.path.join(save_dir, f"dvr_{datetime.fromtimestamp(start).strftime('%Y%m%d_%H%M%S')}.mp4")
+        tmp_path = path + '.part'
+        try:
+            with open(tmp_path, 'wb') as f:
+                mux_h264(frames, fps, f.write)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return path, start
+
+    def status(self):
+        with self.lock:
+            gops = len(self.gops)
+            frames = sum(len(gop[1]) for gop in self.gops)
+            oldest = self.gops[0][0] if self.gops else None
+            newest = self.gops[-1][1][-1][0] if self.gops else None
+            memory = self.bytes
+        return {
+            'enabled': True,
+            'bytes': memory,
+            'max_bytes': self.max_bytes,
+            'window_seconds': self.seconds,
+            'buffered_seconds': round(newest - oldest, 1) if gops else 0.0,
+            'oldest': oldest,
+            'newest': newest,
+            'keyframes': gops,
+            'frames': frames,
+            'evicted_gops': self.evicted,
+        }
@@ -0,0 +1,66 @@
+import json  # Event payloads are serialised once per publish
+import logging  # Metrics sampler failures
+import time  # Metrics interval
+from collections import deque  # Recent events for Last-Event-ID resumes
+from threading import Condition, Thread
+
+EVENT_HISTORY = 200  # Events kept for clients reconnecting with Last-Event-ID
+METRICS_INTERVAL = 2  # Seconds between "system" events while anyone is subscribed
+HEARTBEAT_SECONDS = 15  # Comment line sent on quiet streams so proxies and browsers keep them open
+
+
+class EventBus:
+    # Server-sent events shared by every /events subscriber. Each publish is encoded once into its SSE wire form;
+    # subscriber threads wait on one condition and write the same bytes, so N open tabs cost N socket writes, not N
+    # polls and N payload builds.
+    def __init__(self, history=EVENT_HISTORY):
+        self.condition = Condition()
+        self.events = deque(maxlen=history)  # (id, camera or None, encoded bytes), oldest first
+        self.last_id = 0
+        self.subscribers = 0
+        self.metrics_thread = None
+
+    def publish(self, kind, data, camera=None):
+        # camera: id of the pipeline an event belongs to (None for system-wide events)
+        payload = dict(data, camera=camera) if camera is not None else data
+        with self.condition:
+            self.last_id += 1
+            encoded = f'id: {self.last_id}\nevent: {kind}\ndata: {json.dumps(payload)}\n\n'.encode('utf-8')
+            self.events.append((self.last_id, camera, encoded))
+            self.condition.notify_all()
+
+    def subscribe(self):
+        with self.condition:
+            self.subscribers += 1
+            self.condition.notify_all()  # Wakes the metrics publisher
+
+    def unsubscribe(self):
+        with self.condition:
+            self.subscribers -= 1
+
+    def wait(self, last_id, timeout=HEARTBEAT_SECONDS):
+        # Events newer than last_id, waiting up to timeout for one; returns (events, newest id)
+        with self.condition:
+            if last_id > self.last_id:
+                last_id = 0  # Id from before a restart: replay what this process still has
+            self.condition.wait_for(lambda: self.last_id > last_id, timeout=timeout)
+            return [(camera, encoded) for event_id, camera, encoded in self.events if event_id > last_id], self.last_id
+
+    def start_metrics(self, sample, interval=METRICS_INTERVAL):
+        # Publish sample() as a "system" event every interval seconds, only while someone is listening
+        def run():
+            while True:
+                with self.condition:
+                    self.condition.wait_for(lambda: self.subscribers > 0)
+                try:
+                    self.publish('system', sample())
+                except Exception as e:
+                    logging.warning('System metrics sample failed: %s', str(e))
+                time.sleep(interval)
+
+        if self.metrics_thread is None:
+            self.metrics_thread = Thread(target=run, name='events-metrics', daemon=True)
+            self.metrics_thread.start()
+
+
+EVENTS = EventBus()
@@ -1,51 +1,548 @@
 import logging  # Logging warnings/errors for streaming client disconnects, etc.
 import os  # Filesystem operations for recordings listing/serving
+import shutil  # ffmpeg lookup for /api/clip
 import json  # Serialize responses like /system.json and /api/recordings
 import re  # Regular expressions for pattern matching
-import time  # Compute uptime from boot time
-import subprocess  # Query SoC temperature via vcgencmd on Raspberry Pi
+import time  # Snapshot ETag epoch, WebSocket pacing, DVR rewind offsets
+import threading  # WebSocket control-message reader
 from datetime import datetime  # Timestamp formatting and parsing
+from email.utils import formatdate  # HTTP date for Last-Modified
 from http import server  # Base HTTP server classes
-
-import psutil  # System metrics: CPU, memory, disk, boot time
+from itertools import islice  # Offset pagination over the newest-first listing
+from urllib.parse import parse_qs, urlparse  # Query-string parsing for API routes
 
 from .templates import PAGE_INDEX, PAGE_RECORDINGS  # HTML templates served for UI pages
-from .config import RECORDINGS_DIR
+from .cache import EncodedResponse, API_CACHE  # Pre-encoded pages and short-TTL API responses
+from .config import RECORDINGS_DIR, ROUTE_LIMITS, DVR_SAVE_SECONDS
+from .recordings import get_index, public  # Cached per-day listings and summaries
+from .settings import SETTINGS, SettingsError  # Runtime-tunable settings behind /api/config
+from . import websocket  # Minimal RFC 6455 framing for /ws/stream
+from . import keyframes  # Wall-clock → segment/keyframe resolution for /api/seek
+from .events import EVENTS  # Shared server-sent event stream for /events
+from .clips import CLIP_CACHE, ClipError, plan_clip  # /api/clip: keyframe cuts with an on-disk cache (and DVR muxing)
+from .shaping import ShaperBusy, make_shapers, shaper_for  # Bandwidth/concurrency limits for bulk routes
+
+# Pages are encoded and compressed once at import, not per request
+PAGE_INDEX_RESPONSE = EncodedResponse.from_text(PAGE_INDEX)
+PAGE_RECORDINGS_RESPONSE = EncodedResponse.from_text(PAGE_RECORDINGS)
+
+CAMERA_ROUTE = re.compile(r'^/cam/([^/]+)(/.*)$')  # /cam/<id>/<route> → per-camera route
+MAX_PAGE_SIZE = 200
+RANGE_HEADER = re.compile(r'^bytes=(\d*)-(\d*)$')  # Single byte range requests for /download
+SNAPSHOT_EPOCH = format(int(time.time()), 'x')  # Sequence numbers restart with the process; keeps ETags unique
+SNAPSHOT_MAX_WAIT = 60  # Longest ?after= long-poll, seconds
+SNAPSHOT_MAX_BURST = 10
+IDLE_TIMEOUT = 15  # Seconds a keep-alive connection may sit idle between requests before it is closed
+
+
+def _recordings_payload(query, recordings_dir):  # Build the /api/recordings listing for one camera
+    target_date = query.get('date', [None])[0] or None
+    label = query.get('label', [None])[0] or None  # e.g. person / vehicle (segments tagged by the detector)
+    tier = 'archive' if query.get('tier', ['full'])[0] == 'archive' else 'full'
+    index = get_index(recordings_dir, tier)
+    default_page_size = SETTINGS.per_page  # Recordings per page unless ?limit= / ?per_page= says otherwise
+    per_page = int(query.get('limit', query.get('per_page', [default_page_size]))[0] or default_page_size)
+    per_page = max(1, min(MAX_PAGE_SIZE, per_page))
+
+    if 'cursor' in query:
+        # Keyset pagination: only the days at/after the cursor are touched
+        videos, next_cursor = index.page(query['cursor'][0] or None, per_page, target_date, label)
+        return {
+            'videos': [public(v) for v in videos],
+            'next_cursor': next_cursor,
+            'limit': per_page,
+        }
+
+    # Offset pagination (kept for existing clients); totals come from cached day summaries
+    page = max(1, int(query.get('page', ['1'])[0] or 1)) - 1  # 0-based index
+    if label:
+        total_videos = sum(1 for _ in index.iter_videos(target_date, label=label))
+    else:
+        days = [target_date] if target_date else index.days()
+        total_videos = sum(index.summary(day)['count'] for day in days)
+    total_pages = (total_videos + per_page - 1) // per_page  # Ceiling division
+    paginated_videos = islice(index.iter_videos(target_date, label=label), page * per_page, (page + 1) * per_page)
+
+    return {
+        'videos': [public(v) for v in paginated_videos],
+        'pagination': {
+            'current_page': page + 1,
+            'total_pages': total_pages,
+            'total_videos': total_videos,
+            'per_page': per_page
+        }
+    }
+
+
+def _recording_path(recordings_dir, rel_path):  # Absolute path of a recording, or None if missing/outside recordings_dir
+    rel_path = rel_path.replace('..', '')  # Prevent directory traversal
+    filepath = os.path.join(recordings_dir, rel_path)  # Build absolute path
+    # Check if file exists and is within the camera's recordings directory
+    if os.path.isfile(filepath) and os.path.abspath(filepath).startswith(os.path.abspath(recordings_dir)):
+        return filepath
+    return None
+
 
+def _clip_offset(value, start):  # ?start=/?end= as seconds into the segment or an ISO-8601 wall-clock time
+    try:
+        return float(value)
+    except ValueError:
+        when = datetime.fromisoformat(value)  # ValueError → 400
+    if when.tzinfo is not None:
+        when = when.astimezone().replace(tzinfo=None)  # Segment names are local time
+    if start is None:
+        raise ValueError('Segment name carries no start time; give offsets in seconds')
+    return (when - start).total_seconds()
+
+
+def _days_payload(query, recordings_dir):  # Per-day counts/bytes/first/last for calendars
+    tier = 'archive' if query.get('tier', ['full'])[0] == 'archive' else 'full'
+    summaries = get_index(recordings_dir, tier).summaries()
+    return {
+        'days': summaries,
+        'total_videos': sum(day['count'] for day in summaries),
+        'total_bytes': sum(day['bytes'] for day in summaries),
+    }
+
+
+def _oldest_date_payload(recordings_dir):  # Find the oldest recording date (full-rate and archive tiers)
+    days = get_index(recordings_dir).days()
+    archive_days = get_index(recordings_dir, 'archive').days()
+    return {
+        'oldest_date': days[-1] if days else None,
+        'oldest_archive_date': archive_days[-1] if archive_days else None,
+    }
+
+
+def make_handler(output=None, cameras=None, startup=None):  # Factory to bind the shared StreamingOutput (and optional CameraSupervisor) to the handler
+    # With a StartupTracker, cameras are picked up from it once the background bring-up has created them
+    def live_viewers():
+        supervisor = cameras if cameras is not None else (startup.cameras if startup else None)
+        if supervisor:
+            return supervisor.viewers()
+        return output.clients if output else 0
+
+    shapers = make_shapers(ROUTE_LIMITS, viewers=live_viewers)  # Bulk transfers slow down while anyone watches live
 
-def make_handler(output):  # Factory to bind the shared StreamingOutput to the handler
     class StreamingHandler(server.BaseHTTPRequestHandler):  # Per-connection HTTP handler
-        def do_GET(self):  # Handle all GET routes
-            if self.path == '/':
-                self.send_response(301)  # Redirect root to the main index page
-                self.send_header('Location', '/index.html')
+        protocol_version = 'HTTP/1.1'  # Persistent connections: pollers reuse one socket and one server thread
+        timeout = IDLE_TIMEOUT  # Socket timeout: idle connections are dropped instead of pinning a thread
+        disable_nagle_algorithm = True  # Headers and body are separate writes; don't hold the body back for an ACK
+
+        def _send_encoded(self, response, cache_control='no-cache'):
+            # Serve a pre-encoded response: 304 on matching ETag, else the best accepted encoding
+            if self.headers.get('If-None-Match') == response.etag:
+                self.send_response(304)
+                self.send_header('ETag', response.etag)
                 self.end_headers()
-            elif self.path == '/index.html':
-                content = PAGE_INDEX.encode('utf-8')  # Render homepage HTML
+                return
+            encoding, body = response.negotiate(self.headers.get('Accept-Encoding'))
+            self.send_response(200)
+            self.send_header('Content-Type', response.content_type)
+            self.send_header('Content-Length', len(body))
+            self.send_header('ETag', response.etag)
+            self.send_header('Cache-Control', cache_control)  # Revalidate; 304s are nearly free
+            self.send_header('Vary', 'Accept-Encoding')
+            if encoding != 'identity':
+                self.send_header('Content-Encoding', encoding)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_starting(self):
+            # 503 + Retry-After while the stream has no frames yet
+            self._send_json(startup.status() if startup else {'state': 'starting'}, 503, retry_after=1)
+
+        def _send_busy(self, error):
+            # 503 when a shaped route's queue is full or the wait timed out
+            self._send_json({'error': str(error)}, 503, retry_after=10)
+
+        def _write_chunk(self, data):
+            # One Transfer-Encoding: chunked piece; an empty chunk terminates the body
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+
+        def _send_snapshot_headers(self, sequence, timestamp, etag, length=None):
+            self.send_header('ETag', etag)
+            self.send_header('X-Sequence', sequence)  # Next long-poll: ?after=<this>
+            self.send_header('X-Timestamp', f'{timestamp:.3f}')  # Capture time, epoch seconds
+            self.send_header('Cache-Control', 'no-cache')
+            if length is not None:
+                self.send_header('Content-Type', 'image/jpeg')
+                self.send_header('Content-Length', length)
+            self.end_headers()
+
+        def _serve_snapshot(self, stream_output, pipeline, query):
+            # Latest already-encoded stream frame: no capture, no encode, shared bytes for every poller
+            if query.get('full', ['0'])[0] not in ('0', ''):
+                if pipeline is None or pipeline.picam2 is None:
+                    self._send_starting()
+                    return
+                jpeg, captured_at = pipeline.capture_still()
                 self.send_response(200)
-                self.send_header('Content-Type', 'text/html')
-                self.send_header('Content-Length', len(content))
+                self.send_header('Content-Type', 'image/jpeg')
+                self.send_header('Content-Length', len(jpeg))
+                self.send_header('X-Timestamp', f'{captured_at:.3f}')
+                self.send_header('Cache-Control', 'no-store')
                 self.end_headers()
-                self.wfile.write(content)
-            elif self.path == '/recordings':
-                content = PAGE_RECORDINGS.encode('utf-8')  # Render recordings page HTML
+                self.wfile.write(jpeg)
+                return
+
+            try:
+                burst = min(SNAPSHOT_MAX_BURST, max(1, int(query.get('burst', ['1'])[0] or 1)))
+                after = query.get('after', [None])[0]
+                after = int(after) if after not in (None, '') else None
+                timeout = float(query.get('timeout', [SNAPSHOT_MAX_WAIT])[0] or SNAPSHOT_MAX_WAIT)
+            except ValueError as e:
+                self.send_error(400, str(e))
+                return
+            timeout = min(SNAPSHOT_MAX_WAIT, max(0.0, timeout))  # Also turns NaN into 0
+            with stream_output.condition:
+                if after is not None:
+                    # Long-poll: hold the request until a newer frame is published
+                    stream_output.condition.wait_for(lambda: stream_output.sequence > after, timeout=timeout)
+                frame, sequence, timestamp = stream_output.frame, stream_output.sequence, stream_output.timestamp
+            if frame is None:
+                self._send_starting()
+                return
+            etag = f'"{SNAPSHOT_EPOCH}-{sequence}"'
+
+            if burst > 1:
+                # N consecutive frames in one multipart/mixed response
+                boundary = 'SNAPSHOT'
+                chunked = self.request_version != 'HTTP/1.0'  # Length unknown up front: chunked keeps the connection reusable
+                write = self._write_chunk if chunked else self.wfile.write
                 self.send_response(200)
-                self.send_header('Content-Type', 'text/html')
-                self.send_header('Content-Length', len(content))
+                self.send_header('Content-Type', f'multipart/mixed; boundary={boundary}')
+                self.send_header('Cache-Control', 'no-cache')
+                if chunked:
+                    self.send_header('Transfer-Encoding', 'chunked')
+                else:
+                    self.send_header('Connection', 'close')
                 self.end_headers()
-                self.wfile.write(content)
-            elif self.path == '/stream.mjpg':
+                for i in range(burst):
+                    if i:
+                        with stream_output.condition:
+                            last = sequence
+                            if not stream_output.condition.wait_for(lambda: stream_output.sequence > last, timeout=5):
+                                break
+                            frame, sequence, timestamp = stream_output.frame, stream_output.sequence, stream_output.timestamp
+                    part_headers = (f'--{boundary}\r\n'
+                                    f'X-Sequence: {sequence}\r\n'
+                                    f'X-Timestamp: {timestamp:.3f}\r\n'
+                                    f'Content-Type: image/jpeg\r\n'
+                                    f'Content-Length: {len(frame)}\r\n\r\n')
+                    write(part_headers.encode() + frame + b'\r\n')
+                write(f'--{boundary}--\r\n'.encode())
+                if chunked:
+                    self._write_chunk(b'')  # Last chunk ends the body
+                return
+
+            if self.headers.get('If-None-Match') == etag or (after is not None and sequence <= after):
+                self.send_response(304)  # Same frame the client already has (or long-poll timed out)
+                self._send_snapshot_headers(sequence, timestamp, etag)
+                return
+            self.send_response(200)
+            self._send_snapshot_headers(sequence, timestamp, etag, len(frame))
+            self.wfile.write(frame)
+
+        def _send_json(self, payload, status=200, retry_after=None):
+            content = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', len(content))
+            if retry_after is not None:
+                self.send_header('Retry-After', str(retry_after))
+            self.send_header('Cache-Control', 'no-cache')  # Live status: never cached by clients
+            self.end_headers()
+            self.wfile.write(content)
+
+        def _send_cached_json(self, key, build):
+            response = API_CACHE.get(key)
+            if response is None:
+                body = json.dumps(build()).encode('utf-8')
+                response = API_CACHE.put(key, EncodedResponse(body, 'application/json', compress=len(body) > 1024))
+            self._send_encoded(response)
+
+        def _serve_ws_stream(self, stream_output):
+            # Push binary frames (header + JPEG); client may send pause/resume/fps as JSON text
+            if not websocket.handshake(self):
+                self.send_error(400, 'Expected WebSocket upgrade')
+                return
+            self.connection.settimeout(None)  # Viewers may stay silent for hours; the idle timeout is for HTTP only
+            state = {'paused': False, 'interval': 0.0, 'open': True}
+            send_lock = threading.Lock()  # PONGs (reader thread) and stream frames must not interleave on the socket
+            resumed = threading.Event()
+            resumed.set()
+
+            def read_controls():
+                try:
+                    while state['open']:
+                        opcode, payload = websocket.read_frame(self.rfile)
+                        if opcode == websocket.OP_CLOSE:
+                            break
+                        if opcode == websocket.OP_PING:
+                            with send_lock:
+                                websocket.send_frame(self.wfile, payload, websocket.OP_PONG)
+                        elif opcode == websocket.OP_TEXT:
+                            message = json.loads(payload.decode('utf-8'))
+                            cmd = message.get('cmd')
+                            if cmd == 'pause':
+                                resumed.clear()  # Hidden tab: stop sending frames entirely
+                            elif cmd == 'resume':
+                                resumed.set()
+                            elif cmd == 'fps':
+                                fps = float(message.get('value') or 0)
+                                state['interval'] = 1.0 / fps if fps > 0 else 0.0
+                except Exception:
+                    pass
+                state['open'] = False
+                resumed.set()  # Unblock the sender so it can exit
+
+            threading.Thread(target=read_controls, daemon=True).start()
+            with stream_output.condition:
+                stream_output.clients += 1  # Live viewers throttle background uploads
+            last_sequence = None
+            last_sent = 0.0
+            try:
+                while state['open']:
+                    resumed.wait()
+                    with stream_output.condition:
+                        stream_output.condition.wait(timeout=5)
+                        frame = stream_output.frame
+                        sequence = stream_output.sequence
+                        timestamp = stream_output.timestamp
+                        motion = stream_output.motion
+                    if not state['open'] or frame is None or sequence == last_sequence:
+                        continue
+                    if state['interval'] and time.monotonic() - last_sent < state['interval']:
+                        continue  # Client asked for a lower frame rate
+                    # Blocking send: a slow client simply skips frames instead of queueing them
+                    packed = websocket.pack_stream_frame(sequence, timestamp, motion, frame)
+                    with send_lock:
+                        websocket.send_frame(self.wfile, packed)
+                    last_sequence = sequence
+                    last_sent = time.monotonic()
+            except Exception as e:
+                logging.warning('Removed WebSocket client %s: %s', self.client_address, str(e))
+            state['open'] = False
+            with stream_output.condition:
+                stream_output.clients -= 1
+
+        def _serve_events(self, camera):
+            # Server-sent events: system metrics, new segments, recorder states, motion. camera limits
+            # camera-scoped events to one pipeline (/cam/<id>/events); None passes every camera's events.
+            try:
+                last_id = int(self.headers.get('Last-Event-ID') or 0)  # Browsers resend it when reconnecting
+            except ValueError:
+                last_id = 0
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('X-Accel-Buffering', 'no')  # Don't let a reverse proxy hold events back
+            self.send_header('Connection', 'close')  # Endless body: framed by closing the connection
+            self.end_headers()
+            EVENTS.subscribe()
+            try:
+                self.wfile.write(b'retry: 2000\n\n')  # Reconnect delay for EventSource
+                if not last_id:
+                    last_id = EVENTS.last_id  # New subscriber: from now on, no replay
+                while True:
+                    events, last_id = EVENTS.wait(last_id)
+                    chunk = b''.join(encoded for event_camera, encoded in events
+                                     if camera is None or event_camera in (None, camera))
+                    self.wfile.write(chunk or b': keep-alive\n\n')  # Comment line on quiet intervals
+            except Exception as e:
+                logging.info('Removed events client %s: %s', self.client_address, str(e))
+            finally:
+                EVENTS.unsubscribe()
+
+        def _serve_clip(self, recordings_dir, query):
+            # Cut [start, end) out of one segment: cached clips are sent whole, new ones streamed as ffmpeg writes them
+            segment_path = _recording_path(recordings_dir, query.get('path', [''])[0])
+            if not segment_path:
+                self.send_error(404, 'File not found')
+                return
+            accurate = query.get('accurate', ['0'])[0] not in ('0', '')
+            try:
+                segment_at = keyframes.segment_start(os.path.basename(segment_path))
+                start = _clip_offset(query.get('start', ['0'])[0], segment_at)
+                end = _clip_offset(query.get('end', [''])[0], segment_at)
+                plan = plan_clip(segment_path, start, end, accurate)
+            except ValueError as e:  # Bad offsets or ClipError
+                self.send_error(400, str(e))
+                return
+            key = CLIP_CACHE.key(segment_path, plan, accurate)
+            name, _ = os.path.splitext(os.path.basename(segment_path))
+            filename = f"{name}_{plan['start']:.1f}-{plan['end']:.1f}.mp4"
+            cached = CLIP_CACHE.get(key)
+            if cached:
+                with open(cached, 'rb') as f:
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'video/mp4')
+                    self.send_header('Content-Length', os.fstat(f.fileno()).st_size)
+                    self.send_header('Content-Disposition', f'inline; filename="{filename}"')
+                    self.send_header('X-Clip-Start', f"{plan['start']:.3f}")  # Where the clip really starts (keyframe)
+                    self.send_header('X-Clip-Cache', 'hit')
+                    self.end_headers()
+                    shutil.copyfileobj(f, self.wfile, 64 * 1024)
+                return
+            if not shutil.which('ffmpeg'):
+                self.send_error(501, 'ffmpeg is not installed')
+                return
+
+            shaper = shaper_for(shapers, '/api/clip')
+            client = self.client_address[0]
+            try:
+                send = shaper.acquire(client) if shaper else (lambda nbytes: None)
+            except ShaperBusy as e:
+                self._send_busy(e)
+                return
+            try:
+                chunked = self.request_version != 'HTTP/1.0'
+                self.send_response(200)
+                self.send_header('Content-Type', 'video/mp4')
+                self.send_header('Content-Disposition', f'inline; filename="{filename}"')
+                self.send_header('X-Clip-Start', f"{plan['start']:.3f}")
+                self.send_header('X-Clip-Cache', 'miss')
+                if chunked:
+                    self.send_header('Transfer-Encoding', 'chunked')
+                else:
+                    self.send_header('Connection', 'close')
+                self.end_headers()
+
+                def write(chunk):
+                    send(len(chunk))
+                    if chunked:
+                        self._write_chunk(chunk)
+                    else:
+                        self.wfile.write(chunk)
+
+                try:
+                    CLIP_CACHE.produce(segment_path, plan, key, write)
+                except ClipError as e:
+                    logging.warning('Clip of %s failed: %s', segment_path, str(e))
+                    self.close_connection = True  # Truncated body: the client must not reuse this response
+                    return
+                if chunked:
+                    self._write_chunk(b'')
+            finally:
+                if shaper:
+                    shaper.release(client)
+
+        def _serve_dvr(self, dvr, query):
+            # Replay from the in-memory DVR: ?back=<seconds before now> (default 30) or ?from=<ISO time>, &seconds=<length>
+            if dvr is None:
+                self.send_error(404, 'DVR is disabled for this camera')
+                return
+            if not shutil.which('ffmpeg'):
+                self.send_error(501, 'ffmpeg is not installed')
+                return
+            try:
+                if query.get('from', [''])[0]:
+                    since = datetime.fromisoformat(query['from'][0]).timestamp()  # Naive = local time
+                else:
+                    since = time.time() - float(query.get('back', ['30'])[0])
+                seconds = query.get('seconds', [''])[0]
+                until = since + float(seconds) if seconds else None
+            except ValueError as e:
+                self.send_error(400, str(e))
+                return
+            start, _, _ = dvr.frames_since(since, until)
+            if start is None:
+                self.send_error(404, 'Nothing buffered for that time')
+                return
+            chunked = self.request_version != 'HTTP/1.0'
+            self.send_response(200)
+            self.send_header('Content-Type', 'video/mp4')
+            self.send_header('Cache-Control', 'no-store')
+            self.send_header('X-Clip-Start', f'{start:.3f}')  # Epoch time of the keyframe the replay starts at
+            if chunked:
+                self.send_header('Transfer-Encoding', 'chunked')
+            else:
+                self.send_header('Connection', 'close')
+            self.end_headers()
+            try:
+                dvr.replay(since, self._write_chunk if chunked else self.wfile.write, until)
+            except ClipError as e:
+                logging.warning('DVR replay failed: %s', str(e))
+                self.close_connection = True  # Truncated body
+                return
+            if chunked:
+                self._write_chunk(b'')
+
+        def _save_dvr(self, query, camera=None):
+            # "Save the last N seconds": ?seconds= (default DVR_SAVE_SECONDS); camera from /cam/<id>/ or ?camera=
+            supervisor = cameras if cameras is not None else (startup.cameras if startup else None)
+            camera = camera or query.get('camera', [None])[0]
+            pipeline = (supervisor.get(camera) if camera else supervisor.default) if supervisor else None
+            if pipeline is None or pipeline.dvr is None:
+                self.send_error(404, 'No DVR for that camera')
+                return
+            if not shutil.which('ffmpeg'):
+                self.send_error(501, 'ffmpeg is not installed')
+                return
+            try:
+                seconds = float(query.get('seconds', [DVR_SAVE_SECONDS])[0])
+            except ValueError as e:
+                self.send_error(400, str(e))
+                return
+            try:
+                saved, start = pipeline.dvr.save(pipeline.recordings_dir, seconds)
+            except ClipError as e:
+                self.send_error(500, str(e))
+                return
+            if saved is None:
+                self.send_error(404, 'Nothing buffered yet')
+                return
+            rel_path = os.path.relpath(saved, pipeline.recordings_dir).replace(os.sep, '/')
+            self._send_json({'path': rel_path, 'download': f'download/{rel_path}', 'start': start,
+                             'bytes': os.path.getsize(saved)}, 201)
+
+        def do_GET(self):  # Handle all GET routes
+            # Resolve camera-namespaced routes; un-prefixed routes address the default camera
+            path = self.path
+            supervisor = cameras if cameras is not None else (startup.cameras if startup else None)
+            pipeline = supervisor.default if supervisor else None
+            stream_output = output or (pipeline.output if pipeline else None)
+            recordings_dir = RECORDINGS_DIR
+            match = CAMERA_ROUTE.match(path)
+            if match:
+                pipeline = supervisor.get(match.group(1)) if supervisor else None
+                if pipeline is None or pipeline.output is None:
+                    if startup and startup.state == 'starting':
+                        self._send_starting()
+                    else:
+                        self.send_error(404, 'Unknown camera')
+                    return
+                path = match.group(2)
+                stream_output = pipeline.output
+                recordings_dir = pipeline.recordings_dir
+
+            if path == '/':
+                self.send_response(301)  # Redirect root to the main index page
+                self.send_header('Location', 'index.html')  # Relative so /cam/<id>/ stays namespaced
+                self.send_header('Content-Length', 0)
+                self.end_headers()
+            elif path == '/index.html':
+                self._send_encoded(PAGE_INDEX_RESPONSE)  # Pre-encoded homepage HTML
+            elif path == '/recordings':
+                self._send_encoded(PAGE_RECORDINGS_RESPONSE)  # Pre-encoded recordings page HTML
+            elif urlparse(path).path in ('/stream.mjpg', '/ws/stream', '/snapshot.jpg', '/snapshot', '/dvr.mp4') and stream_output is None:
+                self._send_starting()  # Camera still coming up (or failed): tell clients to retry
+            elif path == '/stream.mjpg':
                 self.send_response(200)  # Begin MJPEG multipart HTTP response
                 self.send_header('Age', 0)
                 self.send_header('Cache-Control', 'no-cache, private')  # Prevent caching
                 self.send_header('Pragma', 'no-cache')
                 self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=FRAME')
+                self.send_header('Connection', 'close')  # Endless body: framed by closing the connection
                 self.end_headers()
+                with stream_output.condition:
+                    stream_output.clients += 1  # Live viewers throttle background uploads
                 try:
                     while True:
-                        with output.condition:  # Wait for next frame published by streaming thread
-                            output.condition.wait()
-                            frame = output.frame
+                        with stream_output.condition:  # Wait for next frame published by streaming thread
+                            stream_output.condition.wait()
+                            frame = stream_output.frame
                         self.wfile.write(b'--FRAME\r\n')  # Boundary marker for MJPEG
                         self.send_header('Content-Type', 'image/jpeg')
                         self.send_header('Content-Length', len(frame))
@@ -54,197 +551,185 @@ def make_handler(output):  # Factory to bind the shared StreamingOutput to the h
                         self.wfile.write(b'\r\n')  # End of part
                 except Exception as e:
                     logging.warning('Removed streaming client %s: %s', self.client_address, str(e))  # Client disconnected
-            elif self.path == '/system.json':
-                # Get system information (CPU %, memory %, disk usage, temp, uptime)
-                cpu_usage = psutil.cpu_percent(interval=1)  # Sample CPU usage over 1s
-                memory = psutil.virtual_memory()  # Memory stats
-                memory_percent = memory.percent
-                
-                # Get disk usage
-                disk = psutil.disk_usage('/')  # Root filesystem usage
-                disk_usage_percent = (disk.used / disk.total) * 100
-                disk_usage_gb = disk.used / (1024**3)
-                disk_total_gb = disk.total / (1024**3)
-                disk_text = f"{disk_usage_gb:.1f}/{disk_total_gb:.1f} GB"  # Human-readable used/total
-                
-                # Get CPU temperature (Raspberry Pi specific; may fail on other systems)
+                finally:
+                    with stream_output.condition:
+                        stream_output.clients -= 1
+            elif path == '/ws/stream':
+                self._serve_ws_stream(stream_output)
+            elif urlparse(path).path in ('/snapshot.jpg', '/snapshot'):
+                # Still image: ?after=<seq> long-polls, ?burst=N sends N consecutive frames, ?full=1 a fresh full-quality still
+                self._serve_snapshot(stream_output, pipeline, parse_qs(urlparse(path).query))
+            elif path == '/events':
+                self._serve_events(pipeline.cam_id if match and pipeline else None)
+            elif path == '/api/status':
+                # Start-up progress and time-to-first-frame
+                status = startup.status() if startup else {'state': 'ready'}
+                self._send_json(status)
+            elif path == '/api/config':
+                # Current settings, their types/limits and how a change takes effect
+                self._send_json(SETTINGS.describe())
+            elif path == '/system.json':
+                from .system import system_info  # psutil loads on first use, not at start-up
+                self._send_json(system_info())
+            elif path.startswith('/api/recordings'):
+                # Parse query parameters; listing is cached until the next segment closes
+                query = parse_qs(urlparse(path).query, keep_blank_values=True)
                 try:
-                    temp_result = subprocess.run(['vcgencmd', 'measure_temp'], capture_output=True, text=True)
-                    cpu_temp = float(temp_result.stdout.replace('temp=', '').replace("'C\n", ''))
-                except Exception:
-                    cpu_temp = 0.0  # Fallback if command unavailable
-
-                # Uptime
-                boot_time = psutil.boot_time()  # Epoch time when system booted
-                uptime_seconds = int(time.time() - boot_time)
-                days = uptime_seconds // 86400
-                hours = (uptime_seconds % 86400) // 3600
-                minutes = (uptime_seconds % 3600) // 60
-                uptime_human = f"{days}d {hours}h {minutes}m" if days else (f"{hours}h {minutes}m" if hours else f"{minutes}m")
-
-                system_info = {
-                    'cpu': round(cpu_usage, 1),
-                    'temp': round(cpu_temp, 1),
-                    'memory': round(memory_percent, 1),
-                    'storage': disk_text,
-                    'storage_percent': round(disk_usage_percent, 1),
-                    'uptime_seconds': uptime_seconds,
-                    'uptime_human': uptime_human,
-                }
-                
-                content = json.dumps(system_info).encode('utf-8')  # JSON payload
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/json')
-                self.send_header('Cache-Control', 'no-cache')  # Prevent client caching of metrics
-                self.end_headers()
-                self.wfile.write(content)
-            elif self.path.startswith('/api/recordings'):
-                # Parse query parameters
-                from urllib.parse import parse_qs, urlparse, unquote
-                query = parse_qs(urlparse(self.path).query)
-                page = int(query.get('page', ['1'])[0]) - 1  # 0-based index
-                target_date = query.get('date', [None])[0]
-                per_page = 20
-                
-                # Get all video files with their metadata from all date subdirectories
-                all_videos = []
-                
-                # If a specific date is provided, only look in that date's directory
-                if target_date:
-                    date_dir = os.path.join(RECORDINGS_DIR, target_date)
-                    if os.path.exists(date_dir) and os.path.isdir(date_dir):
-                        search_dirs = [(date_dir, target_date)]
-                    else:
-                        search_dirs = []
-                else:
-                    # If no date specified, search all directories
-                    search_dirs = [(RECORDINGS_DIR, '')]
-                    for root, dirs, _ in os.walk(RECORDINGS_DIR):
-                        for dir_name in dirs:
-                            if re.match(r'\d{4}-\d{2}-\d{2}$', dir_name):
-                                search_dirs.append((os.path.join(root, dir_name), dir_name))
-                
-                # Process each directory
-                for root, date_from_dir in search_dirs:
-                    try:
-                        files = os.listdir(root)
-                    except (OSError, IOError):
-                        continue
-                        
-                    for filename in files:
-                        if not filename.endswith('.mp4'):
-                            continue
-                            
-                        filepath = os.path.join(root, filename)
-                        if not os.path.isfile(filepath):
-                            continue
-                            
-                        try:
-                            stat = os.stat(filepath)
-                            dt = datetime.fromtimestamp(stat.st_mtime)
-                            
-                            # Use date from directory if available, otherwise from file mtime
-                            display_date = date_from_dir if date_from_dir and re.match(r'\d{4}-\d{2}-\d{2}$', date_from_dir) else dt.strftime('%Y-%m-%d')
-                            
-                            # If we're filtering by date and this file doesn't match, skip it
-                            if target_date and display_date != target_date:
-                                continue
-                            
-                            # Store relative path for download links
-                            rel_path = os.path.relpath(root, RECORDINGS_DIR)
-                            rel_filepath = os.path.join(rel_path, filename) if rel_path != '.' else filename
-                            
-                            all_videos.append({
-                                'name': filename,
-                                'path': rel_filepath,  # Relative path for downloads
-                                'size': f"{stat.st_size / (1024*1024):.1f} MB",
-                                'date': dt.strftime('%Y-%m-%d %H:%M:%S'),
-                                'date_group': display_date,
-                                'timestamp': dt.timestamp()
-                            })
-                        except (OSError, IOError):
-                            continue
-                
-                # Sort by timestamp (newest first)
-                all_videos.sort(key=lambda x: x['timestamp'], reverse=True)
-                
-                # Clean up video objects before sending
-                paginated_videos = all_videos[page * per_page:(page + 1) * per_page]
-                for video in paginated_videos:
-                    video.pop('timestamp', None)
-                    video.pop('date_group', None)
-                
-                total_videos = len(all_videos)
-                total_pages = (total_videos + per_page - 1) // per_page  # Ceiling division
-                
-                content = json.dumps({
-                    'videos': paginated_videos,
-                    'pagination': {
-                        'current_page': page + 1,
-                        'total_pages': total_pages,
-                        'total_videos': total_videos,
-                        'per_page': per_page
-                    }
-                }).encode('utf-8')
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/json')
-                self.send_header('Cache-Control', 'no-cache')
-                self.end_headers()
-                self.wfile.write(content)
-            elif self.path == '/api/oldest-date':
-                # Find the oldest recording date
-                oldest_date = None
-                
+                    self._send_cached_json((recordings_dir, path), lambda: _recordings_payload(query, recordings_dir))
+                except ValueError as e:  # Non-numeric limit/per_page/page: raised while building, before any header
+                    self.send_error(400, str(e))
+            elif path.startswith('/api/days'):
+                query = parse_qs(urlparse(path).query)
+                self._send_cached_json((recordings_dir, path), lambda: _days_payload(query, recordings_dir))
+            elif path == '/api/cameras':
+                # List camera pipelines and their namespaced stream routes
+                cams = supervisor.info() if supervisor else []
+                for cam in cams:
+                    cam['stream'] = f"/cam/{cam['id']}/stream.mjpg"
+                self._send_json({'cameras': cams})
+            elif path == '/api/recorder':
+                # Recorder health: state, restart counts, last error
+                recorder = pipeline.recorder if pipeline else None
+                self._send_json(recorder.status() if recorder else {'state': 'disabled'})
+            elif path == '/api/uploads':
+                # Off-device upload queue and throughput
+                uploader = pipeline.uploader if pipeline else None
+                self._send_json(uploader.status() if uploader else {'enabled': False})
+            elif path == '/api/integrity':
+                # Segment verifier: checked/repaired/broken counts and the start-up sweep after an unclean shutdown
+                verifier = pipeline.verifier if pipeline else None
+                self._send_json(verifier.status() if verifier else {'enabled': False})
+            elif path == '/api/analytics':
+                # Detector cadence (every Nth frame), cost and latest detections
+                analytics = pipeline.analytics if pipeline else None
+                self._send_json(analytics.status() if analytics else {'enabled': False})
+            elif path == '/api/storage':
+                # Segment storage settings and measured write amplification
+                recorder = pipeline.recorder if pipeline else None
+                self._send_json(recorder.storage.stats() if recorder else {})
+            elif path == '/api/transfers':
+                # Shaped bulk routes (running/queued transfers, throughput, current limits) and the clip cache
+                transfers = {route: shaper.status() for route, shaper in shapers.items()}
+                transfers['clip_cache'] = CLIP_CACHE.status()
+                self._send_json(transfers)
+            elif urlparse(path).path == '/api/clip':
+                # ?path=<download path>&start=&end= (seconds or ISO time); &accurate=1 for a frame-exact start
+                self._serve_clip(recordings_dir, parse_qs(urlparse(path).query))
+            elif path == '/api/dvr':
+                # Rewind buffer: memory use against its cap, buffered window, keyframes
+                dvr = pipeline.dvr if pipeline else None
+                self._send_json(dvr.status() if dvr else {'enabled': False})
+            elif path == '/api/daynight':
+                # Current profile, latest brightness/noise reading, and storage per day and night hour
+                daynight = pipeline.daynight if pipeline else None
+                self._send_json(daynight.status() if daynight else {'enabled': False})
+            elif urlparse(path).path == '/dvr.mp4':
+                self._serve_dvr(pipeline.dvr if pipeline else None, parse_qs(urlparse(path).query))
+            elif path.startswith('/api/seek'):
+                # Resolve ?t=<iso timestamp> to a segment and its nearest preceding keyframe
+                query = parse_qs(urlparse(path).query)
                 try:
-                    for entry in os.scandir(RECORDINGS_DIR):
-                        if entry.is_dir() and re.match(r'\d{4}-\d{2}-\d{2}$', entry.name):
-                            try:
-                                dir_date = datetime.strptime(entry.name, '%Y-%m-%d').date()
-                                if oldest_date is None or dir_date < oldest_date:
-                                    oldest_date = dir_date
-                            except ValueError:
-                                continue
-                    
-                    response = {
-                        'oldest_date': oldest_date.isoformat() if oldest_date else None
-                    }
-                    content = json.dumps(response).encode('utf-8')
-                    self.send_response(200)
-                    self.send_header('Content-Type', 'application/json')
-                    self.end_headers()
-                    self.wfile.write(content)
+                    when = datetime.fromisoformat(query.get('t', [''])[0])
+                except ValueError:
+                    self.send_error(400, 'Expected t=<ISO-8601 timestamp>')
+                    return
+                if when.tzinfo is not None:
+                    when = when.astimezone().replace(tzinfo=None)  # Segment names are local time
+                result = keyframes.seek(recordings_dir, when)
+                if result is None:
+                    self.send_error(404, 'No recording covers that time')
+                    return
+                self._send_json(result)
+            elif path == '/api/oldest-date':
+                try:
+                    self._send_cached_json((recordings_dir, path), lambda: _oldest_date_payload(recordings_dir))
                 except Exception as e:
                     self.send_error(500, str(e))
-                    
-            elif self.path.startswith('/download'):
+            elif path.startswith('/download'):
                 # Serve video file for download/inline playback
-                rel_path = self.path[len('/download/'):]  # Extract relative path from URL
+                rel_path = path[len('/download/'):]  # Extract relative path from URL
                 rel_path = rel_path.split('?')[0]  # Remove any query parameters
-                rel_path = rel_path.replace('..', '')  # Prevent directory traversal
-                filepath = os.path.join(RECORDINGS_DIR, rel_path)  # Build absolute path
-                
-                # Check if file exists and is within the RECORDINGS_DIR
-                if os.path.exists(filepath) and os.path.abspath(filepath).startswith(os.path.abspath(RECORDINGS_DIR)):
+                filepath = _recording_path(recordings_dir, rel_path)  # None if missing or outside the directory
+                if filepath:
                     # Get file size and send headers for streaming
-                    file_size = os.path.getsize(filepath)
-                    self.send_response(200)
-                    self.send_header('Content-Type', 'video/mp4')
-                    self.send_header('Content-Length', file_size)
-                    self.send_header('Content-Disposition', f'inline; filename="{os.path.basename(rel_path)}"')
-                    self.end_headers()
-                    
-                    # Stream the file in 1MB chunks
-                    with open(filepath, 'rb') as f:
-                        while True:
-                            chunk = f.read(1024 * 1024)  # 1MB chunks
-                            if not chunk:
-                                break
-                            self.wfile.write(chunk)
+                    file_stat = os.stat(filepath)
+                    file_size = file_stat.st_size
+                    start, end = 0, file_size - 1
+                    byte_range = RANGE_HEADER.match(self.headers.get('Range', ''))
+                    if byte_range and (byte_range.group(1) or byte_range.group(2)):
+                        # Single byte range (players seeking to a keyframe offset from /api/seek)
+                        if byte_range.group(1):
+                            start = int(byte_range.group(1))
+                            end = min(int(byte_range.group(2)), end) if byte_range.group(2) else end
+                        else:
+                            start = max(0, file_size - int(byte_range.group(2)))  # Suffix range: last N bytes
+                        if start > end:
+                            self.send_response(416)
+                            self.send_header('Content-Range', f'bytes */{file_size}')
+                            self.send_header('Content-Length', 0)
+                            self.end_headers()
+                            return
+                    # Queue for a transfer slot before any header goes out (503 when the queue is full)
+                    shaper = shaper_for(shapers, '/download')
+                    client = self.client_address[0]
+                    try:
+                        send = shaper.acquire(client) if shaper else (lambda nbytes: None)
+                    except ShaperBusy as e:
+                        self._send_busy(e)
+                        return
+                    try:
+                        if byte_range and (byte_range.group(1) or byte_range.group(2)):
+                            self.send_response(206)
+                            self.send_header('Content-Range', f'bytes {start}-{end}/{file_size}')
+                        else:
+                            self.send_response(200)
+                        self.send_header('Content-Type', 'video/mp4')
+                        self.send_header('Content-Length', end - start + 1)
+                        self.send_header('Accept-Ranges', 'bytes')
+                        self.send_header('Last-Modified', formatdate(file_stat.st_mtime, usegmt=True))  # Lets relays cache finished segments
+                        self.send_header('Content-Disposition', f'inline; filename="{os.path.basename(rel_path)}"')
+                        self.end_headers()
+
+                        # Stream the requested bytes in 64KB chunks, each paced by the route's token buckets
+                        with open(filepath, 'rb') as f:
+                            f.seek(start)
+                            remaining = end - start + 1
+                            while remaining > 0:
+                                chunk = f.read(min(remaining, 64 * 1024))
+                                if not chunk:
+                                    break
+                                send(len(chunk))
+                                self.wfile.write(chunk)
+                                remaining -= len(chunk)
+                    finally:
+                        if shaper:
+                            shaper.release(client)
                 else:
                     self.send_error(404, 'File not found')  # Missing or outside expected directory
-                    self.end_headers()
             else:
                 self.send_error(404)  # Unknown route
-                self.end_headers()
+
+        def do_POST(self):  # Settings changes, DVR saves
+            path, camera = self.path, None
+            match = CAMERA_ROUTE.match(path)
+            if match:
+                camera, path = match.group(1), match.group(2)  # Pages under /cam/<id>/ post relative URLs
+            if urlparse(path).path == '/api/dvr/save':
+                self.rfile.read(int(self.headers.get('Content-Length') or 0))  # Parameters are in the query; keep the connection in sync
+                self._save_dvr(parse_qs(urlparse(path).query), camera)
+                return
+            if path != '/api/config':
+                self.send_error(404)
+                return
+            try:
+                length = int(self.headers.get('Content-Length') or 0)
+                changes = json.loads(self.rfile.read(length) or b'{}')
+                if not isinstance(changes, dict):
+                    raise SettingsError('expected a JSON object of setting → value')
+                changed = SETTINGS.update(changes)  # Validated, applied to running cameras, persisted
+            except ValueError as e:  # Bad JSON or SettingsError
+                self.send_error(400, str(e))
+                return
+            self._send_json({'changed': changed, 'values': SETTINGS.describe()['values']})
 
     return StreamingHandler  # Return the bound handler class to the server
@@ -0,0 +1,275 @@
+import json  # Session marker format
+import logging  # Repairs and irrecoverable segments
+import os  # Segment files and day directories
+import queue  # Segments waiting for verification
+import struct  # Length-prefixed NAL units in mdat
+import subprocess  # ffmpeg remux of recovered H264
+import threading  # Background verifier
+import time  # Session start, fps estimate
+from datetime import datetime, timedelta  # Start-up sweep window
+
+from . import metadata  # 'integrity' field shown in listings
+from .mp4 import iter_top_level, parse_keyframe_index, MP4Error
+from .keyframes import SEGMENT_NAME, segment_start
+from .clips import FFMPEG, _lower_priority  # Same ffmpeg invocation and priority as clip cuts
+from .config import SESSION_FILE, INTEGRITY_STOP_TIMEOUT
+
+START_CODE = b'\x00\x00\x00\x01'
+NAL_SLICE, NAL_IDR, NAL_SPS, NAL_PPS = 1, 5, 7, 8
+MIN_FPS, MAX_FPS = 1, 60
+
+
+def inspect_segment(path):
+    # Structural check of an MP4 without decoding → (problem or None, keyframe index or None).
+    # Top-level boxes must be complete with ftyp, moov and mdat present, and the video track's sample
+    # tables must parse with keyframes inside the file; fragmented files (moof) pass once moov is complete.
+    try:
+        with open(path, 'rb') as f:
+            file_size = os.fstat(f.fileno()).st_size
+            boxes = {}
+            for box_type, offset, size in iter_top_level(f):
+                if offset + size > file_size:
+                    return f'{box_type.decode("latin-1")} box truncated', None
+                boxes.setdefault(box_type, (offset, size))
+    except (OSError, MP4Error, struct.error) as e:
+        return str(e), None
+    for box_type in (b'ftyp', b'moov'):
+        if box_type not in boxes:
+            return f'no {box_type.decode()} box', None
+    if b'moof' in boxes:
+        return None, None
+    if b'mdat' not in boxes:
+        return 'no mdat box', None
+    try:
+        index = parse_keyframe_index(path)
+    except (OSError, MP4Error, KeyError, IndexError, struct.error) as e:
+        return f'bad sample tables: {e}', None
+    if not index['keyframes']:
+        return 'no keyframes', None
+    if index['keyframes'][-1][1] >= file_size:
+        return 'samples point past the end of the file', None
+    return None, index
+
+
+def check_segment(path):
+    # (ok, reason)
+    problem, _ = inspect_segment(path)
+    return problem is None, problem
+
+
+def _truncated_mdat(path):
+    # (payload start, end) of the mdat a cut-off recording leaves behind (size 0 or overrunning the file)
+    with open(path, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        try:
+            for box_type, offset, size in iter_top_level(f):
+                if box_type == b'mdat':
+                    f.seek(offset)
+                    header = 16 if struct.unpack('>I', f.read(4))[0] == 1 else 8
+                    return offset + header, min(offset + size, file_size)
+        except MP4Error:
+            pass
+    return None
+
+
+def recover_h264(path):
+    # Locate the H264 left in a segment's mdat: ([(offset, length)] of NAL units from the first SPS, frames). The mdat
+    # holds 4-byte length-prefixed NAL units. The recorder's encoder repeats SPS/PPS before every keyframe, so the
+    # stream decodes without the lost moov. Only the length prefixes are read; scanning stops at the first length that
+    # cannot be right (the cut).
+    span = _truncated_mdat(path)
+    if span is None:
+        return [], 0
+    pos, end = span
+    units = []
+    frames = 0
+    with open(path, 'rb') as f:
+        while pos + 5 <= end:
+            f.seek(pos)
+            header = f.read(5)
+            length = struct.unpack_from('>I', header)[0] if len(header) == 5 else 0
+            if length == 0 or pos + 4 + length > end or header[4] & 0x80:
+                break  # Truncated final NAL, zero padding or garbage: the recording stopped here
+            nal_type = header[4] & 0x1F
+            if units or nal_type == NAL_SPS:
+                units.append((pos + 4, length))
+                frames += nal_type in (NAL_SLICE, NAL_IDR)
+            pos += 4 + length
+    return (units, frames) if frames else ([], 0)
+
+
+def repair_segment(path, fps=None):
+    # Rebuild a segment without moov from its H264; returns True once the repaired file checks out. Frames are
+    # re-timed at a constant rate: the frame count over the time between the segment's name and its last write, unless
+    # fps is given.
+    units, frames = recover_h264(path)
+    if not units:
+        return False
+    if fps is None:
+        start = segment_start(os.path.basename(path))
+        elapsed = os.path.getmtime(path) - start.timestamp() if start else 0
+        fps = frames / elapsed if elapsed > 0 else 10
+    fps = min(MAX_FPS, max(MIN_FPS, fps))
+    tmp_path = path + '.repair'  # Not *.mp4: listings never show it
+    process = subprocess.Popen(FFMPEG + ['-f', 'h264', '-framerate', f'{fps:.3f}', '-i', 'pipe:0', '-an', '-c', 'copy',
+                                         '-f', 'mp4', tmp_path],
+                               stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                               preexec_fn=_lower_priority)
+    try:
+        try:
+            with open(path, 'rb') as f:
+                for offset, length in units:
+                    f.seek(offset)
+                    process.stdin.write(START_CODE + f.read(length))  # Length prefix → Annex B start code
+        except BrokenPipeError:
+            pass  # ffmpeg gave up; its error is reported below
+        _, errors = process.communicate()
+        if process.returncode != 0:
+            logging.warning('Repair of %s failed: %s', path, errors.decode('utf-8', 'replace').strip())
+            return False
+        if not check_segment(tmp_path)[0]:
+            return False
+        os.replace(tmp_path, path)
+        return True
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class SegmentVerifier:
+    # Checks finalized segments in the background and repairs or flags damaged ones. The result goes into
+    # the segment metadata (integrity = 'ok' | 'repaired' | 'broken', plus the keyframe index in the same
+    # write); listeners get the path of every repaired segment (listings, uploads).
+    def __init__(self, recordings_dir, repair=True):
+        self.recordings_dir = recordings_dir
+        self.repair = repair
+        self.session_path = os.path.join(recordings_dir, SESSION_FILE)
+        self.queue = queue.Queue()
+        self.listeners = []  # Callables invoked with the path of a repaired segment
+        self.lock = threading.Lock()
+        self.session = {}  # {'clean': bool, 'started': epoch, 'verified_until': epoch of the newest ok segment}
+        self.checked = 0
+        self.repaired = 0
+        self.broken = 0
+        self.swept = 0  # Segments queued by the start-up sweep
+        self.previous_clean = None  # Whether the previous run shut down cleanly (None: first run)
+        self.thread = threading.Thread(target=self._worker, name='segment-verifier', daemon=True)
+
+    def _read_session(self):
+        try:
+            with open(self.session_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_session(self):
+        tmp_path = self.session_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.session, f, separators=(',', ':'))
+        os.replace(tmp_path, self.session_path)
+
+    def start(self):
+        # Call before the recorder's first segment: anything older belongs to the previous run
+        previous = self._read_session()
+        started = time.time()
+        self.previous_clean = bool(previous.get('clean')) if previous else None
+        with self.lock:
+            self.session = {'clean': False, 'started': started,
+                            'verified_until': (previous or {}).get('verified_until', started)}
+            self._write_session()
+        self.thread.start()
+        if previous and not previous.get('clean'):
+            since = self.session['verified_until']  # Newest segment already checked, whichever run it was in
+            logging.info('Unclean shutdown in %s: checking segments after %s', self.recordings_dir,
+                         datetime.fromtimestamp(since).isoformat(timespec='seconds'))
+            self.sweep(since, started)
+
+    def sweep(self, since, until):
+        # Queue segments whose names start in (since, until): only day directories in that range are listed
+        day = datetime.fromtimestamp(since).date()
+        while day <= datetime.fromtimestamp(until).date():
+            day_dir = os.path.join(self.recordings_dir, day.strftime('%Y-%m-%d'))
+            try:
+                names = sorted(entry.name for entry in os.scandir(day_dir) if SEGMENT_NAME.match(entry.name))
+            except OSError:
+                names = []
+            for name in names:
+                start = segment_start(name)
+                if start and since < start.timestamp() < int(until):
+                    self.swept += 1
+                    self.enqueue(os.path.join(day_dir, name))
+            day += timedelta(days=1)
+
+    def enqueue(self, segment_path):
+        # Segment listener entry point
+        self.queue.put(segment_path)
+
+    def stop(self, timeout=INTEGRITY_STOP_TIMEOUT):
+        # Clean shutdown: the next start skips the sweep, so the queue (the recorder's last segment included)
+        # must drain first. Anything still queued at the timeout keeps the session unclean and gets swept.
+        deadline = time.monotonic() + timeout
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logging.warning('Stopping with %d segments unverified in %s; they are checked at the next start',
+                                    self.queue.unfinished_tasks, self.recordings_dir)
+                    return
+                self.queue.all_tasks_done.wait(remaining)
+        with self.lock:
+            if self.session:
+                self.session['clean'] = True
+                self._write_session()
+
+    def verify(self, segment_path):
+        reason, index = inspect_segment(segment_path)
+        status = 'ok' if reason is None else None
+        if status is None and self.repair and repair_segment(segment_path):
+            status = 'repaired'
+            _, index = inspect_segment(segment_path)
+            logging.info('Repaired %s (%s)', segment_path, reason)
+        if status is None:
+            status = 'broken'
+            logging.warning('Segment %s is unplayable: %s', segment_path, reason)
+        fields = {'integrity': status, 'integrity_error': reason}
+        if index:
+            fields.update(duration=index['duration'], keyframes=index['keyframes'])  # One write with the keyframe index
+        metadata.update(segment_path, **fields)
+        with self.lock:
+            self.checked += 1
+            self.repaired += status == 'repaired'
+            self.broken += status == 'broken'
+            start = segment_start(os.path.basename(segment_path))
+            if start and start.timestamp() > self.session.get('verified_until', 0):
+                self.session['verified_until'] = start.timestamp()
+                self._write_session()
+        if status == 'repaired':
+            for listener in self.listeners:
+                try:
+                    listener(segment_path)
+                except Exception as e:
+                    logging.warning('Repair listener failed for %s: %s', segment_path, str(e))
+        return status
+
+    def _worker(self):
+        while True:
+            segment_path = self.queue.get()
+            try:
+                if os.path.exists(segment_path):  # Deleted by retention in the meantime → nothing to do
+                    self.verify(segment_path)
+            except Exception as e:
+                logging.warning('Verification of %s failed: %s', segment_path, str(e))
+            finally:
+                self.queue.task_done()
+
+    def status(self):
+        with self.lock:
+            return {
+                'queued': self.queue.qsize(),
+                'checked': self.checked,
+                'repaired': self.repaired,
+                'broken': self.broken,
+                'swept': self.swept,
+                'previous_clean': self.previous_clean,
+                'verified_until': self.session.get('verified_until'),
+            }
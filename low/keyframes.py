@@ -0,0 +1,79 @@
+import bisect  # Nearest keyframe / segment lookups
+import logging  # Index build failures
+import os  # Day directory listing
+import re  # Segment filename timestamps
+from datetime import datetime, timedelta  # Wall-clock ↔ segment offsets
+
+from . import metadata  # Keyframe index is stored with the other per-segment metadata
+from .mp4 import parse_keyframe_index, MP4Error
+
+SEGMENT_NAME = re.compile(r'recording_(\d{8}_\d{6})\.mp4$')
+
+
+def segment_start(filename):
+    # Wall-clock start of a segment from its recording_YYYYMMDD_HHMMSS.mp4 name
+    match = SEGMENT_NAME.match(filename)
+    try:
+        return datetime.strptime(match.group(1), '%Y%m%d_%H%M%S') if match else None
+    except ValueError:
+        return None  # Matches the pattern but isn't a real time; callers fall back to the file's mtime
+
+
+def index_segment(segment_path):
+    # Segment listener: parse the finished MP4's moov once and store keyframe times/offsets
+    try:
+        index = parse_keyframe_index(segment_path)
+    except (OSError, MP4Error, KeyError, IndexError) as e:
+        logging.warning('Could not index keyframes of %s: %s', segment_path, str(e))
+        return None
+    metadata.update(segment_path, duration=index['duration'], keyframes=index['keyframes'])
+    return index
+
+
+def keyframe_index(segment_path):
+    fields = metadata.get(segment_path)
+    if 'keyframes' in fields:
+        return fields
+    return index_segment(segment_path)  # Segments recorded before indexing existed: build lazily
+
+
+def seek(recordings_dir, when: datetime):
+    # Resolve a wall-clock time to (segment, nearest preceding keyframe) or None
+    # Latest segment starting at/before `when`: in its own day, else the day before (a segment that
+    # started before midnight may run past it)
+    found = None
+    for day_date in (when.date(), when.date() - timedelta(days=1)):
+        day = day_date.strftime('%Y-%m-%d')
+        try:
+            names = os.listdir(os.path.join(recordings_dir, day))
+        except OSError:
+            continue
+        starts = [(segment_start(name), name) for name in names]
+        starts = [(start, name) for start, name in starts if start is not None and start <= when]  # None: not a real time
+        if starts:
+            found = (day,) + max(starts)
+            break
+    if found is None:
+        return None
+    day, start, name = found
+    segment_path = os.path.join(recordings_dir, day, name)
+    index = keyframe_index(segment_path)
+    if not index:
+        return None
+    offset = (when - start).total_seconds()
+    if index['duration'] and offset > index['duration']:
+        return None  # Gap between segments (recorder was down)
+    keyframes = index['keyframes']
+    k = max(0, bisect.bisect_right([kf[0] for kf in keyframes], offset) - 1)
+    keyframe_time, byte_offset = keyframes[k] if keyframes else (0.0, 0)
+    path = f"{day}/{name}"
+    return {
+        'segment': name,
+        'path': path,
+        'segment_start': start.isoformat(),
+        'requested_offset': round(offset, 3),
+        'keyframe_time': keyframe_time,
+        'keyframe_at': (start + timedelta(seconds=keyframe_time)).isoformat(),
+        'byte_offset': byte_offset,
+        'url': f"download/{path}#t={keyframe_time}",  # Media fragment: player starts at the keyframe
+    }
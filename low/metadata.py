@@ -0,0 +1,123 @@
+import json  # Per-day metadata file format
+import os  # Paths and atomic replace
+from threading import Lock  # Serialise appends and compaction across threads
+
+METADATA_FILE = 'segments.json'  # Compacted snapshot per day directory, keyed by segment filename
+JOURNAL_FILE = 'segments.jsonl'  # Changes since the snapshot, one JSON line each; only ever appended to
+COMPACT_LINES = 256  # Fold the journal into the snapshot once it has this many lines and twice as many as segments
+
+_lock = Lock()
+_cache = {}  # day_dir → (snapshot mtime_ns, journal bytes replayed, journal lines, data)
+
+
+def _path(day_dir):
+    return os.path.join(day_dir, METADATA_FILE)
+
+
+def _journal(day_dir):
+    return os.path.join(day_dir, JOURNAL_FILE)
+
+
+def stamp(day_dir):
+    # (snapshot mtime_ns, journal size): changes whenever any segment's metadata in the day changes
+    try:
+        snapshot = os.stat(_path(day_dir)).st_mtime_ns
+    except OSError:
+        snapshot = None
+    try:
+        journal = os.stat(_journal(day_dir)).st_size
+    except OSError:
+        journal = 0
+    return snapshot, journal
+
+
+def _replay(data, chunk):
+    # Apply complete journal lines to data; returns (bytes consumed, lines applied). A torn last line
+    # (power cut mid-append) stays unconsumed, and the next append starts on a fresh line.
+    end = chunk.rfind(b'\n') + 1
+    lines = 0
+    for line in chunk[:end].splitlines():
+        try:
+            change = json.loads(line)
+            name = change['name']
+        except (ValueError, KeyError, TypeError):
+            continue
+        if change.get('remove'):
+            data.pop(name, None)
+        else:
+            data[name] = {**data.get(name, {}), **change.get('set', {})}
+        lines += 1
+    return end, lines
+
+
+def load_day(day_dir):
+    # Metadata for every segment in a day directory: {filename: {field: value}}
+    snapshot, journal_size = stamp(day_dir)
+    cached = _cache.get(day_dir)
+    if cached and cached[0] == snapshot and cached[1] == journal_size:
+        return cached[3]
+    if cached and cached[0] == snapshot and cached[1] < journal_size:
+        data, offset, lines = dict(cached[3]), cached[1], cached[2]  # Only the new journal lines are read
+    else:
+        data, offset, lines = {}, 0, 0
+        if snapshot is not None:
+            try:
+                with open(_path(day_dir)) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = {}
+    try:
+        with open(_journal(day_dir), 'rb') as f:
+            f.seek(offset)
+            consumed, applied = _replay(data, f.read())
+    except OSError:
+        consumed, applied = 0, 0
+    _cache[day_dir] = (snapshot, offset + consumed, lines + applied, data)
+    return data
+
+
+def get(segment_path):
+    return load_day(os.path.dirname(segment_path)).get(os.path.basename(segment_path), {})
+
+
+def _append(day_dir, change):
+    line = json.dumps(change, separators=(',', ':')).encode('utf-8') + b'\n'
+    with open(_journal(day_dir), 'a+b') as f:
+        if f.tell():
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                line = b'\n' + line  # Terminate a torn line left by a crash instead of merging into it
+        f.write(line)
+
+
+def _compact(day_dir, data):
+    # Rewrite the snapshot and drop the journal; replaying a journal twice is harmless if we crash in between
+    tmp_path = _path(day_dir) + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(tmp_path, _path(day_dir))
+    try:
+        os.remove(_journal(day_dir))
+    except OSError:
+        pass
+    _cache.pop(day_dir, None)
+
+
+def update(segment_path, **fields):
+    # Merge fields into a segment's metadata: one appended journal line, not a rewrite of the day
+    day_dir, name = os.path.split(segment_path)
+    with _lock:
+        _append(day_dir, {'name': name, 'set': fields})
+        data = load_day(day_dir)
+        entry = data.get(name, {})
+        if _cache[day_dir][2] >= max(COMPACT_LINES, 2 * len(data)):  # Geometric: amortised O(1) per update
+            _compact(day_dir, data)
+    return entry
+
+
+def remove(segment_path):
+    day_dir, name = os.path.split(segment_path)
+    with _lock:
+        if name not in load_day(day_dir):
+            return
+        _append(day_dir, {'name': name, 'remove': True})
@@ -0,0 +1,156 @@
+import struct  # Big-endian box fields
+
+# Boxes whose payload is just more boxes
+CONTAINERS = {b'moov', b'trak', b'mdia', b'minf', b'stbl', b'edts', b'dinf', b'udta'}
+
+
+class MP4Error(Exception):
+    pass
+
+
+def iter_boxes(data, start=0, end=None):
+    # Yield (type, payload_start, box_end) for boxes laid out back to back in data[start:end]
+    end = len(data) if end is None else end
+    pos = start
+    while pos + 8 <= end:
+        size, box_type = struct.unpack_from('>I4s', data, pos)
+        header = 8
+        if size == 1:
+            if pos + 16 > end:
+                raise MP4Error('truncated box header')
+            size = struct.unpack_from('>Q', data, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - pos  # Box extends to the end of its parent
+        if size < header or pos + size > end:
+            raise MP4Error(f'box {box_type!r} overruns its parent')
+        yield box_type, pos + header, pos + size
+        pos += size
+
+
+def iter_top_level(f):
+    # Yield (type, offset, size) for top-level boxes of an open file without reading payloads
+    f.seek(0, 2)
+    file_size = f.tell()
+    pos = 0
+    while pos + 8 <= file_size:
+        f.seek(pos)
+        header = f.read(16)
+        size, box_type = struct.unpack_from('>I4s', header)
+        if size == 1:
+            size = struct.unpack_from('>Q', header, 8)[0]
+        elif size == 0:
+            size = file_size - pos
+        if size < 8:
+            raise MP4Error(f'invalid size for top-level box {box_type!r}')
+        yield box_type, pos, size
+        if pos + size > file_size:
+            return  # Truncated final box; caller decides what that means
+        pos += size
+
+
+def find(data, path, start=0, end=None):
+    # Payload (start, end) of the first box matching a path like [b'mdia', b'minf']
+    for box_type, payload, box_end in iter_boxes(data, start, end):
+        if box_type == path[0]:
+            if len(path) == 1:
+                return payload, box_end
+            return find(data, path[1:], payload, box_end)
+    return None
+
+
+def read_moov(path):
+    # Raw bytes of the moov box (None if the file has no complete moov, e.g. recording was cut)
+    with open(path, 'rb') as f:
+        for box_type, offset, size in iter_top_level(f):
+            if box_type == b'moov':
+                f.seek(offset)
+                data = f.read(size)
+                if len(data) < size:
+                    return None
+                return data
+    return None
+
+
+def _video_track(moov):
+    for box_type, payload, box_end in iter_boxes(moov, 8):
+        if box_type != b'trak':
+            continue
+        hdlr = find(moov, [b'mdia', b'hdlr'], payload, box_end)
+        if hdlr and moov[hdlr[0] + 8:hdlr[0] + 12] == b'vide':
+            return payload, box_end
+    return None
+
+
+def _table(data, box, fmt, header=8):
+    # Entries of a full box with a uint32 entry count after version/flags
+    start, _ = box
+    count = struct.unpack_from('>I', data, start + header - 4)[0]
+    size = struct.calcsize(fmt)
+    return [struct.unpack_from(fmt, data, start + header + i * size) for i in range(count)]
+
+
+def parse_keyframe_index(path):
+    # Keyframe times (seconds from segment start) and byte offsets, read from moov only
+    moov = read_moov(path)
+    if moov is None:
+        raise MP4Error('no moov box')
+    track = _video_track(moov)
+    if track is None:
+        raise MP4Error('no video track')
+    stbl = find(moov, [b'mdia', b'minf', b'stbl'], *track)
+    mdhd = find(moov, [b'mdia', b'mdhd'], *track)
+    if stbl is None or mdhd is None:
+        raise MP4Error('incomplete video track')
+
+    version = moov[mdhd[0]]
+    if version == 1:
+        timescale, duration = struct.unpack_from('>IQ', moov, mdhd[0] + 20)
+    else:
+        timescale, duration = struct.unpack_from('>II', moov, mdhd[0] + 12)
+
+    boxes = {box_type: (payload, box_end) for box_type, payload, box_end in iter_boxes(moov, *stbl)}
+
+    # Decode time of every sample
+    times = []
+    t = 0
+    for count, delta in _table(moov, boxes[b'stts'], '>II'):
+        for _ in range(count):
+            times.append(t)
+            t += delta
+
+    # Size of every sample
+    stsz = boxes[b'stsz'][0]
+    uniform, count = struct.unpack_from('>II', moov, stsz + 4)
+    sizes = [uniform] * count if uniform else list(struct.unpack_from(f'>{count}I', moov, stsz + 12))
+
+    # Byte offset of every sample: chunk offsets + running sizes within each chunk
+    if b'stco' in boxes:
+        chunk_offsets = [c[0] for c in _table(moov, boxes[b'stco'], '>I')]
+    else:
+        chunk_offsets = [c[0] for c in _table(moov, boxes[b'co64'], '>Q')]
+    stsc = _table(moov, boxes[b'stsc'], '>III')
+    offsets = []
+    sample = 0
+    for i, (first_chunk, per_chunk, _) in enumerate(stsc):
+        last_chunk = stsc[i + 1][0] - 1 if i + 1 < len(stsc) else len(chunk_offsets)
+        for chunk in range(first_chunk - 1, last_chunk):
+            pos = chunk_offsets[chunk]
+            for _ in range(per_chunk):
+                if sample >= len(sizes):
+                    break
+                offsets.append(pos)
+                pos += sizes[sample]
+                sample += 1
+
+    # Sync samples (1-based); absent stss means every sample is a keyframe
+    if b'stss' in boxes:
+        sync = [s[0] - 1 for s in _table(moov, boxes[b'stss'], '>I')]
+    else:
+        sync = range(len(offsets))
+
+    keyframes = [(round(times[s] / timescale, 3), offsets[s]) for s in sync if s < len(offsets) and s < len(times)]
+    return {
+        'duration': round(duration / timescale, 3) if timescale else 0.0,
+        'keyframes': keyframes,
+    }
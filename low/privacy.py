@@ -0,0 +1,108 @@
+import logging  # ISP crop fallbacks
+import threading  # Mask cache shared by the stream thread and the camera's pre-callback
+
+import numpy as np  # Mask multiply
+import cv2  # Polygon rasterisation
+
+
+def _relative(points, crop):
+    # Normalised full-frame (x, y) → normalised coordinates inside the crop rectangle
+    cx, cy, cw, ch = crop or (0.0, 0.0, 1.0, 1.0)
+    return [((x - cx) / cw, (y - cy) / ch) for x, y in points]
+
+
+class PrivacyFilter:
+    # Polygon privacy masks and an optional region-of-interest crop for one camera. Coordinates are normalised (0..1)
+    # against the full sensor frame, so they survive resolution changes. Polygons are rasterised once per frame shape
+    # into a single multiplier mask; applying it is one vectorised multiply over the rows the mask touches, whatever
+    # the number of polygons.
+    def __init__(self, masks=(), crop=None):
+        self.masks = [list(polygon) for polygon in masks]
+        self.crop = tuple(crop) if crop else None  # (x, y, width, height), normalised
+        self.isp_crop = None  # Sensor-pixel ScalerCrop rectangle once the ISP does the cropping
+        self.masked_upstream = False  # True when pre_callback already masks every buffer
+        self.lock = threading.Lock()
+        self.cache = {}  # (frame shape, crop) → (row slice, mask band) or None when nothing is masked
+
+    def __bool__(self):
+        return bool(self.masks or self.crop)
+
+    def apply_isp_crop(self, picam2):
+        # Crop in the ISP (Picamera2 ScalerCrop) so cropped-away pixels are never scaled, copied or encoded
+        if not self.crop:
+            return None
+        try:
+            max_x, max_y, max_w, max_h = picam2.camera_properties['ScalerCropMaximum']
+        except (AttributeError, KeyError, TypeError, ValueError):
+            logging.info('Camera has no ScalerCrop; cropping in software')
+            return None
+        x, y, w, h = self.crop
+        self.isp_crop = (max_x + int(x * max_w), max_y + int(y * max_h), int(w * max_w), int(h * max_h))
+        return self.isp_crop
+
+    def crop_size(self, height):
+        # Output size for the ISP crop at the given height, keeping the crop's own aspect ratio
+        _, _, crop_w, crop_h = self.isp_crop
+        return max(2, int(height * crop_w / crop_h) // 2 * 2), height
+
+    def _mask_for(self, shape, crop):
+        key = (shape, crop)
+        with self.lock:
+            if key in self.cache:
+                return self.cache[key]
+            height, width = shape[:2]
+            entry = None
+            if self.masks:
+                mask = np.ones((height, width), dtype=np.uint8)
+                polygons = [
+                    np.array([(round(px * width), round(py * height)) for px, py in _relative(polygon, crop)],
+                             dtype=np.int32)
+                    for polygon in self.masks
+                ]
+                cv2.fillPoly(mask, polygons, 0)  # All polygons in one rasterisation pass
+                rows = np.flatnonzero(mask.min(axis=1) == 0)  # Only rows with masked pixels are touched per frame
+                if rows.size:
+                    top, bottom = int(rows[0]), int(rows[-1]) + 1
+                    band = mask[top:bottom]
+                    if len(shape) == 3:
+                        band = band[:, :, None]  # Broadcast over colour channels
+                    entry = (slice(top, bottom), np.ascontiguousarray(band))
+            self.cache[key] = entry
+            return entry
+
+    def mask(self, frame, crop=None):
+        # Black out masked regions in place (copying first if the buffer is read-only);
+        # crop is the normalised region the frame shows (None = full sensor frame)
+        entry = self._mask_for(frame.shape, crop)
+        if entry is None:
+            return frame
+        if not frame.flags.writeable:
+            frame = frame.copy()
+        rows, band = entry
+        np.multiply(frame[rows], band, out=frame[rows])
+        return frame
+
+    def unmasked_rows(self, shape):
+        # Rows of an upstream-masked buffer that no polygon touches: the taller strip above or below the masked band
+        entry = self._mask_for(shape, self.crop if self.isp_crop else None)
+        if entry is None:
+            return slice(None)
+        band = entry[0]
+        strip = slice(0, band.start) if band.start >= shape[0] - band.stop else slice(band.stop, None)
+        return strip if band.start or band.stop < shape[0] else slice(None)  # Masks span every row: whole frame
+
+    def apply(self, frame):
+        # Stream-loop path: software crop (when the ISP isn't doing it), then masks
+        if self.crop and not self.isp_crop:
+            height, width = frame.shape[:2]
+            x, y, w, h = self.crop
+            frame = frame[int(y * height):int((y + h) * height), int(x * width):int((x + w) * width)]  # View, no copy
+        if not self.masks or self.masked_upstream:
+            return frame
+        return self.mask(frame, self.crop)
+
+    def pre_callback(self, request):
+        # Picamera2 pre-callback: mask the main buffer before encoders (recording) and captures see it
+        from picamera2 import MappedArray  # Only reached with a real Picamera2
+        with MappedArray(request, 'main') as m:
+            self.mask(m.array, self.crop if self.isp_crop else None)
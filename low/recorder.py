@@ -1,4 +1,5 @@
-from threading import Thread
+import logging  # Report failing segment listeners without stopping the recorder
+from threading import Thread, Lock, current_thread
 from datetime import datetime
 import os  # Filesystem paths and directory creation
 import time  # Segment duration sleep
@@ -7,57 +8,200 @@ from picamera2.encoders import H264Encoder
 from picamera2.outputs import FfmpegOutput
 
 from .config import RECORDINGS_DIR
+from .storage import SegmentStorage  # Staging + sequential flush of finished segments
+
+STALL_SECONDS = 15  # No encoded frames and no file growth for this long → restart the encoder
+SPACE_RETRY_SECONDS = 30  # How often to re-check free space while paused for disk space
+MAX_BACKOFF_SECONDS = 60  # Cap for the restart backoff
+WATCHDOG_INTERVAL = 5  # How often the watchdog checks the recording thread
+
+
+class RecorderStalled(Exception):
+    pass
+
+
+class MonitoredFfmpegOutput(FfmpegOutput):
+    # FfmpegOutput that records when the encoder last handed it a frame
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.frames = 0
+        self.last_frame_at = time.monotonic()
+
+    def outputframe(self, *args, **kwargs):
+        self.frames += 1
+        self.last_frame_at = time.monotonic()
+        return super().outputframe(*args, **kwargs)
 
 
 class VideoRecorder:
-    def __init__(self, picam2, segment_seconds: int = 60):
+    def __init__(self, picam2, segment_seconds: int = 60, output_dir: str = RECORDINGS_DIR, storage: SegmentStorage = None,
+                 min_free_bytes: int = 1024 ** 3, dvr=None):
         self.picam2 = picam2  # Shared PiCamera2 instance
         self.recording = False  # Flag to control background loop
-        self.output_dir = RECORDINGS_DIR  # Target directory for MP4 segments
+        self.output_dir = output_dir  # Target directory for MP4 segments
         os.makedirs(self.output_dir, exist_ok=True)  # Ensure output directory exists
         self.recording_thread = None  # Background daemon thread handle
-        self.segment_seconds = int(segment_seconds)  # Fixed length per segment
-        self.min_free_bytes = 1 * 1024 * 1024 * 1024  # 1GB free-space threshold
+        self.watchdog_thread = None  # Restarts the recording thread if it ever dies
+        self.segment_seconds = int(segment_seconds)  # Length per segment (re-read for every segment)
+        self.min_free_bytes = int(min_free_bytes)  # Free-space threshold (1GB by default)
+        self.segment_listeners = []  # Callables invoked with the MP4 path after each segment closes
+        self.state_listeners = []  # Callables invoked with (state, last error) when the state changes
+        self.storage = storage or SegmentStorage(self.output_dir)  # Where segments are written/flushed
+        self.dvr = dvr  # DvrBuffer fed by the same encoder (last minutes in memory), or None
+        self.storage.recover()  # Flush anything a previous run left in staging
+
+        # Health state exposed via /api/recorder
+        self.state = 'stopped'  # stopped | recording | waiting_for_space | restarting
+        self.state_lock = Lock()
+        self.restarts = 0  # Encoder restarts after errors or stalls
+        self.thread_restarts = 0  # Recording threads revived by the watchdog
+        self.segments_recorded = 0
+        self.last_error = None
+        self.last_segment_at = None  # Epoch time the last segment closed
+        self.current_file = None
+        self.started_at = None
 
     def start_recording(self):
         if not self.recording:  # Prevent double-start
             self.recording = True
-            self.recording_thread = Thread(target=self._record_segment)
-            self.recording_thread.daemon = True  # Exit with main program
-            self.recording_thread.start()
+            self.started_at = time.time()
+            self._start_thread()
+            self.watchdog_thread = Thread(target=self._watchdog, daemon=True)
+            self.watchdog_thread.start()
+
+    def _start_thread(self):
+        self.recording_thread = Thread(target=self._record_segment)
+        self.recording_thread.daemon = True  # Exit with main program
+        self.recording_thread.start()
+
+    def _set_state(self, state, error=None):
+        with self.state_lock:
+            changed = state != self.state
+            self.state = state
+            if error is not None:
+                self.last_error = f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}: {error}"
+            last_error = self.last_error
+        if not changed:
+            return
+        for listener in self.state_listeners:
+            try:
+                listener(state, last_error)
+            except Exception as e:
+                logging.warning('Recorder state listener failed: %s', str(e))
+
+    def _watchdog(self):
+        # Last line of defence: the loop below catches its own errors, but never let recording die silently
+        while self.recording and self.watchdog_thread is current_thread():  # A restart replaces the watchdog
+            time.sleep(WATCHDOG_INTERVAL)
+            if self.recording and self.watchdog_thread is current_thread() and not self.recording_thread.is_alive():
+                self.thread_restarts += 1
+                self._set_state('restarting', 'recording thread exited unexpectedly')
+                logging.warning('Recorder thread for %s died; restarting', self.output_dir)
+                self._start_thread()
 
     def _record_segment(self):
+        backoff = 1
         while self.recording:
-            # Check free space before starting a new segment
+            # Check free space before starting a new segment; wait (not exit) until space is freed
             total, used, free = shutil.disk_usage(self.output_dir)
             if free < self.min_free_bytes:
-                # Not enough space; stop recording loop immediately
-                self.recording = False
-                break
+                self._set_state('waiting_for_space')
+                self._sleep(SPACE_RETRY_SECONDS)
+                continue
+
+            try:
+                self._record_one_segment()
+                backoff = 1  # Healthy segment resets the backoff
+            except Exception as e:
+                self.current_file = None
+                self.restarts += 1
+                self._set_state('restarting', str(e) or type(e).__name__)
+                logging.warning('Recorder error for %s (restart %d in %ds): %s',
+                                self.output_dir, self.restarts, backoff, str(e))
+                try:
+                    self.picam2.stop_recording()  # Tear down whatever is left of the encoder
+                except Exception:
+                    pass
+                self._sleep(backoff)
+                backoff = min(MAX_BACKOFF_SECONDS, backoff * 2)
+        self._set_state('stopped')
 
-            # Get current timestamp and create date-based directory
-            now = datetime.now()
-            date_dir = os.path.join(self.output_dir, now.strftime('%Y-%m-%d'))
+    def _sleep(self, seconds):
+        # Sleep in short steps so stop_recording() is honoured promptly
+        deadline = time.monotonic() + seconds
+        while self.recording and time.monotonic() < deadline:
+            time.sleep(min(1.0, deadline - time.monotonic()))
+
+    def _record_one_segment(self):
+        # Get current timestamp and build the date-based target path
+        now = datetime.now()
+        date_dir = os.path.join(self.output_dir, now.strftime('%Y-%m-%d'))
+        timestamp = now.strftime('%Y%m%d_%H%M%S')
+        output_file = os.path.join(date_dir, f'recording_{timestamp}.mp4')
+
+        # Encoder writes to the staging area when configured, else straight to the date directory
+        written_file = self.storage.staging_path(output_file)
+        if written_file == output_file:
             os.makedirs(date_dir, exist_ok=True)  # Ensure date directory exists
-            
-            # Build timestamped filename in date directory
-            timestamp = now.strftime('%Y%m%d_%H%M%S')
-            output_file = os.path.join(date_dir, f'recording_{timestamp}.mp4')
 
-            # Configure encoder and file output
-            encoder = H264Encoder()
-            output = FfmpegOutput(output_file)
+        # Configure encoder and file output (no `.pts` sidecar: saves a create+delete per segment)
+        encoder = H264Encoder()
+        output = MonitoredFfmpegOutput(written_file)
+        self.picam2.start_recording(encoder, [output, self.dvr] if self.dvr else output)  # One encode feeds both
+        self.current_file = output_file
+        self._set_state('recording')
+
+        # Record for the fixed segment length, watching for a stalled encoder
+        started = time.monotonic()
+        last_size, last_growth = -1, started
+        while self.recording and time.monotonic() - started < self.segment_seconds:
+            time.sleep(1)
+            try:
+                size = os.path.getsize(written_file)
+            except OSError:
+                size = -1
+            now_mono = time.monotonic()
+            if size > last_size:
+                last_size, last_growth = size, now_mono
+            if now_mono - output.last_frame_at > STALL_SECONDS and now_mono - last_growth > STALL_SECONDS:
+                raise RecorderStalled(f'no frames or file growth for {STALL_SECONDS}s')
 
-            # Start recording; write `.pts` sidecar (presentation timestamps)
-            self.picam2.start_recording(encoder, output, pts=f"{output_file}.pts")
+        self.picam2.stop_recording()  # End current segment
+        self.current_file = None
+        self.segments_recorded += 1
+        self.last_segment_at = time.time()
 
-            time.sleep(self.segment_seconds)  # Record for fixed segment length
+        if written_file == output_file:
+            self._finish_segment(written_file, output_file)
+        else:
+            # Flush from RAM to the card off the recording thread so the next segment starts at once
+            Thread(target=self._finish_segment, args=(written_file, output_file), daemon=True).start()
 
-            self.picam2.stop_recording()  # End current segment
+    def _finish_segment(self, written_file, output_file):
+        try:
+            self.storage.commit(written_file, output_file)
+        except OSError as e:
+            logging.warning('Could not store segment %s: %s', output_file, str(e))
+            return
+        for listener in self.segment_listeners:
+            try:
+                listener(output_file)
+            except Exception as e:
+                logging.warning('Segment listener failed for %s: %s', output_file, str(e))
 
-            # Clean up sidecar if present; keep only the MP4
-            if os.path.exists(f"{output_file}.pts"):
-                os.remove(f"{output_file}.pts")
+    def status(self):
+        with self.state_lock:
+            state, last_error = self.state, self.last_error
+        return {
+            'state': state,
+            'restarts': self.restarts,
+            'thread_restarts': self.thread_restarts,
+            'segments_recorded': self.segments_recorded,
+            'current_file': self.current_file,
+            'last_segment_at': self.last_segment_at,
+            'last_error': last_error,
+            'uptime_seconds': int(time.time() - self.started_at) if self.started_at and self.recording else 0,
+        }
 
     def stop_recording(self):
         self.recording = False  # Signal loop to exit
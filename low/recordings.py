@@ -0,0 +1,198 @@
+import os  # Directory scans
+import re  # Day directory / segment name patterns
+from datetime import datetime  # Display dates
+from threading import Lock  # Indexes are shared by handler threads and segment listeners
+
+from . import metadata  # Upload markers etc. shown in listings
+from .config import ARCHIVE_SUBDIR
+from .keyframes import segment_start  # Segment start time parsed from its filename
+
+DAY_DIR = re.compile(r'\d{4}-\d{2}-\d{2}$')  # Only these are scanned, so cam/ and archive/ are never mixed in
+
+
+def _scan_day(day_dir, rel_dir, tier, day=None, known=None):
+    # One os.scandir pass over a directory → (videos newest first, {name: (size, timestamp)}).
+    # Names in `known` (the previous scan) are finished segments and reused without a stat; only new
+    # files and the previously newest one (possibly still recording) are stat'ed. day=None groups
+    # files by their own date, for flat layouts.
+    known = known or {}
+    previous_newest = max(known) if known else None
+    files = {}
+    try:
+        entries = list(os.scandir(day_dir))
+    except OSError:
+        return [], files
+    for entry in entries:
+        name = entry.name
+        if not name.endswith('.mp4'):
+            continue
+        cached = known.get(name)
+        if cached is None or name == previous_newest:
+            try:
+                if not entry.is_file():  # d_type from the directory read; no syscall
+                    continue
+                stat = entry.stat()  # The only syscall per new file
+            except OSError:
+                continue
+            start = segment_start(name)  # Timestamp from recording_YYYYMMDD_HHMMSS.mp4, not from the inode
+            cached = (stat.st_size, start.timestamp() if start else stat.st_mtime)
+        files[name] = cached
+
+    videos = []
+    day_meta = metadata.load_day(day_dir) if files else {}
+    for name, (size, timestamp) in files.items():
+        dt = datetime.fromtimestamp(timestamp)
+        fields = day_meta.get(name, {})
+        videos.append({
+            'name': name,
+            'path': f"{rel_dir}/{name}" if rel_dir else name,  # Relative path for downloads
+            'size': f"{size / (1024*1024):.1f} MB",
+            'date': dt.strftime('%Y-%m-%d %H:%M:%S'),
+            'tier': tier,
+            'uploaded': bool(fields.get('uploaded')),
+            'labels': fields.get('labels', []),  # Detector labels seen in the segment
+            'integrity': fields.get('integrity'),  # 'ok' | 'repaired' | 'broken' once verified, else None
+            'day': day or dt.strftime('%Y-%m-%d'),
+            'bytes': size,
+            'timestamp': timestamp,
+        })
+    videos.sort(key=lambda v: (v['timestamp'], v['name']), reverse=True)
+    return videos, files
+
+
+class RecordingsIndex:
+    # Per-directory listing cache: each day is rescanned only when its directory changes
+    def __init__(self, scan_dir, recordings_dir, tier='full'):
+        self.scan_dir = scan_dir  # Tree holding YYYY-MM-DD directories
+        self.rel_prefix = os.path.relpath(scan_dir, recordings_dir)  # Download paths stay relative to the camera
+        if self.rel_prefix == '.':
+            self.rel_prefix = ''
+        self.tier = tier
+        self.lock = Lock()
+        self.day_cache = {}  # day → ((dir mtime_ns, metadata stamp), videos, {name: (size, timestamp)})
+        self.root_cache = None  # ((root mtime_ns, metadata stamp), {day: videos}, [day names]) for root-level files and day list
+        self.root_files = {}  # {name: (size, timestamp)} of root-level files from the last root scan
+
+    def _rel(self, name):
+        return f"{self.rel_prefix}/{name}" if self.rel_prefix else name
+
+    def _root(self):
+        # Day directories plus legacy flat files in the root (grouped by their mtime date)
+        try:
+            mtime = (os.stat(self.scan_dir).st_mtime_ns, metadata.stamp(self.scan_dir))  # Journal appends don't touch the dir
+        except OSError:
+            return {}, []
+        with self.lock:
+            if self.root_cache and self.root_cache[0] == mtime:
+                return self.root_cache[1], self.root_cache[2]
+        days = set()
+        for entry in os.scandir(self.scan_dir):
+            if entry.is_dir() and DAY_DIR.match(entry.name):
+                days.add(entry.name)
+        flat = {}
+        videos, self.root_files = _scan_day(self.scan_dir, self.rel_prefix, self.tier, known=self.root_files)
+        for video in videos:
+            flat.setdefault(video['day'], []).append(video)
+            days.add(video['day'])
+        day_list = sorted(days, reverse=True)
+        with self.lock:
+            self.root_cache = (mtime, flat, day_list)
+        return flat, day_list
+
+    def days(self):
+        # Day names, newest first
+        return self._root()[1]
+
+    def day(self, day):
+        # All videos of one day, newest first (cached until the directory changes)
+        day_dir = os.path.join(self.scan_dir, day)
+        try:
+            mtime = (os.stat(day_dir).st_mtime_ns, metadata.stamp(day_dir))  # Labels/uploads/integrity changes too
+        except OSError:
+            mtime = None
+        with self.lock:
+            cached = self.day_cache.get(day)
+        if cached and cached[0] == mtime:
+            videos = cached[1]
+        elif mtime is None:
+            videos = []
+        else:
+            videos, files = _scan_day(day_dir, self._rel(day), self.tier, day, known=cached[2] if cached else None)
+            with self.lock:
+                self.day_cache[day] = (mtime, videos, files)
+        flat = self._root()[0].get(day)
+        if flat:
+            videos = sorted(videos + flat, key=lambda v: (v['timestamp'], v['name']), reverse=True)
+        return videos
+
+    def note_segment(self, segment_path):
+        # Segment listener: force a rescan of just that directory. Other finished files are still reused;
+        # this one is re-stat'ed, since it may be an existing segment rewritten in place (repair).
+        day_dir, name = os.path.split(segment_path)
+        day = os.path.basename(day_dir)
+        with self.lock:
+            cached = self.day_cache.get(day)
+            if cached:
+                known = {n: v for n, v in cached[2].items() if n != name}
+                self.day_cache[day] = (None, cached[1], known)
+            self.root_files = {n: v for n, v in self.root_files.items() if n != name}
+            self.root_cache = None
+
+    def summary(self, day):
+        videos = self.day(day)
+        return {
+            'date': day,
+            'count': len(videos),
+            'bytes': sum(v['bytes'] for v in videos),
+            'first': videos[-1]['date'] if videos else None,
+            'last': videos[0]['date'] if videos else None,
+        }
+
+    def summaries(self):
+        return [self.summary(day) for day in self.days()]
+
+    def iter_videos(self, date=None, cursor=None, label=None):
+        # Newest-first iterator; a cursor ("<day>|<path>" of the last item seen) skips straight to its day.
+        # With a label only segments whose detections include it are yielded.
+        days = [date] if date else self.days()
+        cursor_day, _, cursor_path = (cursor or '').partition('|')
+        for day in days:
+            if cursor_day and day > cursor_day:
+                continue  # Whole day is newer than the cursor: never scanned
+            videos = self.day(day)
+            if cursor_day and day == cursor_day:
+                paths = [v['path'] for v in videos]
+                videos = videos[paths.index(cursor_path) + 1:] if cursor_path in paths else videos
+            for video in videos:
+                if label is None or label in video['labels']:
+                    yield video
+
+    def page(self, cursor=None, limit=20, date=None, label=None):
+        videos = []
+        for video in self.iter_videos(date, cursor, label):
+            if len(videos) == limit:
+                break
+            videos.append(video)
+        else:
+            return videos, None  # Ran out: no further page
+        return videos, f"{videos[-1]['day']}|{videos[-1]['path']}"
+
+
+_indexes = {}
+_indexes_lock = Lock()
+
+
+def get_index(recordings_dir, tier='full'):
+    # Shared index per camera directory and tier
+    key = (recordings_dir, tier)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            scan_dir = os.path.join(recordings_dir, ARCHIVE_SUBDIR) if tier == 'archive' else recordings_dir
+            index = _indexes[key] = RecordingsIndex(scan_dir, recordings_dir, tier)
+        return index
+
+
+def public(video):
+    # Fields sent to clients
+    return {k: v for k, v in video.items() if k not in ('bytes', 'timestamp', 'day')}
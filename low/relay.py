@@ -0,0 +1,314 @@
+import argparse  # Command-line options for the companion process
+import logging  # Upstream/client connection warnings
+import os  # Download cache paths
+import re  # Match (camera-namespaced) download routes
+import shutil  # Copy cached downloads to clients
+import time  # Cache expiry and reconnect backoff
+import urllib.error  # Upstream HTTP errors
+import urllib.request  # Pull stream and API responses from the camera
+from email.utils import parsedate_to_datetime  # Parse upstream Last-Modified
+from http import server  # Base HTTP server classes
+from collections import OrderedDict  # API response cache in least-recently-used order
+from threading import Condition, Lock, Thread  # Fan-out buffer and cache guards
+
+from .server import StreamingServer  # Threaded HTTP server for streaming and APIs
+
+# Seconds a proxied response stays fresh, by route prefix (first match wins)
+CACHE_TTLS = [
+    ('/api/', 5),
+    ('/system.json', 2),
+    ('/index.html', 300),
+    ('/recordings', 300),
+]
+DOWNLOAD_CACHE_DIR = 'relay_cache'  # Finished segments pulled from the camera once
+DOWNLOAD_CACHE_MIN_AGE = 180  # Only cache files untouched this long (current segment still grows)
+DOWNLOAD_CACHE_BYTES = 2 * 1024 ** 3  # Cached segments beyond this are evicted, least recently used first (mtime)
+API_CACHE_BYTES = 8 * 1024 * 1024  # Proxied API/page bodies kept in memory
+STREAM_ROUTE = re.compile(r'^(/cam/[^/]+)?/stream\.mjpg$')
+DOWNLOAD_ROUTE = re.compile(r'^((?:/cam/[^/]+)?/download/)([^?]*)')
+EVENTS_ROUTE = re.compile(r'^(/cam/[^/]+)?/events(\?|$)')  # Endless SSE body: passed through, never buffered
+EVENTS_TIMEOUT = 60  # Upstream sends a keep-alive comment every 15 s; silence this long means it is gone
+
+
+class RelayOutput:
+    # Same shape as StreamingOutput (frame + condition) but fed from the camera's MJPEG stream
+    def __init__(self, upstream: str, stream_path: str = '/stream.mjpg'):
+        self.upstream = upstream.rstrip('/')
+        self.stream_path = stream_path
+        self.frame = None
+        self.condition = Condition()
+
+    def _read_frames(self, response):
+        while True:
+            line = response.readline()
+            if not line:
+                return  # Upstream closed the connection
+            if not line.startswith(b'--FRAME'):
+                continue
+            length = None
+            while True:
+                header = response.readline().strip()
+                if not header:
+                    break  # Blank line ends part headers
+                name, _, value = header.partition(b':')
+                if name.strip().lower() == b'content-length':
+                    length = int(value.strip())
+            if length is None:
+                continue
+            frame = response.read(length)
+            with self.condition:
+                self.frame = frame
+                self.condition.notify_all()  # One upstream frame → all relay clients
+
+    def run(self):
+        backoff = 1
+        while True:
+            try:
+                with urllib.request.urlopen(self.upstream + self.stream_path, timeout=10) as response:
+                    backoff = 1
+                    self._read_frames(response)
+            except Exception as e:
+                logging.warning('Relay upstream stream error: %s', str(e))
+            time.sleep(backoff)  # Reconnect with exponential backoff
+            backoff = min(30, backoff * 2)
+
+    def start(self) -> Thread:
+        t = Thread(target=self.run, daemon=True)
+        t.start()
+        return t
+
+
+def evict_downloads(cache_dir, max_bytes):
+    # Drop least recently used cached segments (last use = mtime, touched on every hit) until under max_bytes
+    entries = []
+    for root, _, names in os.walk(cache_dir):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if '.part.' not in name:  # Downloads in progress are not ours to remove
+                entries.append((st.st_mtime, st.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+def make_relay_handler(relay: RelayOutput, cache_dir: str = DOWNLOAD_CACHE_DIR, cache_bytes: int = DOWNLOAD_CACHE_BYTES,
+                       api_cache_bytes: int = API_CACHE_BYTES):
+    cache = OrderedDict()  # path → (expires_at, status, content_type, body), least recently used first
+    cache_size = [0]  # Bytes of bodies in cache
+    cache_lock = Lock()
+    evict_lock = Lock()  # One download-cache eviction pass at a time
+    relays = {relay.stream_path: relay}  # stream path → RelayOutput (one upstream pull each)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    def relay_for(stream_path):
+        with cache_lock:
+            stream_relay = relays.get(stream_path)
+            if stream_relay is None:
+                stream_relay = relays[stream_path] = RelayOutput(relay.upstream, stream_path)
+                stream_relay.start()  # Started on first viewer of a namespaced camera
+        return stream_relay
+
+    def cache_put(path, entry):
+        # Expired entries go first, then least recently used ones until the bodies fit api_cache_bytes
+        with cache_lock:
+            old = cache.pop(path, None)
+            if old:
+                cache_size[0] -= len(old[3])
+            cache[path] = entry
+            cache_size[0] += len(entry[3])
+            now = time.monotonic()
+            for key in [key for key, value in cache.items() if value[0] <= now]:
+                cache_size[0] -= len(cache.pop(key)[3])
+            while cache_size[0] > api_cache_bytes and cache:
+                cache_size[0] -= len(cache.popitem(last=False)[1][3])
+
+    def ttl_for(path):
+        for prefix, ttl in CACHE_TTLS:
+            if path.startswith(prefix):
+                return ttl
+        return 0
+
+    class RelayHandler(server.BaseHTTPRequestHandler):
+        def _send_body(self, status, content_type, body, extra_headers=()):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', len(body))
+            for name, value in extra_headers:
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _proxy_cached(self):
+            ttl = ttl_for(self.path)
+            now = time.monotonic()
+            with cache_lock:
+                entry = cache.get(self.path)
+                if entry:
+                    cache.move_to_end(self.path)
+            if entry and entry[0] > now:
+                self._send_body(entry[1], entry[2], entry[3], [('X-Relay-Cache', 'hit')])
+                return
+            try:
+                with urllib.request.urlopen(relay.upstream + self.path, timeout=10) as response:
+                    status = response.status
+                    content_type = response.headers.get('Content-Type', 'application/octet-stream')
+                    body = response.read()
+            except urllib.error.HTTPError as e:
+                self.send_error(e.code, e.reason)
+                return
+            except Exception as e:
+                self.send_error(502, f'Upstream unavailable: {e}')
+                return
+            if ttl and status == 200:
+                cache_put(self.path, (now + ttl, status, content_type, body))
+            self._send_body(status, content_type, body, [('X-Relay-Cache', 'miss')])
+
+        def _send_stream(self):
+            stream_relay = relay_for(self.path)
+            self.send_response(200)  # Begin MJPEG multipart HTTP response
+            self.send_header('Age', 0)
+            self.send_header('Cache-Control', 'no-cache, private')
+            self.send_header('Pragma', 'no-cache')
+            self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=FRAME')
+            self.end_headers()
+            try:
+                while True:
+                    with stream_relay.condition:
+                        stream_relay.condition.wait()
+                        frame = stream_relay.frame
+                    self.wfile.write(b'--FRAME\r\n')
+                    self.send_header('Content-Type', 'image/jpeg')
+                    self.send_header('Content-Length', len(frame))
+                    self.end_headers()
+                    self.wfile.write(frame)
+                    self.wfile.write(b'\r\n')
+            except Exception as e:
+                logging.warning('Removed relay client %s: %s', self.client_address, str(e))
+
+        def _send_events(self):
+            # One upstream SSE connection per relay client, forwarded as it arrives (Last-Event-ID resumes)
+            request = urllib.request.Request(relay.upstream + self.path)
+            if self.headers.get('Last-Event-ID'):
+                request.add_header('Last-Event-ID', self.headers['Last-Event-ID'])
+            try:
+                response = urllib.request.urlopen(request, timeout=EVENTS_TIMEOUT)
+            except urllib.error.HTTPError as e:
+                self.send_error(e.code, e.reason)
+                return
+            except Exception as e:
+                self.send_error(502, f'Upstream unavailable: {e}')
+                return
+            with response:
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Cache-Control', 'no-cache')
+                self.send_header('X-Accel-Buffering', 'no')
+                self.end_headers()
+                try:
+                    while True:
+                        chunk = response.read1(64 * 1024)  # Whatever has arrived: events are not held back
+                        if not chunk:
+                            break
+                        self.wfile.write(chunk)
+                except Exception as e:
+                    logging.info('Removed relay events client %s: %s', self.client_address, str(e))
+
+        def _send_download(self, prefix, rel_path):
+            rel_path = rel_path.replace('..', '')  # Prevent directory traversal
+            cached = os.path.join(cache_dir, prefix.strip('/').replace('/', '_'), rel_path)
+            if not os.path.isfile(cached):
+                try:
+                    response = urllib.request.urlopen(relay.upstream + prefix + rel_path, timeout=30)
+                except urllib.error.HTTPError as e:
+                    self.send_error(e.code, e.reason)
+                    return
+                except Exception as e:
+                    self.send_error(502, f'Upstream unavailable: {e}')
+                    return
+                with response:
+                    last_modified = response.headers.get('Last-Modified')
+                    age = time.time() - parsedate_to_datetime(last_modified).timestamp() if last_modified else 0
+                    self.send_response(200)
+                    for name in ('Content-Type', 'Content-Length', 'Content-Disposition', 'Last-Modified'):
+                        if response.headers.get(name):
+                            self.send_header(name, response.headers[name])
+                    self.end_headers()
+                    if age < DOWNLOAD_CACHE_MIN_AGE:
+                        shutil.copyfileobj(response, self.wfile, 1024 * 1024)  # Still being written; pass through
+                        return
+                    # Tee the finished segment to the client and the cache in one upstream read
+                    os.makedirs(os.path.dirname(cached), exist_ok=True)
+                    tmp_path = f"{cached}.part.{id(self)}"
+                    try:
+                        with open(tmp_path, 'wb') as f:
+                            while True:
+                                chunk = response.read(1024 * 1024)
+                                if not chunk:
+                                    break
+                                f.write(chunk)
+                                self.wfile.write(chunk)
+                        os.replace(tmp_path, cached)
+                    finally:
+                        if os.path.exists(tmp_path):
+                            os.remove(tmp_path)  # Client left mid-download: no partial file left behind
+                with evict_lock:
+                    evict_downloads(cache_dir, cache_bytes)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'video/mp4')
+            self.send_header('Content-Length', os.path.getsize(cached))
+            self.send_header('Content-Disposition', f'inline; filename="{os.path.basename(rel_path)}"')
+            self.send_header('X-Relay-Cache', 'hit')
+            self.end_headers()
+            try:
+                os.utime(cached)  # Mark as recently used
+            except OSError:
+                pass
+            with open(cached, 'rb') as f:
+                shutil.copyfileobj(f, self.wfile, 1024 * 1024)
+
+        def do_GET(self):
+            download = DOWNLOAD_ROUTE.match(self.path)
+            if STREAM_ROUTE.match(self.path):
+                self._send_stream()
+            elif EVENTS_ROUTE.match(self.path):
+                self._send_events()
+            elif download:
+                self._send_download(download.group(1), download.group(2))
+            else:
+                self._proxy_cached()
+
+    return RelayHandler
+
+
+def main(upstream: str, host: str = '', port: int = 8080, cache_dir: str = DOWNLOAD_CACHE_DIR,
+         cache_bytes: int = DOWNLOAD_CACHE_BYTES):
+    relay = RelayOutput(upstream)
+    relay.start()  # Single upstream connection shared by every viewer
+    try:
+        web_server = StreamingServer((host, port), make_relay_handler(relay, cache_dir, cache_bytes))
+        print(f"Relaying {upstream} at http://<relay_host>:{port}")
+        web_server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down relay...")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Fan out one camera stream to many viewers')
+    parser.add_argument('upstream', help='Camera base URL, e.g. http://camera.local:5000')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--cache-dir', default=DOWNLOAD_CACHE_DIR)
+    parser.add_argument('--cache-mb', type=int, default=DOWNLOAD_CACHE_BYTES // (1024 * 1024), help='download cache size')
+    args = parser.parse_args()
+    main(args.upstream, host=args.host, port=args.port, cache_dir=args.cache_dir, cache_bytes=args.cache_mb * 1024 * 1024)
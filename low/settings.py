@@ -0,0 +1,150 @@
+import json  # Settings file format
+import logging  # Rejected settings files/updates
+import os  # Atomic replace, mtime polling
+import time  # Watch interval
+from threading import Lock, Thread
+
+from .config import SETTINGS_FILE
+
+WATCH_INTERVAL = 2  # Seconds between checks of the settings file for hand edits
+
+# name → (type, default, minimum, maximum, how a change takes effect)
+#   live:        picked up by running pipelines on the next frame/segment/request
+#   reconfigure: camera is stopped, reconfigured and restarted (a second or two of stream, segment ends early)
+SCHEMA = {
+    'height': (int, 450, 64, 3040, 'reconfigure'),  # Main stream height; width follows at 16:9
+    'fps': (int, 10, 1, 60, 'live'),
+    'jpeg_quality': (int, 95, 10, 100, 'live'),  # Live stream JPEG quality (OpenCV default is 95)
+    'overlay': (bool, True, None, None, 'live'),  # Timestamp overlay on live frames
+    'segment_seconds': (int, 60, 10, 3600, 'live'),  # Applies from the next segment
+    'min_free_bytes': (int, 1024 ** 3, 0, None, 'live'),  # Recorder pauses below this much free space
+    'per_page': (int, 20, 1, 200, 'live'),  # Default recordings page size
+    'days_to_keep': (int, 7, 1, 3650, 'live'),  # Full-rate retention used by the cleanup script
+}
+
+
+class SettingsError(ValueError):
+    pass
+
+
+def coerce(name, value):
+    # Validate one setting against SCHEMA; returns the typed value or raises SettingsError
+    if name not in SCHEMA:
+        raise SettingsError(f'Unknown setting: {name}')
+    kind, _, low, high, _ = SCHEMA[name]
+    if kind is bool:
+        if isinstance(value, str) and value.lower() in ('true', 'false', '1', '0'):
+            value = value.lower() in ('true', '1')
+        if not isinstance(value, bool):
+            raise SettingsError(f'{name} must be true or false')
+        return value
+    try:
+        if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+            raise ValueError
+        value = kind(value)
+    except (TypeError, ValueError):
+        raise SettingsError(f'{name} must be an {kind.__name__}')
+    if (low is not None and value < low) or (high is not None and value > high):
+        raise SettingsError(f'{name} must be between {low} and {high if high is not None else "∞"}')
+    return value
+
+
+class Settings:
+    # Runtime-tunable settings: defaults from SCHEMA, overridden by the JSON settings file and /api/config
+    def __init__(self, path=SETTINGS_FILE):
+        self.path = path
+        self.lock = Lock()
+        self.values = {name: spec[1] for name, spec in SCHEMA.items()}
+        self.listeners = []  # Callables invoked with {name: new value} after every change
+        self.mtime = None
+        self.watcher = None
+        self.load()
+
+    def __getattr__(self, name):
+        if name in SCHEMA:
+            return self.values[name]
+        raise AttributeError(name)
+
+    def validate(self, changes):
+        # All-or-nothing: every value must be valid before anything is applied
+        return {name: coerce(name, value) for name, value in changes.items()}
+
+    def _apply(self, values):
+        with self.lock:
+            changed = {name: value for name, value in values.items() if self.values[name] != value}
+            self.values.update(changed)
+        for listener in list(self.listeners):
+            if not changed:
+                break
+            try:
+                listener(changed)
+            except Exception as e:
+                logging.warning('Settings listener %r failed: %s', listener, str(e))
+        return changed
+
+    def update(self, changes):
+        # Validate, apply and persist changes; returns the settings that actually changed
+        changed = self._apply(self.validate(changes))
+        if changed:
+            self.save()
+        return changed
+
+    def save(self):
+        with self.lock:
+            overrides = {name: value for name, value in self.values.items() if value != SCHEMA[name][1]}
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(overrides, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+            self.mtime = os.stat(self.path).st_mtime_ns  # Our own write is not a hand edit
+
+    def load(self):
+        # (Re)read the settings file; a bad file is logged and ignored, never fatal
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return {}
+        if mtime == self.mtime:
+            return {}
+        self.mtime = mtime
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            if not isinstance(data, dict):
+                raise SettingsError('expected a JSON object')
+            values = {name: spec[1] for name, spec in SCHEMA.items()}  # Keys removed from the file revert
+            values.update(self.validate(data))
+        except (OSError, ValueError) as e:
+            logging.error('Ignoring settings file %s: %s', self.path, str(e))
+            return {}
+        changed = self._apply(values)
+        if changed:
+            logging.info('Settings reloaded from %s: %s', self.path, changed)
+        return changed
+
+    def watch(self, interval=WATCH_INTERVAL):
+        # Poll the file so hand edits apply without a restart
+        def run():
+            while True:
+                time.sleep(interval)
+                self.load()
+
+        if self.watcher is None:
+            self.watcher = Thread(target=run, name='settings-watch', daemon=True)
+            self.watcher.start()
+
+    def describe(self):
+        # Payload for GET /api/config
+        with self.lock:
+            values = dict(self.values)
+        return {
+            'values': values,
+            'schema': {
+                name: {'type': kind.__name__, 'default': default, 'min': low, 'max': high, 'applies': applies}
+                for name, (kind, default, low, high, applies) in SCHEMA.items()
+            },
+            'file': os.path.abspath(self.path),
+        }
+
+
+SETTINGS = Settings()
@@ -0,0 +1,144 @@
+import collections  # Waiting-transfer queue and throughput window
+import threading  # Shared buckets and slot accounting across handler threads
+import time  # Token bucket and throughput timing
+
+THROUGHPUT_WINDOW = 5  # Seconds averaged for the reported throughput
+
+
+class RateLimiter:
+    # Token bucket shared by all users of one budget; the rate drops while live viewers are connected
+    def __init__(self, rate, rate_with_viewers, viewers=None):
+        self.rate = rate
+        self.rate_with_viewers = rate_with_viewers
+        self.viewers = viewers or (lambda: 0)
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def current_rate(self):
+        return self.rate_with_viewers if self.viewers() else self.rate
+
+    def consume(self, nbytes):
+        while True:
+            with self.lock:
+                rate = self.current_rate()
+                if not rate:
+                    return  # Unlimited
+                now = time.monotonic()
+                self.tokens = min(rate, self.tokens + (now - self.updated) * rate)  # At most 1 s of burst
+                self.updated = now
+                if self.tokens >= nbytes or self.tokens >= rate:
+                    self.tokens -= nbytes
+                    return
+                wait = (min(nbytes, rate) - self.tokens) / rate
+            time.sleep(wait)
+
+
+class ShaperBusy(Exception):
+    # Raised when a route's queue is full or a queued transfer waited too long; maps to 503
+    pass
+
+
+class RouteShaper:
+    # Bandwidth and concurrency limits for one bulk route such as /download. At most `concurrency` transfers run at
+    # once; up to `queue` more wait in arrival order for `queue_timeout` seconds. Running transfers share one token
+    # bucket (slower while anyone watches the live stream, so /stream.mjpg keeps its bandwidth) and each client
+    # address has its own.
+    def __init__(self, route, rate=0, rate_with_viewers=0, client_rate=0, concurrency=2, queue=8,
+                 queue_timeout=30, viewers=None):
+        self.route = route
+        self.limiter = RateLimiter(rate, rate_with_viewers, viewers)
+        self.client_rate = client_rate
+        self.concurrency = concurrency
+        self.queue = queue
+        self.queue_timeout = queue_timeout
+        self.condition = threading.Condition()
+        self.waiting = collections.deque()  # Tickets of queued transfers, oldest first
+        self.active = 0
+        self.clients = {}  # Client address → [RateLimiter, active transfers]
+        self.completed = 0
+        self.rejected = 0
+        self.bytes_sent = 0
+        self.max_queued = 0
+        self.window = collections.deque()  # (second, bytes) for the throughput average
+
+    def acquire(self, client):
+        # Wait for a transfer slot (raises ShaperBusy); returns send(nbytes), which blocks until the bytes may go out
+        with self.condition:
+            if self.active >= self.concurrency or self.waiting:
+                if len(self.waiting) >= self.queue:
+                    self.rejected += 1
+                    raise ShaperBusy(f'{self.route}: {self.active} transfers running, {len(self.waiting)} queued')
+                ticket = object()
+                self.waiting.append(ticket)
+                self.max_queued = max(self.max_queued, len(self.waiting))
+                admitted = self.condition.wait_for(
+                    lambda: self.active < self.concurrency and self.waiting[0] is ticket, self.queue_timeout)
+                self.waiting.remove(ticket)
+                if not admitted:
+                    self.rejected += 1
+                    self.condition.notify_all()  # The next ticket may be at the head now
+                    raise ShaperBusy(f'{self.route}: queued longer than {self.queue_timeout}s')
+            self.active += 1
+            entry = self.clients.setdefault(client, [RateLimiter(self.client_rate, self.client_rate), 0])
+            entry[1] += 1
+            self.condition.notify_all()  # Wake the new head of the queue to re-check
+        client_limiter = entry[0]
+
+        def send(nbytes):
+            client_limiter.consume(nbytes)
+            self.limiter.consume(nbytes)
+            self._count(nbytes)
+
+        return send
+
+    def release(self, client):
+        with self.condition:
+            self.active -= 1
+            self.completed += 1
+            entry = self.clients[client]
+            entry[1] -= 1
+            if not entry[1]:
+                del self.clients[client]
+            self.condition.notify_all()
+
+    def _count(self, nbytes):
+        second = int(time.monotonic())
+        with self.condition:
+            self.bytes_sent += nbytes
+            if self.window and self.window[-1][0] == second:
+                self.window[-1][1] += nbytes
+            else:
+                self.window.append([second, nbytes])
+            while self.window[0][0] <= second - THROUGHPUT_WINDOW:
+                self.window.popleft()
+
+    def status(self):
+        now = int(time.monotonic())
+        with self.condition:
+            recent = sum(nbytes for second, nbytes in self.window if second > now - THROUGHPUT_WINDOW)
+            return {
+                'active': self.active,
+                'queued': len(self.waiting),
+                'max_queued': self.max_queued,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'bytes_sent': self.bytes_sent,
+                'throughput_bytes': recent // THROUGHPUT_WINDOW,
+                'rate_bytes': self.limiter.current_rate(),
+                'client_rate_bytes': self.client_rate,
+                'concurrency': self.concurrency,
+                'clients': {client: entry[1] for client, entry in self.clients.items()},
+            }
+
+
+def make_shapers(limits, viewers=None):
+    # One RouteShaper per configured route prefix (config.ROUTE_LIMITS)
+    return {route: RouteShaper(route, viewers=viewers, **spec) for route, spec in limits.items()}
+
+
+def shaper_for(shapers, path):
+    for route, shaper in shapers.items():
+        if path.startswith(route):
+            return shaper
+    return None
@@ -0,0 +1,82 @@
+import importlib  # Background preloading of heavy modules
+import logging  # Startup timeline in the journal
+import os  # /proc and sysconf for the process start time
+import time  # Monotonic phase timestamps
+from threading import Lock, Thread
+
+FIRST_FRAME_TIMEOUT = 30  # Seconds to wait for the first published frame before reporting it missing
+
+
+def process_age():
+    # Seconds since this process was exec'd (covers interpreter start-up before any of our code ran)
+    try:
+        with open('/proc/self/stat') as f:
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])  # Field 22: starttime
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - start_ticks / os.sysconf('SC_CLK_TCK'))
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+class StartupTracker:
+    # Timeline of start-up phases, measured from process start; served by /api/status
+    def __init__(self):
+        self.origin = time.monotonic() - process_age()
+        self.lock = Lock()
+        self.state = 'starting'  # starting → ready | failed
+        self.phases = {}  # phase name → seconds since process start
+        self.error = None
+        self.cameras = None  # CameraSupervisor, set once the cameras have been created
+
+    def elapsed(self):
+        return round(time.monotonic() - self.origin, 3)
+
+    def mark(self, phase):
+        at = self.elapsed()
+        with self.lock:
+            self.phases[phase] = at
+        logging.info('Startup: %s at %.3fs', phase, at)
+        return at
+
+    def ready(self):
+        self.state = 'ready'
+
+    def failed(self, error):
+        self.error = str(error)
+        self.state = 'failed'
+        logging.error('Startup failed after %.3fs: %s', self.elapsed(), self.error)
+
+    def status(self):
+        with self.lock:
+            phases = dict(self.phases)
+        return {
+            'state': self.state,
+            'uptime': self.elapsed(),
+            'phases': phases,
+            'time_to_first_frame': phases.get('first_frame'),
+            'error': self.error,
+        }
+
+
+def preload(tracker, *modules):
+    # Import heavy modules on a background thread so they load while other start-up work blocks on I/O
+    def run():
+        for name in modules:
+            try:
+                importlib.import_module(name)
+                tracker.mark(f'import {name}')
+            except ImportError as e:
+                logging.warning('Preload of %s failed: %s', name, str(e))
+
+    thread = Thread(target=run, name='preload', daemon=True)
+    thread.start()
+    return thread
+
+
+def wait_for_first_frame(output, timeout=FIRST_FRAME_TIMEOUT):
+    with output.condition:
+        return output.condition.wait_for(lambda: output.sequence > 0, timeout=timeout)
+
+
+STARTUP = StartupTracker()
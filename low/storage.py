@@ -0,0 +1,108 @@
+import os  # File creation, preallocation and atomic renames
+import logging  # Flush failures
+from threading import Lock  # Stats shared by recorder/flush threads
+from urllib.parse import quote, unquote  # Encode final paths into staging file names
+
+from .config import STAGING_DIR, WRITE_BUFFER_BYTES, PREALLOCATE
+
+BLOCK = 4096  # Flash page / filesystem block alignment for writes
+
+
+def device_bytes_written(path):
+    # Bytes the kernel has written to the block device holding `path` (sysfs sector counter)
+    try:
+        st_dev = os.stat(path).st_dev
+        with open(f"/sys/dev/block/{os.major(st_dev)}:{os.minor(st_dev)}/stat") as f:
+            return int(f.read().split()[6]) * 512  # Field 7: sectors written
+    except (OSError, IndexError, ValueError):
+        return None  # Not a block device (tmpfs, overlay) or sysfs unavailable
+
+
+class SegmentStorage:
+    # Decides where the encoder writes and moves finished segments to the card in one sequential pass
+    def __init__(self, root: str, staging_dir: str = STAGING_DIR, buffer_bytes: int = WRITE_BUFFER_BYTES,
+                 preallocate: bool = PREALLOCATE):
+        self.root = root
+        self.staging_dir = staging_dir  # RAM-backed (tmpfs) staging area, or None to write in place
+        self.buffer_bytes = max(BLOCK, buffer_bytes // BLOCK * BLOCK)  # Whole blocks only
+        self.preallocate = preallocate and hasattr(os, 'posix_fallocate')
+        self.lock = Lock()
+        self.logical_bytes = 0  # Segment bytes that ended up on the card
+        self.bytes_flushed = 0  # Bytes this process copied from staging to the card
+        self.segments = 0
+        self.metadata_ops = 0  # creates + renames + unlinks on the card
+        self.device_start = device_bytes_written(root)
+        if staging_dir:
+            os.makedirs(staging_dir, exist_ok=True)
+
+    def staging_path(self, final_path: str) -> str:
+        # Where the encoder should write this segment
+        if not self.staging_dir:
+            return final_path
+        return os.path.join(self.staging_dir, quote(os.path.abspath(final_path), safe=''))
+
+    def commit(self, written_path: str, final_path: str) -> str:
+        # Called once the encoder closed the segment; returns the final path
+        if written_path == final_path:
+            self._account(os.path.getsize(final_path), 0, 1)
+            return final_path
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        size = os.path.getsize(written_path)
+        part_path = f"{final_path}.part"  # Not *.mp4, so listings never see half-flushed files
+        fd = os.open(part_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            if self.preallocate and size:
+                os.posix_fallocate(fd, 0, size)  # One contiguous extent, no incremental allocation
+            with open(written_path, 'rb', buffering=0) as src:
+                buf = bytearray(self.buffer_bytes)
+                view = memoryview(buf)
+                while True:
+                    n = src.readinto(buf)
+                    if not n:
+                        break
+                    os.write(fd, view[:n])  # Large block-aligned writes (only the tail is short)
+            os.fsync(fd)  # Single flush per segment
+        finally:
+            os.close(fd)
+        os.replace(part_path, final_path)
+        os.remove(written_path)  # Frees RAM in the staging area
+        self._account(size, size, 2)
+        return final_path
+
+    def recover(self):
+        # Flush segments left in staging by a previous run (service restart without reboot)
+        if not self.staging_dir:
+            return
+        for entry in os.scandir(self.staging_dir):
+            final_path = unquote(entry.name)
+            if not entry.is_file() or not final_path.startswith(os.path.abspath(self.root) + os.sep):
+                continue
+            try:
+                self.commit(entry.path, final_path)
+            except OSError as e:
+                logging.warning('Could not flush staged segment %s: %s', entry.path, str(e))
+
+    def _account(self, logical, flushed, metadata_ops):
+        with self.lock:
+            self.segments += 1
+            self.logical_bytes += logical
+            self.bytes_flushed += flushed
+            self.metadata_ops += metadata_ops
+
+    def stats(self):
+        device_now = device_bytes_written(self.root)
+        device_bytes = device_now - self.device_start if None not in (device_now, self.device_start) else None
+        with self.lock:
+            logical = self.logical_bytes
+            return {
+                'staging_dir': self.staging_dir,
+                'preallocate': self.preallocate,
+                'buffer_bytes': self.buffer_bytes,
+                'segments': self.segments,
+                'logical_bytes': logical,
+                'bytes_flushed': self.bytes_flushed,
+                'metadata_ops': self.metadata_ops,
+                # Device-wide counter: includes other writers on the same card, so treat as an upper bound
+                'device_bytes': device_bytes,
+                'write_amplification': round(device_bytes / logical, 3) if device_bytes and logical else None,
+            }
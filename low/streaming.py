@@ -1,12 +1,17 @@
 import io  # BufferedIOBase parent for a simple output buffer
+import functools  # Bind frame details to the encode completion callback
+from concurrent import futures  # Wait for the in-flight encode
 from threading import Condition, Thread  # Notify waiting clients; daemon stream thread
 from datetime import datetime  # Timestamp overlay on frames
 import numpy as np  # Byte buffer → ndarray for OpenCV decode
 import cv2  # Image processing and JPEG encoding
 
+import logging  # Capture errors (e.g. while the camera is being reconfigured)
 import time  # FPS pacing
 
 from .recorder import VideoRecorder  # Background segmented video recording
+from .settings import SETTINGS  # Live-tunable JPEG quality and overlay
+from .config import MOTION_EVENT_THRESHOLD, MOTION_EVENT_HOLD
 
 
 class StreamingOutput(io.BufferedIOBase):
@@ -15,6 +20,44 @@ class StreamingOutput(io.BufferedIOBase):
         self.condition = Condition()  # Signals when a new frame is available
         self.video_recorder = None  # Lazy-created recorder bound to picam2
         self.picam2 = picam2  # Shared camera instance
+        self.sequence = 0  # Increments on every published frame
+        self.timestamp = None  # Capture time (epoch seconds) of the latest frame
+        self.motion = 0.0  # Motion score of the latest frame (0.0 still → 1.0 everything changed)
+        self.luma = None  # 1/8-scale green plane of the latest frame before privacy masking (day/night levels)
+        self.clients = 0  # Connected live viewers (MJPEG + WebSocket)
+        self.fps = 10  # Target frame rate; the stream loop re-reads it every frame
+        self.moving = False  # Inside a motion event (score crossed MOTION_EVENT_THRESHOLD)
+        self.motion_seen = None  # Capture time of the last frame above the threshold
+        self.motion_peak = 0.0  # Highest score of the current motion event
+        self.motion_listeners = []  # Callables invoked with (moving, peak score, timestamp) on motion start/end
+
+    def publish(self, frame_bytes, timestamp=None, motion=0.0):
+        with self.condition:
+            self.frame = frame_bytes  # Publish for MJPEG/WebSocket clients
+            self.sequence += 1
+            self.timestamp = timestamp if timestamp is not None else time.time()
+            self.motion = motion
+            timestamp = self.timestamp
+            self.condition.notify_all()  # Wake any waiting consumers
+        self._track_motion(motion, timestamp)
+
+    def _track_motion(self, motion, timestamp):
+        # Start/end edges only (called from the single stream thread); an event ends after MOTION_EVENT_HOLD quiet seconds
+        if motion >= MOTION_EVENT_THRESHOLD:
+            self.motion_seen = timestamp
+            self.motion_peak = max(self.motion_peak, motion) if self.moving else motion
+            if self.moving:
+                return
+            self.moving = True
+        elif not self.moving or timestamp - self.motion_seen < MOTION_EVENT_HOLD:
+            return
+        else:
+            self.moving = False
+        for listener in self.motion_listeners:
+            try:
+                listener(self.moving, self.motion_peak, timestamp)
+            except Exception as e:
+                logging.warning('Motion listener failed: %s', str(e))
 
     def write(self, buf):
         # Attempt to decode buffer → BGR image for overlay; fallback to raw bytes
@@ -49,48 +92,115 @@ class StreamingOutput(io.BufferedIOBase):
             self.video_recorder = VideoRecorder(self.picam2)
             self.video_recorder.start_recording()
 
-        with self.condition:
-            self.frame = frame_bytes  # Publish for MJPEG clients
-            self.condition.notify_all()  # Wake any waiting consumers
-
-
-def _stream_loop(picam2, output: StreamingOutput, fps: int = 10):
-    interval = max(0.001, 1.0 / max(1, fps))  # FPS → sleep interval (clamped)
+        self.publish(frame_bytes)
+
+
+def _motion_score(previous, current):
+    # Mean absolute difference of subsampled frames, normalised to 0..1
+    if previous is None or previous.shape != current.shape:
+        return 0.0
+    return float(np.abs(current.astype(np.int16) - previous).mean()) / 255.0
+
+
+def _encode_frame(frame, quality: int = 95, overlay: bool = True):
+    # Capture frame as RGB array, convert to BGR for OpenCV drawing
+    if len(frame.shape) == 3 and frame.shape[2] == 3:
+        bgr = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)  # RGB → BGR
+    else:
+        # Fallback: attempt direct use
+        bgr = frame
+
+    if overlay:
+        _draw_timestamp(bgr)
+
+    # Encode JPEG
+    ret, jpeg = cv2.imencode('.jpg', bgr, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+    return jpeg.tobytes() if ret else None
+
+
+def _draw_timestamp(bgr):
+    # Timestamp overlay (same style as write())
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    font_scale = 0.7
+    font_color = (255, 255, 255)
+    font_thickness = 2
+    (text_width, text_height), _ = cv2.getTextSize(timestamp, font, font_scale, font_thickness)
+    overlay = bgr.copy()
+    cv2.rectangle(overlay, (10, 10), (20 + text_width, 20 + text_height), (0, 0, 0), -1)
+    alpha = 0.6
+    cv2.addWeighted(overlay, alpha, bgr, 1 - alpha, 0, bgr)
+    cv2.putText(bgr, timestamp, (15, 30), font, font_scale, font_color, font_thickness, cv2.LINE_AA)
+
+
+def _publish_encoded(output, captured_at, motion, submitted, encode_time, future):
+    # Pool completion callback: publish as soon as the encode finishes (runs on the worker's thread)
+    encode_time[0] = time.monotonic() - submitted  # Charged to the stream's CPU budget on the next frame
+    try:
+        frame_bytes = future.result()
+    except Exception as e:
+        logging.warning('Frame encode failed: %s', str(e))
+        return
+    if frame_bytes is not None:
+        output.publish(frame_bytes, captured_at, motion)
+
+
+def _stream_loop(picam2, output: StreamingOutput, fps: int = 10, pool=None, cpu_budget: float = 1.0, privacy=None,
+                 analytics=None):
+    output.fps = fps
+    cpu_budget = min(1.0, max(0.01, cpu_budget))  # Fraction of one core this stream may keep busy
+    previous = None  # Subsampled previous frame for motion scoring
+    pending = None  # Encode in flight on the pool: it overlaps the next capture
+    encode_time = [0.0]  # Duration of the last pooled encode
     while True:
-        # Capture frame as RGB array, convert to BGR for OpenCV drawing
-        frame = picam2.capture_array("main")
+        lores = None
+        try:
+            if analytics is not None and analytics.use_lores:
+                (frame, lores), _ = picam2.capture_arrays(["main", "lores"])  # Same request, no extra wait
+            else:
+                frame = picam2.capture_array("main")
+        except Exception as e:
+            logging.warning('Capture failed (camera reconfiguring?): %s', str(e))
+            time.sleep(0.1)
+            continue
         if frame is None:
             continue
-        if len(frame.shape) == 3 and frame.shape[2] == 3:
-            bgr = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)  # RGB → BGR
+        # Day/night levels: subsampled before privacy.apply blacks out masks in place (they would read as night)
+        rows = privacy.unmasked_rows(frame.shape) if privacy is not None and privacy.masked_upstream else slice(None)
+        luma = (frame[rows, :, 1] if frame.ndim == 3 else frame[rows])[::8, ::8].copy()
+        if privacy is not None:
+            frame = privacy.apply(frame)  # ROI crop (view) + cached privacy mask, before anything looks at pixels
+        interval = max(0.001, 1.0 / max(1, output.fps))  # FPS → sleep interval (clamped; fps is live-tunable)
+        quality, overlay = SETTINGS.jpeg_quality, SETTINGS.overlay
+        captured_at = time.time()
+        started = time.monotonic()
+        # One channel at 1/8 resolution is plenty for a motion score
+        small = frame[::8, ::8, 1] if frame.ndim == 3 else frame[::8, ::8]
+        motion = _motion_score(previous, small)
+        previous = small.copy()
+        output.luma = luma
+        if analytics is not None:
+            analytics.offer(frame, captured_at, lores)  # Every Nth frame is queued; never blocks this loop
+        if pool is not None:
+            # Shared worker pool bounds concurrent encodes across all cameras (cv2 releases the GIL). At most
+            # one encode per camera is in flight, so frames publish in order; it is usually done by now.
+            if pending is not None:
+                futures.wait((pending,))  # Errors are logged by the callback
+            pending = pool.submit(_encode_frame, frame, quality, overlay)
+            pending.add_done_callback(
+                functools.partial(_publish_encoded, output, captured_at, motion, time.monotonic(), encode_time))
+            busy = time.monotonic() - started + encode_time[0]
         else:
-            # Fallback: attempt direct use
-            bgr = frame
-
-        # Timestamp overlay (same style as write())
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        font = cv2.FONT_HERSHEY_SIMPLEX
-        font_scale = 0.7
-        font_color = (255, 255, 255)
-        font_thickness = 2
-        (text_width, text_height), _ = cv2.getTextSize(timestamp, font, font_scale, font_thickness)
-        overlay = bgr.copy()
-        cv2.rectangle(overlay, (10, 10), (20 + text_width, 20 + text_height), (0, 0, 0), -1)
-        alpha = 0.6
-        cv2.addWeighted(overlay, alpha, bgr, 1 - alpha, 0, bgr)
-        cv2.putText(bgr, timestamp, (15, 30), font, font_scale, font_color, font_thickness, cv2.LINE_AA)
-
-        # Encode JPEG and publish
-        ret, jpeg = cv2.imencode('.jpg', bgr)
-        if ret:
-            with output.condition:
-                output.frame = jpeg.tobytes()  # Latest frame bytes
-                output.condition.notify_all()  # Notify listeners
-        # Sleep to control FPS
-        time.sleep(interval)
-
-
-def start_stream_thread(picam2, output: StreamingOutput, fps: int = 10) -> Thread:
-    t = Thread(target=_stream_loop, args=(picam2, output, fps), daemon=True)  # Fire-and-forget daemon
+            frame_bytes = _encode_frame(frame, quality, overlay)
+            if frame_bytes is not None:
+                output.publish(frame_bytes, captured_at, motion)  # Latest frame bytes + metadata
+            busy = time.monotonic() - started
+        # Sleep to control FPS, stretched so busy time stays within the CPU budget
+        time.sleep(max(interval, busy / cpu_budget - busy))
+
+
+def start_stream_thread(picam2, output: StreamingOutput, fps: int = 10, pool=None, cpu_budget: float = 1.0,
+                        privacy=None, analytics=None) -> Thread:
+    t = Thread(target=_stream_loop, args=(picam2, output, fps, pool, cpu_budget, privacy, analytics), daemon=True)  # Fire-and-forget daemon
     t.start()
     return t
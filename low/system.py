@@ -0,0 +1,45 @@
+import subprocess  # Query SoC temperature via vcgencmd on Raspberry Pi
+import time  # Compute uptime from boot time
+
+import psutil  # System metrics: CPU, memory, disk, boot time
+
+
+def system_info(cpu_interval=1):
+    # Payload of /system.json and the /events "system" event. cpu_interval=None measures CPU since
+    # the previous call instead of blocking for a second (the periodic event publisher).
+    # CPU %, memory %, disk usage, temperature, uptime
+    cpu_usage = psutil.cpu_percent(interval=cpu_interval)  # Sample over 1s, or since the previous call (None)
+    memory = psutil.virtual_memory()  # Memory stats
+    memory_percent = memory.percent
+    
+    # Get disk usage
+    disk = psutil.disk_usage('/')  # Root filesystem usage
+    disk_usage_percent = (disk.used / disk.total) * 100
+    disk_usage_gb = disk.used / (1024**3)
+    disk_total_gb = disk.total / (1024**3)
+    disk_text = f"{disk_usage_gb:.1f}/{disk_total_gb:.1f} GB"  # Human-readable used/total
+    
+    # Get CPU temperature (Raspberry Pi specific; may fail on other systems)
+    try:
+        temp_result = subprocess.run(['vcgencmd', 'measure_temp'], capture_output=True, text=True)
+        cpu_temp = float(temp_result.stdout.replace('temp=', '').replace("'C\n", ''))
+    except Exception:
+        cpu_temp = 0.0  # Fallback if command unavailable
+
+    # Uptime
+    boot_time = psutil.boot_time()  # Epoch time when system booted
+    uptime_seconds = int(time.time() - boot_time)
+    days = uptime_seconds // 86400
+    hours = (uptime_seconds % 86400) // 3600
+    minutes = (uptime_seconds % 3600) // 60
+    uptime_human = f"{days}d {hours}h {minutes}m" if days else (f"{hours}h {minutes}m" if hours else f"{minutes}m")
+
+    return {
+        'cpu': round(cpu_usage, 1),
+        'temp': round(cpu_temp, 1),
+        'memory': round(memory_percent, 1),
+        'storage': disk_text,
+        'storage_percent': round(disk_usage_percent, 1),
+        'uptime_seconds': uptime_seconds,
+        'uptime_human': uptime_human,
+    }
@@ -5,26 +5,144 @@ PAGE_INDEX = """
   <meta charset="utf-8">
   <meta name="viewport" content="width=device-width, initial-scale=1">
   <script>
+    function showSystemInfo(data) {
+      document.getElementById('cpu').textContent = data.cpu + '%';
+      document.getElementById('storage').textContent = data.storage || (data.storage_percent + '%');
+      if (data.uptime_human && document.getElementById('uptime')) {
+        document.getElementById('uptime').textContent = `Uptime: ${data.uptime_human}`;
+      }
+      // Update progress bars via explicit IDs for robustness
+      const cpuProg = document.getElementById('cpu-progress');
+      const storageProg = document.getElementById('storage-progress');
+      if (cpuProg) cpuProg.style.width = (data.cpu || 0) + '%';
+      if (storageProg) storageProg.style.width = (data.storage_percent || 0) + '%';
+    }
     function updateSystemInfo() {
-      fetch('/system.json')
+      fetch('system.json')
         .then(response => response.json())
-        .then(data => {
-          document.getElementById('cpu').textContent = data.cpu + '%';
-          document.getElementById('storage').textContent = data.storage || (data.storage_percent + '%');
-          if (data.uptime_human && document.getElementById('uptime')) {
-            document.getElementById('uptime').textContent = `Uptime: ${data.uptime_human}`;
+        .then(showSystemInfo)
+        .catch(err => console.log('Error fetching system info:', err));
+    }
+
+    // One shared server push (events) instead of polling system.json every 2 seconds
+    function subscribeEvents() {
+      if (!('EventSource' in window)) {
+        setInterval(updateSystemInfo, 2000);
+        return;
+      }
+      const events = new EventSource('events');  // Reconnects (with Last-Event-ID) on its own
+      events.addEventListener('system', event => showSystemInfo(JSON.parse(event.data)));
+      events.addEventListener('motion', event => {
+        const data = JSON.parse(event.data);
+        document.getElementById('motion').textContent = data.moving ? 'Motion: now' :
+          `Motion: last at ${new Date(data.timestamp * 1000).toLocaleTimeString()}`;
+      });
+      events.addEventListener('recorder', event => {
+        const data = JSON.parse(event.data);
+        document.getElementById('recorder').textContent = `Recorder: ${data.state.replace(/_/g, ' ')}`;
+      });
+    }
+
+    // Live view: binary WebSocket frames when available, MJPEG otherwise
+    let streamSocket = null;
+    function startStream() {
+      const img = document.getElementById('stream');
+      if (!('WebSocket' in window)) {
+        img.src = 'stream.mjpg';
+        return;
+      }
+      const url = new URL('ws/stream', window.location.href);
+      url.protocol = url.protocol === 'https:' ? 'wss:' : 'ws:';
+      const ws = new WebSocket(url);
+      ws.binaryType = 'arraybuffer';
+      let gotFrame = false;
+      ws.onopen = () => {
+        if (document.hidden) ws.send(JSON.stringify({cmd: 'pause'}));
+      };
+      ws.onmessage = (event) => {
+        gotFrame = true;
+        // Header: version (u8), sequence (u32), capture time (f64, epoch s), motion (f32); then JPEG
+        const view = new DataView(event.data);
+        const captured = view.getFloat64(5);
+        const previous = img.src;
+        img.src = URL.createObjectURL(new Blob([new Uint8Array(event.data, 17)], {type: 'image/jpeg'}));
+        if (previous.startsWith('blob:')) URL.revokeObjectURL(previous);
+        const latency = document.getElementById('latency');
+        if (latency) latency.textContent = `Latency: ${Math.max(0, Math.round(Date.now() - captured * 1000))} ms`;
+      };
+      ws.onclose = () => {
+        streamSocket = null;
+        if (!gotFrame) {
+          img.src = 'stream.mjpg';  // Server or proxy without WebSocket support
+        } else {
+          setTimeout(startStream, 2000);
+        }
+      };
+      streamSocket = ws;
+    }
+    // Hidden tabs stop costing bandwidth
+    document.addEventListener('visibilitychange', () => {
+      if (streamSocket && streamSocket.readyState === WebSocket.OPEN) {
+        streamSocket.send(JSON.stringify({cmd: document.hidden ? 'pause' : 'resume'}));
+      }
+    });
+
+    // Service answers before the camera is up: poll api/status, then start the stream
+    function waitForCamera() {
+      const latency = document.getElementById('latency');
+      fetch('api/status')
+        .then(response => response.json())
+        .then(status => {
+          if (status.state === 'starting') {
+            if (latency) latency.textContent = `Starting camera… ${Math.round(status.uptime)}s`;
+            setTimeout(waitForCamera, 1000);
+          } else if (status.state === 'failed') {
+            if (latency) latency.textContent = `Camera failed: ${status.error}`;
+          } else {
+            if (latency && status.time_to_first_frame) latency.textContent = `First frame after ${status.time_to_first_frame.toFixed(1)}s`;
+            startStream();
           }
-          // Update progress bars via explicit IDs for robustness
-          const cpuProg = document.getElementById('cpu-progress');
-          const storageProg = document.getElementById('storage-progress');
-          if (cpuProg) cpuProg.style.width = (data.cpu || 0) + '%';
-          if (storageProg) storageProg.style.width = (data.storage_percent || 0) + '%';
         })
-        .catch(err => console.log('Error fetching system info:', err));
+        .catch(() => setTimeout(waitForCamera, 2000));
+    }
+
+    // Instant rewind from the recorder's in-memory buffer; live view returns when the replay ends
+    function replay(seconds) {
+      const video = document.getElementById('replay');
+      video.src = `dvr.mp4?back=${seconds}`;
+      video.style.display = 'block';
+      document.getElementById('stream').style.display = 'none';
+      video.play().catch(() => {});
+    }
+    function backToLive() {
+      const video = document.getElementById('replay');
+      video.pause();
+      video.removeAttribute('src');
+      video.load();
+      video.style.display = 'none';
+      document.getElementById('stream').style.display = 'block';
+    }
+    function saveLast(seconds) {
+      const note = document.getElementById('dvr-note');
+      note.textContent = 'Saving…';
+      fetch(`api/dvr/save?seconds=${seconds}`, {method: 'POST'})
+        .then(response => {
+          if (!response.ok) throw new Error(response.statusText);
+          return response.json();
+        })
+        .then(data => {
+          note.innerHTML = `Saved <a href="${data.download}">${data.path}</a>`;
+        })
+        .catch(err => {
+          note.textContent = `Save failed: ${err.message}`;
+        });
     }
-    // Update every 2 seconds
-    setInterval(updateSystemInfo, 2000);
-    window.onload = updateSystemInfo;
+
+    window.onload = () => {
+      updateSystemInfo();
+      subscribeEvents();
+      waitForCamera();
+    };
   </script>
   <style>
     * { margin:0; padding:0; }
@@ -134,7 +252,8 @@ PAGE_INDEX = """
 <body>
   <div class="container">
     <div class="video-section">
-      <img src="stream.mjpg" />
+      <img id="stream" alt="Live stream" />
+      <video id="replay" controls muted playsinline onended="backToLive()" style="display:none; width:100%; border-radius:8px;"></video>
     </div>
     
     <div class="stats-section">
@@ -145,6 +264,7 @@ PAGE_INDEX = """
           <div class="progress-bar">
             <div class="progress-fill" id="cpu-progress" style="width: 0%"></div>
           </div>
+          <div class="uptime-note" id="latency">Latency: --</div>
         </div>
         
         <div class="stat-item">
@@ -158,7 +278,13 @@ PAGE_INDEX = """
 
         <div class="stat-item">
           <div class="stat-label">Recordings</div>
-          <a href="/recordings" style="display:inline-block; font-weight:bold; color:#0d6efd; text-decoration:none;">View recordings →</a>
+          <a href="recordings" style="display:inline-block; font-weight:bold; color:#0d6efd; text-decoration:none;">View recordings →</a>
+          <div class="uptime-note" id="recorder">Recorder: --</div>
+          <div class="uptime-note" id="motion">Motion: --</div>
+          <button class="action-button" onclick="replay(30)">Rewind 30 s</button>
+          <button class="action-button" onclick="backToLive()">Live</button>
+          <button class="action-button" onclick="saveLast(120)">Save last 2 min</button>
+          <div class="uptime-note" id="dvr-note"></div>
         </div>
       </div>
     </div>
@@ -174,52 +300,31 @@ PAGE_RECORDINGS = """
   <meta charset="utf-8">
   <meta name="viewport" content="width=device-width, initial-scale=1">
   <script>
-    let currentPage = 1;
-    let totalPages = 1;
+    let nextCursor = '';  // Keyset cursor for the next batch ('' = first batch, null = no more)
+    let loading = false;
+    let generation = 0;  // Bumped on filter changes so stale responses are dropped
+    let shown = new Set();  // Paths already listed, so live additions aren't duplicated
+    let live = true;  // New segments are added at the top (off while showing a seek result)
     const perPage = 20;
 
-    function updatePaginationUI() {
-      const paginationContainer = document.getElementById('pagination');
-      if (!paginationContainer) return;
-
-      paginationContainer.innerHTML = '';
-      
-      if (totalPages <= 1) return;
-
-      // Previous button
-      const prevBtn = document.createElement('button');
-      prevBtn.textContent = 'Previous';
-      prevBtn.disabled = currentPage === 1;
-      prevBtn.onclick = () => changePage(currentPage - 1);
-      paginationContainer.appendChild(prevBtn);
-
-      // Page numbers
-      const pageInfo = document.createElement('span');
-      pageInfo.className = 'page-info';
-      pageInfo.textContent = `Page ${currentPage} of ${totalPages}`;
-      paginationContainer.appendChild(pageInfo);
-
-      // Next button
-      const nextBtn = document.createElement('button');
-      nextBtn.textContent = 'Next';
-      nextBtn.disabled = currentPage >= totalPages;
-      nextBtn.onclick = () => changePage(currentPage + 1);
-      paginationContainer.appendChild(nextBtn);
-
-      // Refresh button
-      const refreshBtn = document.createElement('button');
-      refreshBtn.innerHTML = '&#x21bb;';
-      refreshBtn.title = 'Refresh';
-      refreshBtn.className = 'refresh-page-btn';
-      refreshBtn.onclick = () => loadRecordings();
-      paginationContainer.appendChild(refreshBtn);
-    }
-
-    function changePage(page) {
-      if (page < 1 || page > totalPages) return;
-      currentPage = page;
-      loadRecordings();
-      window.scrollTo(0, 0);
+    function updateDaySummary() {
+      // Per-day totals from api/days instead of counting every file
+      const summary = document.getElementById('pagination');
+      const date = document.getElementById('date-picker').value;
+      const tier = document.getElementById('tier-picker').value;
+      fetch(`api/days?tier=${tier}`)
+        .then(response => response.json())
+        .then(data => {
+          const day = data.days.find(d => d.date === date);
+          summary.innerHTML = '';
+          if (!day) return;
+          const info = document.createElement('span');
+          info.className = 'page-info';
+          info.textContent = `${day.count} recordings · ${(day.bytes / (1024 * 1024)).toFixed(1)} MB · ` +
+            `${day.first.split(' ')[1]} – ${day.last.split(' ')[1]}`;
+          summary.appendChild(info);
+        })
+        .catch(err => console.error('Error loading day summary:', err));
     }
 
     function getCurrentDate() {
@@ -239,14 +344,16 @@ PAGE_RECORDINGS = """
       datePicker.max = today;
       
       // Fetch the oldest recording date and set it as min date
-      fetch('/api/oldest-date')
+      fetch('api/oldest-date')
         .then(response => response.json())
         .then(data => {
-          if (data.oldest_date) {
-            datePicker.min = data.oldest_date;
+          // Archive tier reaches further back than full-rate recordings
+          const oldest = [data.oldest_date, data.oldest_archive_date].filter(Boolean).sort()[0];
+          if (oldest) {
+            datePicker.min = oldest;
             // If current date is before the oldest date, update it
-            if (new Date(datePicker.value) < new Date(data.oldest_date)) {
-              datePicker.value = data.oldest_date;
+            if (new Date(datePicker.value) < new Date(oldest)) {
+              datePicker.value = oldest;
             }
           } else {
             // If no recordings, disable the date picker
@@ -257,61 +364,147 @@ PAGE_RECORDINGS = """
           console.error('Error fetching oldest date:', err);
         });
       
-      datePicker.addEventListener('change', () => {
-        currentPage = 1;  // Reset to first page when changing date
-        loadRecordings();
-      });
+      datePicker.addEventListener('change', () => loadRecordings());  // Start over from the newest
+      document.getElementById('tier-picker').addEventListener('change', () => loadRecordings());
+      document.getElementById('label-picker').addEventListener('change', () => loadRecordings());
     }
 
     function loadRecordings() {
+      // Reset and fetch the first batch; later batches are appended as the page scrolls
+      generation++;
+      nextCursor = '';
+      loading = false;
+      shown = new Set();
+      live = true;
+      document.getElementById('recordings-container').innerHTML = '<p>Loading recordings...</p>';
+      updateDaySummary();
+      loadMore();
+    }
+
+    function renderVideo(video) {
+      shown.add(video.path);
+      const videoDiv = document.createElement('div');
+      videoDiv.className = 'video-item';
+      videoDiv.innerHTML = `
+        <div class="video-info">
+          <h3>${video.name}</h3>
+          <p><strong>Date:</strong> ${video.date}</p>
+          <p><strong>Size:</strong> ${video.size}</p>
+          ${video.labels && video.labels.length ? `<p><strong>Seen:</strong> ${video.labels.join(', ')}</p>` : ''}
+          ${video.integrity === 'broken' ? '<p class="damaged"><strong>Damaged:</strong> recording was cut off and could not be repaired</p>' : ''}
+          ${video.integrity === 'repaired' ? '<p><strong>Repaired</strong> after an interrupted recording</p>' : ''}
+        </div>
+        <a href="download/${video.path}" class="download-btn">Download</a>
+        <video class="preview" controls preload="none">
+          <source src="download/${video.path}" type="video/mp4">
+          Your browser does not support the video tag.
+        </video>
+      `;
+      return videoDiv;
+    }
+
+    function addNewest() {
+      // A segment just closed: put recordings not listed yet at the top (only when viewing today)
+      const date = document.getElementById('date-picker').value;
+      const tier = document.getElementById('tier-picker').value;
+      const label = document.getElementById('label-picker').value;
+      if (!live || tier !== 'full' || date !== getCurrentDate()) return;
+      const requestGeneration = generation;
+      fetch(`api/recordings?cursor=&limit=${perPage}&date=${date}&tier=${tier}&label=${label}`)
+        .then(response => response.json())
+        .then(data => {
+          if (requestGeneration !== generation) return;
+          const container = document.getElementById('recordings-container');
+          const fresh = data.videos.filter(video => !shown.has(video.path));
+          if (!fresh.length) return;
+          if (!shown.size) container.innerHTML = '';  // Replace "No recordings found."
+          fresh.reverse().forEach(video => container.insertBefore(renderVideo(video), container.firstChild));
+          updateDaySummary();
+        })
+        .catch(err => console.error('Error adding new recordings:', err));
+    }
+
+    function loadMore() {
+      if (loading || nextCursor === null) return;
+      loading = true;
       const container = document.getElementById('recordings-container');
       const date = document.getElementById('date-picker').value;
-      container.innerHTML = '<p>Loading recordings...</p>';
-      
-      fetch(`/api/recordings?page=${currentPage}&date=${date}`)
+      const tier = document.getElementById('tier-picker').value;
+      const label = document.getElementById('label-picker').value;
+      const requestGeneration = generation;
+      const first = nextCursor === '';
+      fetch(`api/recordings?cursor=${encodeURIComponent(nextCursor)}&limit=${perPage}&date=${date}&tier=${tier}&label=${label}`)
         .then(response => response.json())
         .then(data => {
-          container.innerHTML = '';
-          
-          if (data.videos.length === 0) {
+          if (requestGeneration !== generation) return;
+          if (first) container.innerHTML = '';
+          nextCursor = data.next_cursor;
+          loading = false;
+
+          if (first && data.videos.length === 0) {
             container.innerHTML = '<p>No recordings found.</p>';
             return;
           }
           
-          data.videos.forEach(video => {
-            const videoDiv = document.createElement('div');
-            videoDiv.className = 'video-item';
-            videoDiv.innerHTML = `
+          data.videos.filter(video => !shown.has(video.path)).forEach(video => container.appendChild(renderVideo(video)));
+          checkSentinel();  // Short batch on a tall screen: keep filling
+        })
+        .catch(err => {
+          if (requestGeneration !== generation) return;
+          loading = false;
+          console.error('Error loading recordings:', err);
+          if (first) container.innerHTML = '<p>Error loading recordings. Please try again.</p>';
+        });
+    }
+
+    function checkSentinel() {
+      const sentinel = document.getElementById('pagination-bottom');
+      if (sentinel.getBoundingClientRect().top < window.innerHeight + 400) loadMore();
+    }
+    
+    function seekTo() {
+      const when = document.getElementById('seek-time').value;
+      const container = document.getElementById('recordings-container');
+      if (!when) return;
+      fetch(`api/seek?t=${encodeURIComponent(when)}`)
+        .then(response => {
+          if (!response.ok) throw new Error('No recording covers that time');
+          return response.json();
+        })
+        .then(data => {
+          container.innerHTML = `
+            <div class="video-item">
               <div class="video-info">
-                <h3>${video.name}</h3>
-                <p><strong>Date:</strong> ${video.date}</p>
-                <p><strong>Size:</strong> ${video.size}</p>
+                <h3>${data.segment}</h3>
+                <p><strong>Starts at keyframe:</strong> ${data.keyframe_at.replace('T', ' ')}</p>
               </div>
-              <a href="/download/${video.path}" class="download-btn">Download</a>
-              <video class="preview" controls>
-                <source src="/download/${video.path}" type="video/mp4">
-                Your browser does not support the video tag.
+              <a href="download/${data.path}" class="download-btn">Download</a>
+              <video class="preview" controls autoplay muted>
+                <source src="${data.url}" type="video/mp4">
               </video>
-            `;
-            container.appendChild(videoDiv);
-          });
-
-          // Update pagination state
-          if (data.pagination) {
-            totalPages = data.pagination.total_pages;
-            currentPage = data.pagination.current_page;
-            updatePaginationUI();
-          }
+            </div>
+          `;
+          document.getElementById('pagination').innerHTML = '';
+          generation++;  // Drop any batch still in flight
+          nextCursor = null;  // Stop infinite scroll while showing a seek result
+          live = false;
         })
         .catch(err => {
-          console.error('Error loading recordings:', err);
-          container.innerHTML = '<p>Error loading recordings. Please try again.</p>';
+          container.innerHTML = `<p>${err.message}</p>`;
         });
     }
-    
+
     window.onload = () => {
       setupDatePicker();
       loadRecordings();
+      // Load the next batch when the bottom sentinel nears the viewport
+      new IntersectionObserver(entries => {
+        if (entries[0].isIntersecting) loadMore();
+      }, { rootMargin: '400px' }).observe(document.getElementById('pagination-bottom'));
+      // New segments appear as they close instead of waiting for Refresh
+      if ('EventSource' in window) {
+        new EventSource('events').addEventListener('segment', addNewest);
+      }
     };
   </script>
   <style>
@@ -418,7 +611,9 @@ PAGE_RECORDINGS = """
       color: #333;
     }
 
-    .date-filter input[type="date"] {
+    .date-filter input[type="date"],
+    .date-filter input[type="datetime-local"],
+    .date-filter select {
       padding: 8px 12px;
       border: 1px solid #ddd;
       border-radius: 4px;
@@ -440,6 +635,9 @@ PAGE_RECORDINGS = """
     .video-info {
       grid-area: info;
     }
+    .damaged {
+      color: #b02a37;
+    }
     .download-btn {
       grid-area: download;
       justify-self: end;
@@ -481,8 +679,24 @@ PAGE_RECORDINGS = """
     <div class="date-filter">
       <label for="date-picker">Filter by Date:</label>
       <input type="date" id="date-picker">
+      <label for="tier-picker">Tier:</label>
+      <select id="tier-picker">
+        <option value="full">Full rate</option>
+        <option value="archive">Archive</option>
+      </select>
+      <label for="label-picker">Detected:</label>
+      <select id="label-picker">
+        <option value="">Anything</option>
+        <option value="person">Person</option>
+        <option value="vehicle">Vehicle</option>
+      </select>
+    </div>
+    <div class="date-filter">
+      <label for="seek-time">Jump to time:</label>
+      <input type="datetime-local" id="seek-time" step="1">
+      <button class="refresh-btn" onclick="seekTo()">Go</button>
     </div>
-    <a href="/" class="back-link">← Back to Live Feed</a>
+    <a href="./" class="back-link">← Back to Live Feed</a>
     <button class="refresh-btn" onclick="loadRecordings()">Refresh</button>
   </div>
   <div class="container">
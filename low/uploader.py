@@ -0,0 +1,267 @@
+import base64  # WebDAV basic auth
+import http.client  # WebDAV PUT with a streamed body
+import logging  # Upload failures
+import os  # Paths and file sizes
+import queue  # Pending uploads
+import threading  # Upload workers
+import time  # Retry pacing
+from datetime import datetime, timedelta  # Startup sweep window
+from urllib.parse import urlparse  # WebDAV endpoint parsing
+
+try:
+    import boto3  # Optional: S3-compatible targets (AWS, MinIO)
+except ImportError:
+    boto3 = None
+
+from . import metadata  # Per-segment "uploaded" markers
+from .shaping import RateLimiter  # Token bucket shared with the HTTP bulk routes
+from .config import (UPLOAD_CONCURRENCY, UPLOAD_RATE_BYTES, UPLOAD_RATE_WITH_VIEWERS,
+                     UPLOAD_PART_BYTES)
+
+CHUNK = 64 * 1024  # Granularity of rate limiting
+RETRY_SECONDS = 30  # Wait before re-queueing a failed upload
+SWEEP_DAYS = 7  # Startup sweep looks this many days back for segments never uploaded
+
+
+class ThrottledReader:
+    # File-like wrapper that paces reads through the shared RateLimiter
+    def __init__(self, f, limiter, length=None):
+        self.f = f
+        self.limiter = limiter
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > CHUNK:
+            size = CHUNK
+        if self.remaining is not None:
+            size = min(size, self.remaining)
+        data = self.f.read(size)
+        if data:
+            self.limiter.consume(len(data))
+            if self.remaining is not None:
+                self.remaining -= len(data)
+        return data
+
+    def __len__(self):
+        return self.remaining or 0
+
+
+class DirectoryTarget:
+    # rsync-style copy to a mounted NAS path; resumes from a partial .part file
+    def __init__(self, path):
+        self.path = path
+
+    def upload(self, local_path, key, limiter, state):
+        dest = os.path.join(self.path, key)
+        part = dest + '.part'
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        size = os.path.getsize(local_path)
+        if os.path.exists(dest) and os.path.getsize(dest) == size:
+            return {}
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        if offset > size:
+            offset = 0
+        with open(local_path, 'rb') as src, open(part, 'ab' if offset else 'wb') as dst:
+            src.seek(offset)  # Resume where the previous attempt stopped
+            reader = ThrottledReader(src, limiter)
+            while True:
+                chunk = reader.read(CHUNK)
+                if not chunk:
+                    break
+                dst.write(chunk)
+        os.replace(part, dest)
+        return {}
+
+
+class S3Target:
+    # S3-compatible object store (MinIO for local testing) with resumable multipart uploads
+    def __init__(self, bucket, endpoint=None, access_key=None, secret_key=None, region='us-east-1', prefix=''):
+        if boto3 is None:
+            raise RuntimeError('S3 upload target requires boto3 (pip install boto3)')
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client('s3', endpoint_url=endpoint, aws_access_key_id=access_key,
+                                   aws_secret_access_key=secret_key, region_name=region)
+
+    def upload(self, local_path, key, limiter, state):
+        key = self.prefix + key
+        size = os.path.getsize(local_path)
+        upload_id = state.get('upload_id')
+        done = {}
+        if upload_id:
+            # Resume: skip parts the store already has
+            try:
+                listing = self.client.list_parts(Bucket=self.bucket, Key=key, UploadId=upload_id)
+                done = {p['PartNumber']: p['ETag'] for p in listing.get('Parts', [])}
+            except Exception:
+                upload_id = None
+        if not upload_id:
+            upload_id = self.client.create_multipart_upload(Bucket=self.bucket, Key=key)['UploadId']
+            metadata.update(local_path, upload_id=upload_id)  # Survives restarts for resumption
+        parts = []
+        with open(local_path, 'rb') as f:
+            number = 1
+            for offset in range(0, max(size, 1), UPLOAD_PART_BYTES):
+                length = min(UPLOAD_PART_BYTES, size - offset)
+                if number in done:
+                    parts.append({'PartNumber': number, 'ETag': done[number]})
+                else:
+                    f.seek(offset)
+                    reader = ThrottledReader(f, limiter, length)
+                    body = b''.join(iter(lambda: reader.read(CHUNK), b''))  # Paced read, then one request
+                    response = self.client.upload_part(Bucket=self.bucket, Key=key, UploadId=upload_id,
+                                                       PartNumber=number, Body=body, ContentLength=length)
+                    parts.append({'PartNumber': number, 'ETag': response['ETag']})
+                number += 1
+        self.client.complete_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id,
+                                              MultipartUpload={'Parts': parts})
+        return {'upload_id': None}
+
+
+class WebDAVTarget:
+    # Plain PUT per segment (WebDAV has no standard resume; segments are small)
+    def __init__(self, url, username=None, password=None):
+        self.url = urlparse(url.rstrip('/'))
+        self.auth = None
+        if username:
+            self.auth = 'Basic ' + base64.b64encode(f"{username}:{password or ''}".encode()).decode()
+
+    def _request(self, method, path, body=None, length=0):
+        conn_cls = http.client.HTTPSConnection if self.url.scheme == 'https' else http.client.HTTPConnection
+        conn = conn_cls(self.url.netloc, timeout=60)
+        headers = {'Content-Length': str(length)}
+        if self.auth:
+            headers['Authorization'] = self.auth
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        finally:
+            conn.close()
+
+    def upload(self, local_path, key, limiter, state):
+        # Create parent collections (405 = already exists)
+        parts = key.split('/')[:-1]
+        for i in range(1, len(parts) + 1):
+            self._request('MKCOL', f"{self.url.path}/{'/'.join(parts[:i])}")
+        size = os.path.getsize(local_path)
+        with open(local_path, 'rb') as f:
+            status = self._request('PUT', f"{self.url.path}/{key}", ThrottledReader(f, limiter), size)
+        if status not in (200, 201, 204):
+            raise IOError(f'WebDAV PUT returned {status}')
+        return {}
+
+
+def make_target(spec):
+    spec = dict(spec)
+    kind = spec.pop('type')
+    if kind == 'directory':
+        return DirectoryTarget(**spec)
+    if kind == 's3':
+        return S3Target(**spec)
+    if kind == 'webdav':
+        return WebDAVTarget(**spec)
+    raise ValueError(f'Unknown upload target type: {kind}')
+
+
+class SegmentUploader:
+    # Ships finalized segments to the target with bounded concurrency and shared bandwidth limits
+    def __init__(self, target, recordings_dir, key_prefix='', viewers=None,
+                 concurrency=UPLOAD_CONCURRENCY, rate=UPLOAD_RATE_BYTES, rate_with_viewers=UPLOAD_RATE_WITH_VIEWERS):
+        self.target = target
+        self.recordings_dir = recordings_dir
+        self.key_prefix = key_prefix  # e.g. 'cam/1/' so cameras don't collide on the target
+        self.limiter = RateLimiter(rate, rate_with_viewers, viewers)
+        self.queue = queue.Queue()
+        self.pending = {}  # path → (size, mtime_ns) queued; a rewritten file (repair) is queued again
+        self.active = set()  # Paths a worker is uploading right now: never two writers on one target file
+        self.deferred = set()  # Paths dequeued while active; re-queued once that upload finishes
+        self.lock = threading.Lock()
+        self.uploaded = 0
+        self.failed = 0
+        self.bytes_uploaded = 0
+        self.workers = [threading.Thread(target=self._worker, daemon=True) for _ in range(max(1, concurrency))]
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+        threading.Thread(target=self.sweep, daemon=True).start()
+
+    def _version(self, segment_path):
+        try:
+            st = os.stat(segment_path)
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime_ns
+
+    def enqueue(self, segment_path):
+        # Segment listener entry point
+        version = self._version(segment_path)
+        with self.lock:
+            if segment_path in self.pending and self.pending[segment_path] == version:
+                return
+            self.pending[segment_path] = version
+        self.queue.put(segment_path)
+
+    def sweep(self, days=SWEEP_DAYS):
+        # Queue recent segments that were never uploaded (e.g. target was down, or process restarted)
+        today = datetime.now().date()
+        for offset in range(days, -1, -1):
+            day_dir = os.path.join(self.recordings_dir, (today - timedelta(days=offset)).strftime('%Y-%m-%d'))
+            if not os.path.isdir(day_dir):
+                continue
+            day_meta = metadata.load_day(day_dir)
+            names = sorted(entry.name for entry in os.scandir(day_dir) if entry.name.endswith('.mp4'))
+            if not offset:
+                names = names[:-1]  # Today's newest file may still be recording; its listener will queue it
+            for name in names:
+                if not day_meta.get(name, {}).get('uploaded'):
+                    self.enqueue(os.path.join(day_dir, name))
+
+    def _worker(self):
+        while True:
+            segment_path = self.queue.get()
+            with self.lock:
+                if segment_path in self.active:  # e.g. start-up sweep and repair listener both queued it
+                    self.deferred.add(segment_path)
+                    self.queue.task_done()
+                    continue
+                self.active.add(segment_path)
+            try:
+                with self.lock:
+                    queued = segment_path in self.pending
+                version = self._version(segment_path)
+                if queued and version:  # Not pending: an earlier entry already sent this version; gone: retention
+                    key = self.key_prefix + os.path.relpath(segment_path, self.recordings_dir).replace(os.sep, '/')
+                    fields = self.target.upload(segment_path, key, self.limiter, metadata.get(segment_path))
+                    metadata.update(segment_path, uploaded=True, uploaded_at=time.time(), **fields)
+                    with self.lock:
+                        self.uploaded += 1
+                        self.bytes_uploaded += version[0]
+                with self.lock:
+                    if self.pending.get(segment_path) in (version, None):
+                        self.pending.pop(segment_path, None)  # Else rewritten meanwhile: its own entry uploads it
+            except Exception as e:
+                with self.lock:
+                    self.failed += 1
+                logging.warning('Upload of %s failed: %s', segment_path, str(e))
+                # Still pending: retried later (and resumed from partial progress where the target supports it)
+                threading.Timer(RETRY_SECONDS, self.queue.put, args=(segment_path,)).start()
+            finally:
+                with self.lock:
+                    self.active.discard(segment_path)
+                    if segment_path in self.deferred:
+                        self.deferred.discard(segment_path)
+                        self.queue.put(segment_path)  # Uploads the repaired version if it changed meanwhile
+                self.queue.task_done()
+
+    def status(self):
+        with self.lock:
+            return {
+                'queued': self.queue.qsize(),
+                'uploaded': self.uploaded,
+                'failed': self.failed,
+                'bytes_uploaded': self.bytes_uploaded,
+                'rate_bytes': self.limiter.current_rate(),
+            }
@@ -0,0 +1,77 @@
+import base64  # Sec-WebSocket-Accept encoding
+import hashlib  # Sec-WebSocket-Accept digest
+import struct  # Frame and header packing
+
+WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'  # RFC 6455 handshake constant
+
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+# Binary frame header sent before each JPEG: version, sequence, capture time (epoch s), motion score
+FRAME_HEADER = struct.Struct('!BIdf')
+FRAME_HEADER_VERSION = 1
+
+
+def accept_key(key: str) -> str:
+    digest = hashlib.sha1((key.strip() + WS_GUID).encode('ascii')).digest()
+    return base64.b64encode(digest).decode('ascii')
+
+
+def handshake(handler) -> bool:
+    # Complete the upgrade on a BaseHTTPRequestHandler; returns False if the request isn't a WebSocket
+    key = handler.headers.get('Sec-WebSocket-Key')
+    if not key or 'websocket' not in handler.headers.get('Upgrade', '').lower():
+        return False
+    # Written raw: the 101 status line must say HTTP/1.1 whatever the handler's protocol_version
+    handler.wfile.write(
+        b'HTTP/1.1 101 Switching Protocols\r\n'
+        b'Upgrade: websocket\r\n'
+        b'Connection: Upgrade\r\n'
+        b'Sec-WebSocket-Accept: ' + accept_key(key).encode('ascii') + b'\r\n\r\n'
+    )
+    handler.wfile.flush()
+    handler.close_connection = True  # Socket belongs to the WebSocket from here on
+    return True
+
+
+def send_frame(wfile, payload: bytes, opcode: int = OP_BINARY):
+    # Server → client frames are unmasked and unfragmented
+    length = len(payload)
+    if length < 126:
+        header = struct.pack('!BB', 0x80 | opcode, length)
+    elif length < 1 << 16:
+        header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+    wfile.write(header + payload)
+    wfile.flush()
+
+
+def _read_exact(rfile, size):
+    data = rfile.read(size)
+    if len(data) < size:
+        raise ConnectionError('WebSocket closed')
+    return data
+
+
+def read_frame(rfile):
+    # Returns (opcode, payload) for one client frame; client frames are always masked
+    first, second = _read_exact(rfile, 2)
+    opcode = first & 0x0F
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack('!H', _read_exact(rfile, 2))[0]
+    elif length == 127:
+        length = struct.unpack('!Q', _read_exact(rfile, 8))[0]
+    mask = _read_exact(rfile, 4) if second & 0x80 else None
+    payload = _read_exact(rfile, length) if length else b''
+    if mask:
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return opcode, payload
+
+
+def pack_stream_frame(sequence: int, timestamp: float, motion: float, jpeg: bytes) -> bytes:
+    return FRAME_HEADER.pack(FRAME_HEADER_VERSION, sequence & 0xFFFFFFFF, timestamp or 0.0, motion or 0.0) + jpeg
@@ -0,0 +1,74 @@
+import threading  # Free-slot accounting for the ring
+from concurrent.futures import ProcessPoolExecutor  # CPU-heavy stages outside the GIL
+from multiprocessing import shared_memory  # Zero-pickle frame hand-off
+
+import numpy as np  # Views over shared memory slots
+
+
+_attached = {}  # Worker-side cache: shared memory name → SharedMemory
+
+
+def _attach(name):
+    shm = _attached.get(name)
+    if shm is None:
+        shm = shared_memory.SharedMemory(name=name)  # Pool workers share the parent's resource tracker
+        _attached[name] = shm
+    return shm
+
+
+def _run_on_slot(fn, name, offset, shape, dtype, args):
+    # Runs in a worker process: view the frame in place, no copy, no unpickling of pixels
+    shm = _attach(name)
+    frame = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+    return fn(frame, *args)
+
+
+class SharedFrameRing:
+    # Fixed-size slots in one shared memory segment; frames are copied in once by the producer
+    def __init__(self, slot_bytes: int, slots: int = 4):
+        self.slot_bytes = int(slot_bytes)
+        self.slots = int(slots)
+        self.shm = shared_memory.SharedMemory(create=True, size=self.slot_bytes * self.slots)
+        self.free = threading.Semaphore(self.slots)  # Blocks producers when all slots are in flight
+        self.lock = threading.Lock()
+        self.next_slot = 0
+
+    def put(self, frame):
+        # Copy frame into the next free slot; returns its byte offset
+        self.free.acquire()
+        with self.lock:
+            slot = self.next_slot
+            self.next_slot = (self.next_slot + 1) % self.slots
+        offset = slot * self.slot_bytes
+        view = np.ndarray(frame.shape, dtype=frame.dtype, buffer=self.shm.buf, offset=offset)
+        view[...] = frame
+        return offset
+
+    def release(self, _future=None):
+        self.free.release()
+
+    def close(self):
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class ProcessFramePool:
+    # Executor-like facade: submit(fn, frame) runs fn(frame) in a process via the shared ring
+    def __init__(self, executor: ProcessPoolExecutor, ring: SharedFrameRing):
+        self.executor = executor
+        self.ring = ring
+
+    def submit(self, fn, frame, *args):
+        if frame.nbytes > self.ring.slot_bytes:
+            # Frame outgrew the slots (e.g. after a reconfigure); fall back to pickling
+            return self.executor.submit(fn, frame, *args)
+        offset = self.ring.put(frame)
+        future = self.executor.submit(_run_on_slot, fn, self.ring.shm.name, offset, frame.shape, frame.dtype.str, args)
+        future.add_done_callback(self.ring.release)  # Slot is reusable once the worker is done
+        return future
+
+    def close(self):
+        self.ring.close()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+import os
+import shutil
+import subprocess
+import tempfile
+from datetime import datetime, timedelta
+
+# Import settings from the project's config
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from low.config import ARCHIVE_SUBDIR, ARCHIVE_AFTER_DAYS, ARCHIVE_MODE, TIMELAPSE_FACTOR
+from low.integrity import check_segment
+from scripts.maintenance import recording_roots
+
+
+def _ffmpeg_args(mode, list_file, out_file):
+    # Concatenate the day's segments (concat demuxer, no re-mux per file) and decimate
+    base = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-f', 'concat', '-safe', '0']
+    if mode == 'timelapse':
+        return base + ['-i', list_file, '-an',
+                       '-vf', f"select='not(mod(n\\,{TIMELAPSE_FACTOR}))',setpts=N/FRAME_RATE/TB",
+                       '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '30',
+                       '-f', 'mp4', out_file]
+    # Keyframes: drop every non-IDR packet with stream copy, no decode or encode at all
+    return base + ['-i', list_file, '-an', '-c:v', 'copy', '-bsf:v', 'noise=drop=not(key)',
+                   '-f', 'mp4', out_file]
+
+
+def _ffmpeg_fallback_args(list_file, out_file):
+    # Older ffmpeg without the noise bsf drop expression: decode keyframes only, re-encode them
+    return ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-f', 'concat', '-safe', '0',
+            '-skip_frame', 'nokey', '-i', list_file, '-an', '-fps_mode', 'vfr',
+            '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '28', '-f', 'mp4', out_file]
+
+
+def archive_day(day_dir, archive_dir, mode=ARCHIVE_MODE):
+    """
+    Reduce one day of full-rate segments to a single archive file.
+
+    Args:
+        day_dir (str): YYYY-MM-DD directory with recording_*.mp4 segments
+        archive_dir (str): Archive root for the camera (<recordings>/archive)
+        mode (str): 'keyframes' or 'timelapse'
+
+    Returns:
+        str or None: Path of the archive file, or None if nothing was written
+    """
+    day = os.path.basename(day_dir)
+    out_dir = os.path.join(archive_dir, day)
+    out_file = os.path.join(out_dir, f"{mode}_{day.replace('-', '')}.mp4")
+    if os.path.exists(out_file):
+        return None  # Already archived
+
+    segments = []
+    for path in sorted(entry.path for entry in os.scandir(day_dir)
+                       if entry.is_file() and entry.name.endswith('.mp4')):
+        ok, reason = check_segment(path)  # One cut-off segment would make the whole concat fail
+        if ok:
+            segments.append(path)
+        else:
+            print(f"Skipping damaged segment {path}: {reason}")
+    if not segments:
+        return None
+
+    os.makedirs(out_dir, exist_ok=True)
+    part_file = f"{out_file}.part"
+    with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as list_file:
+        for segment in segments:
+            list_file.write(f"file '{os.path.abspath(segment)}'\n")
+    try:
+        # Lowest CPU priority so the live stream and recorder are never starved
+        run = lambda args: subprocess.run(args, preexec_fn=lambda: os.nice(19), capture_output=True, text=True)
+        result = run(_ffmpeg_args(mode, list_file.name, part_file))
+        if result.returncode != 0 and mode == 'keyframes':
+            result = run(_ffmpeg_fallback_args(list_file.name, part_file))
+        if result.returncode != 0:
+            print(f"ffmpeg failed for {day_dir}: {result.stderr.strip()}")
+            if os.path.exists(part_file):
+                os.remove(part_file)
+            return None
+        os.replace(part_file, out_file)
+        return out_file
+    finally:
+        os.remove(list_file.name)
+
+
+def archive_old_recordings(after_days=ARCHIVE_AFTER_DAYS, mode=ARCHIVE_MODE):
+    """
+    Archive every day directory older than the specified number of days.
+
+    Args:
+        after_days (int): Days of full-rate recordings to leave untouched
+        mode (str): 'keyframes' or 'timelapse'
+    """
+    now = datetime.now()
+    print("\n" + "-" * 80)
+    print(f"Running archive job on {now.strftime('%d-%m-%Y at %H:%M:%S')}")
+    print("-" * 20)
+
+    if not shutil.which('ffmpeg'):
+        print("ffmpeg not found; nothing archived")
+        return
+
+    cutoff_date = (now - timedelta(days=after_days)).date()
+    print(f"\nArchiving ({mode}) recordings older than {cutoff_date.strftime('%Y-%m-%d')}")
+
+    archived = 0
+    source_bytes = 0
+    archive_bytes = 0
+    for root in recording_roots():
+        archive_dir = os.path.join(root, ARCHIVE_SUBDIR)
+        for entry in os.scandir(root):
+            if not entry.is_dir():
+                continue
+            try:
+                dir_date = datetime.strptime(entry.name, '%Y-%m-%d').date()
+            except ValueError:
+                continue  # Skip directories that don't match the date format
+            if dir_date >= cutoff_date:
+                continue
+
+            out_file = archive_day(entry.path, archive_dir, mode)
+            if out_file:
+                day_bytes = sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+                out_bytes = os.path.getsize(out_file)
+                ratio = out_bytes / day_bytes * 100 if day_bytes else 0
+                print(f"Archived {entry.path} -> {out_file} ({out_bytes / (1024*1024):.2f} MB, {ratio:.1f}% of original)")
+                archived += 1
+                source_bytes += day_bytes
+                archive_bytes += out_bytes
+
+    print("\nArchive complete!")
+    print(f"Archived {archived} days")
+    if source_bytes:
+        print(f"Archive size is {archive_bytes / source_bytes * 100:.1f}% of the original footage")
+
+
+if __name__ == "__main__":
+    archive_old_recordings()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import time
+from datetime import datetime, timedelta
+
+# Import settings from the project's config
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from low.config import RECORDINGS_DIR
+from low.integrity import inspect_segment, repair_segment
+from low.keyframes import SEGMENT_NAME
+from low import metadata
+from scripts.maintenance import recording_roots
+
+
+def check_recordings(days=1, repair=True, root=RECORDINGS_DIR, log=print):
+    """Check (and repair) the segments of the last `days` days in every camera's recordings directory.
+
+    The newest segment of today is skipped: it may still be recording.
+    """
+    report = {'checked': 0, 'ok': 0, 'repaired': 0, 'broken': 0, 'seconds': 0.0}
+    started = time.monotonic()
+    today = datetime.now().date()
+    for recordings_dir in recording_roots(root):
+        for offset in range(days, -1, -1):
+            day_dir = os.path.join(recordings_dir, (today - timedelta(days=offset)).strftime('%Y-%m-%d'))
+            if not os.path.isdir(day_dir):
+                continue
+            names = sorted(entry.name for entry in os.scandir(day_dir) if SEGMENT_NAME.match(entry.name))
+            if not offset:
+                names = names[:-1]
+            for name in names:
+                path = os.path.join(day_dir, name)
+                reason, index = inspect_segment(path)
+                report['checked'] += 1
+                if reason is None:
+                    report['ok'] += 1
+                    if metadata.get(path).get('integrity') != 'ok':  # Re-runs don't touch known-good segments
+                        metadata.update(path, integrity='ok', integrity_error=None)
+                elif repair and repair_segment(path):
+                    report['repaired'] += 1
+                    _, index = inspect_segment(path)
+                    fields = {'duration': index['duration'], 'keyframes': index['keyframes']} if index else {}
+                    metadata.update(path, integrity='repaired', integrity_error=reason, **fields)
+                    log(f"Repaired {path} ({reason})")
+                else:
+                    report['broken'] += 1
+                    if repair:
+                        metadata.update(path, integrity='broken', integrity_error=reason)
+                    log(f"{'Unplayable' if repair else 'Damaged'}: {path} ({reason})")
+    report['seconds'] = round(time.monotonic() - started, 3)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check recorded segments and repair ones cut off mid-recording')
+    parser.add_argument('--days', type=int, default=1, help='days back to check besides today')
+    parser.add_argument('--check-only', action='store_true', help='report damaged segments without repairing')
+    args = parser.parse_args(argv)
+
+    report = check_recordings(days=args.days, repair=not args.check_only)
+    print(f"\nChecked {report['checked']} segments in {report['seconds']:.2f}s: {report['ok']} ok, "
+          f"{report['repaired']} repaired, {report['broken']} {'unplayable' if not args.check_only else 'damaged'}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -1,54 +1,23 @@
 import os
-import re
-from datetime import datetime
-import shutil
+import sys
 
-# Configuration
-RECORDINGS_DIR = 'recordings'  # Change this to your recordings directory path if different
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from low.config import RECORDINGS_DIR  # Change RECORDINGS_DIR in low/config.py if different
+from scripts.maintenance import organize_flat
 
-def extract_date(filename):
-    """Extract date from filename (format: 'recording_YYYYMMDD_HHMMSS.mp4')"""
-    match = re.match(r'recording_(\d{4})(\d{2})(\d{2})_', filename)
-    if match:
-        year, month, day = match.groups()
-        return f"{year}-{month}-{day}"  # Format as YYYY-MM-DD for folder names
-    return None
-
-def organize_videos():
+def organize_videos(dry_run=False):
+    """Move flat recording_YYYYMMDD_HHMMSS.mp4 files into YYYY-MM-DD folders (batched renames)."""
     if not os.path.exists(RECORDINGS_DIR):
         print(f"Error: Directory '{RECORDINGS_DIR}' not found.")
         return
 
-    # Get all mp4 files
-    files = [f for f in os.listdir(RECORDINGS_DIR) if f.endswith('.mp4')]
-    
-    if not files:
+    result = organize_flat(RECORDINGS_DIR, dry_run=dry_run)
+    if not result['moved'] and not result['skipped']:
         print("No MP4 files found in the directory.")
         return
 
-    moved_count = 0
-    for filename in files:
-        date_str = extract_date(filename)
-        if not date_str:
-            print(f"Skipping file (invalid format): {filename}")
-            continue
-
-        # Create date directory if it doesn't exist
-        date_dir = os.path.join(RECORDINGS_DIR, date_str)
-        os.makedirs(date_dir, exist_ok=True)
-
-        # Move file
-        src = os.path.join(RECORDINGS_DIR, filename)
-        dst = os.path.join(date_dir, filename)
-        
-        try:
-            shutil.move(src, dst)
-            print(f"Moved: {filename} -> {date_str}/")
-            moved_count += 1
-        except Exception as e:
-            print(f"Error moving {filename}: {str(e)}")
-
-    print(f"\nDone! Moved {moved_count} files into date-based folders.")
+    print(f"\nDone! {'Would move' if dry_run else 'Moved'} {result['moved']} files into date-based folders "
+          f"in {result['seconds']:.2f}s.")
 
 if __name__ == "__main__":
-    organize_videos()
\ No newline at end of file
+    organize_videos(dry_run='--dry-run' in sys.argv)
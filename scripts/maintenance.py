@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+import argparse
+import ctypes
+import os
+import platform
+import re
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+# Import settings from the project's config
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from low.config import (RECORDINGS_DIR, CAMERAS_SUBDIR, ARCHIVE_SUBDIR, ARCHIVE_DAYS_TO_KEEP, UPLOAD_TARGET,
+                        LOCAL_DAYS_AFTER_UPLOAD)
+from low.settings import SETTINGS
+from low import metadata
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+DAY_DIR = re.compile(r'\d{4}-\d{2}-\d{2}$')
+FLAT_NAME = re.compile(r'recording_(\d{4})(\d{2})(\d{2})_')
+DELETE_WORKERS = 2  # Parallel unlinks; SD cards gain little beyond 2-4 and the recorder needs headroom
+OPS_PER_SECOND = 200  # Cap on unlink/rename calls per second (0 = unlimited)
+RENAME_BATCH = 100  # Renames per batch before yielding to the recorder
+
+# ioprio_set syscall numbers (glibc has no wrapper)
+IOPRIO_SYSCALLS = {'x86_64': 251, 'aarch64': 30, 'armv7l': 314, 'armv6l': 314, 'i686': 289}
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_WHO_PROCESS = 1  # With a thread id it applies to that thread only
+
+
+def idle_io_priority():
+    """
+    Put the calling thread in the idle I/O class (like `ionice -c3`), so card I/O for deletes and
+    renames only happens when the recorder isn't writing. Per-thread, so it's safe in-process.
+
+    Returns:
+        bool: True if the priority was set
+    """
+    tid = threading.get_native_id()
+    number = IOPRIO_SYSCALLS.get(platform.machine())
+    if number is not None:
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            if libc.syscall(number, IOPRIO_WHO_PROCESS, tid, IOPRIO_CLASS_IDLE << 13) == 0:
+                return True
+        except (OSError, AttributeError):
+            pass
+    try:
+        return subprocess.run(['ionice', '-c', '3', '-p', str(tid)], capture_output=True).returncode == 0
+    except OSError:
+        return False
+
+
+class Pacer:
+    # Spaces filesystem operations evenly across threads (at most `rate` per second)
+    def __init__(self, rate=OPS_PER_SECOND):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.lock = threading.Lock()
+        self.next_at = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_at - now
+            self.next_at = max(now, self.next_at) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def scan_tree(path):
+    """
+    Walk a directory once with os.scandir, collecting everything a delete needs.
+
+    Args:
+        path (str): Directory to scan
+
+    Returns:
+        tuple: (files, dirs, total_bytes, video_count); dirs are listed deepest first
+    """
+    files, dirs = [], []
+    total_bytes = video_count = 0
+    stack = [path]
+    while stack:
+        current = stack.pop()
+        dirs.append(current)
+        try:
+            entries = list(os.scandir(current))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+                continue
+            files.append(entry.path)
+            try:
+                total_bytes += entry.stat(follow_symlinks=False).st_size
+            except OSError:
+                pass
+            if entry.name.lower().endswith(VIDEO_EXTENSIONS):
+                video_count += 1
+    dirs.reverse()  # Children before parents for rmdir
+    return files, dirs, total_bytes, video_count
+
+
+def _remove(path, pacer):
+    pacer.wait()
+    try:
+        os.unlink(path)
+        return True
+    except FileNotFoundError:
+        return True
+    except OSError as e:
+        print(f"Error deleting {path}: {e}")
+        return False
+
+
+def delete_paths(paths, pool, pacer):
+    """Unlink files on the bounded pool; returns the number removed."""
+    return sum(pool.map(lambda p: _remove(p, pacer), paths))
+
+
+def recording_roots(root=RECORDINGS_DIR):
+    """Yield the recordings root of every camera (legacy root plus cam/<id>)."""
+    yield root
+    cams_dir = os.path.join(root, CAMERAS_SUBDIR)
+    if os.path.isdir(cams_dir):
+        for entry in os.scandir(cams_dir):
+            if entry.is_dir():
+                yield entry.path
+
+
+def expired_days(root, days_to_keep, archive_days_to_keep, now):
+    """
+    Find day directories past their retention.
+
+    Returns:
+        list: (path, day date) for full-rate days older than days_to_keep and archive days older
+        than archive_days_to_keep
+    """
+    found = []
+    tiers = [(root, now - timedelta(days=days_to_keep)),
+             (os.path.join(root, ARCHIVE_SUBDIR), now - timedelta(days=archive_days_to_keep))]
+    for base, cutoff in tiers:
+        if not os.path.isdir(base):
+            continue
+        for entry in os.scandir(base):
+            if entry.is_dir() and DAY_DIR.match(entry.name):
+                day = datetime.strptime(entry.name, '%Y-%m-%d').date()
+                if day < cutoff.date():
+                    found.append((entry.path, day))
+    return sorted(found, key=lambda item: item[1])
+
+
+def uploaded_segments(root, now):
+    """Segments already copied off-device that are older than LOCAL_DAYS_AFTER_UPLOAD."""
+    cutoff = (now - timedelta(days=LOCAL_DAYS_AFTER_UPLOAD)).date()
+    for entry in os.scandir(root):
+        if not (entry.is_dir() and DAY_DIR.match(entry.name)):
+            continue
+        if datetime.strptime(entry.name, '%Y-%m-%d').date() >= cutoff:
+            continue
+        for name, fields in metadata.load_day(entry.path).items():
+            if fields.get('uploaded'):
+                yield os.path.join(entry.path, name)
+
+
+def organize_flat(root=RECORDINGS_DIR, dry_run=False, batch_size=RENAME_BATCH, pacer=None, log=print):
+    """
+    Move recording_YYYYMMDD_*.mp4 files sitting directly in root into YYYY-MM-DD folders.
+
+    Uses os.rename (same filesystem: a metadata update, no data copy), creates each day folder
+    once, and renames in batches with a pause between them so the recorder keeps the card.
+
+    Args:
+        root (str): Recordings directory with the flat layout
+        dry_run (bool): Only report what would move
+        batch_size (int): Renames per batch
+        pacer (Pacer): Optional rate limit shared with other maintenance work
+
+    Returns:
+        dict: moved/skipped counts and elapsed seconds
+    """
+    started = time.monotonic()
+    pacer = pacer or Pacer()
+    by_day = {}
+    skipped = 0
+    for entry in os.scandir(root):
+        if not (entry.name.endswith('.mp4') and entry.is_file()):
+            continue
+        match = FLAT_NAME.match(entry.name)
+        if not match:
+            log(f"Skipping file (invalid format): {entry.name}")
+            skipped += 1
+            continue
+        by_day.setdefault('-'.join(match.groups()), []).append(entry.name)
+
+    moved = 0
+    for day, names in sorted(by_day.items()):
+        day_dir = os.path.join(root, day)
+        if dry_run:
+            log(f"Would move {len(names)} files -> {day}/")
+            moved += len(names)
+            continue
+        os.makedirs(day_dir, exist_ok=True)
+        for i in range(0, len(names), batch_size):
+            for name in names[i:i + batch_size]:
+                pacer.wait()
+                try:
+                    os.rename(os.path.join(root, name), os.path.join(day_dir, name))
+                    moved += 1
+                except OSError as e:
+                    log(f"Error moving {name}: {e}")
+            time.sleep(0.05)  # Let queued recorder writes through between batches
+        log(f"Moved {len(names)} files -> {day}/")
+    return {'moved': moved, 'skipped': skipped, 'seconds': round(time.monotonic() - started, 3)}
+
+
+def run_maintenance(days_to_keep=None, archive_days_to_keep=ARCHIVE_DAYS_TO_KEEP, root=RECORDINGS_DIR,
+                    dry_run=False, organize=False, workers=DELETE_WORKERS, ops_per_second=OPS_PER_SECOND,
+                    throttle=True, log=print):
+    """
+    Expire old recordings (and optionally regroup flat files) across every camera.
+
+    Callable from cron (see main) or in-process; throttling only affects the calling thread and
+    the delete workers, never the rest of the camera process.
+
+    Args:
+        days_to_keep (int): Full-rate retention in days (default: days_to_keep setting)
+        archive_days_to_keep (int): Archive tier retention in days
+        root (str): Recordings root
+        dry_run (bool): Scan and report only; nothing is deleted or moved
+        organize (bool): Also move flat-layout files into day folders first
+        workers (int): Parallel deletes
+        ops_per_second (int): Cap on unlink/rename calls per second (0 = unlimited)
+        throttle (bool): Run file operations in the idle I/O class
+
+    Returns:
+        dict: Totals and per-phase timings
+    """
+    if days_to_keep is None:
+        days_to_keep = SETTINGS.days_to_keep
+    now = datetime.now()
+    started = time.monotonic()
+    report = {'dry_run': dry_run, 'deleted_dirs': 0, 'deleted_videos': 0, 'freed_bytes': 0,
+              'errors': 0, 'timings': {}}
+    pacer = Pacer(ops_per_second)
+    if throttle:
+        report['idle_io'] = idle_io_priority()
+
+    if not os.path.exists(root):
+        log(f"Recordings directory not found: {root}")
+        return report
+
+    if organize:
+        report['organize'] = organize_flat(root, dry_run=dry_run, pacer=pacer, log=log)
+        report['timings']['organize'] = report['organize']['seconds']
+
+    initializer = idle_io_priority if throttle else None
+    with ThreadPoolExecutor(max_workers=max(1, workers), initializer=initializer,
+                            thread_name_prefix='maintenance') as pool:
+        for camera_root in recording_roots(root):
+            # Whole expired days: one scan for size + count, parallel unlinks, then rmdir bottom-up
+            for day_dir, _ in expired_days(camera_root, days_to_keep, archive_days_to_keep, now):
+                phase = time.monotonic()
+                files, dirs, size, videos = scan_tree(day_dir)
+                report['timings']['scan'] = report['timings'].get('scan', 0.0) + time.monotonic() - phase
+                if dry_run:
+                    log(f"Would delete {day_dir} (size: {size / (1024*1024):.2f} MB, {videos} videos)")
+                else:
+                    phase = time.monotonic()
+                    removed = delete_paths(files, pool, pacer)
+                    for path in dirs:
+                        try:
+                            os.rmdir(path)
+                        except OSError:
+                            report['errors'] += 1
+                    report['errors'] += len(files) - removed
+                    report['timings']['delete'] = report['timings'].get('delete', 0.0) + time.monotonic() - phase
+                    log(f"Deleted {day_dir} (size: {size / (1024*1024):.2f} MB, {videos} videos)")
+                report['deleted_dirs'] += 1
+                report['deleted_videos'] += videos
+                report['freed_bytes'] += size
+
+            # Segments already copied off-device can go before the full retention period
+            if UPLOAD_TARGET:
+                segments = list(uploaded_segments(camera_root, now))
+                sizes = {}
+                for path in segments:
+                    try:
+                        sizes[path] = os.path.getsize(path)
+                    except OSError:
+                        pass
+                if dry_run:
+                    log(f"Would delete {len(sizes)} uploaded segments in {camera_root}")
+                else:
+                    removed = [p for p, ok in zip(sizes, pool.map(lambda p: _remove(p, pacer), sizes)) if ok]
+                    for path in removed:
+                        metadata.remove(path)
+                    sizes = {p: sizes[p] for p in removed}
+                report['deleted_videos'] += len(sizes)
+                report['freed_bytes'] += sum(sizes.values())
+
+    report['timings'] = {k: round(v, 3) for k, v in report['timings'].items()}
+    report['seconds'] = round(time.monotonic() - started, 3)
+    return report
+
+
+def print_report(report):
+    verb = 'Would delete' if report['dry_run'] else 'Deleted'
+    print(f"\n{'Dry run' if report['dry_run'] else 'Cleanup'} complete in {report['seconds']:.2f}s!")
+    print(f"{verb} {report['deleted_dirs']} directories")
+    print(f"{verb} {report['deleted_videos']} video files")
+    print(f"{'Would free' if report['dry_run'] else 'Freed'} {report['freed_bytes'] / (1024*1024):.2f} MB of disk space")
+    if report['timings']:
+        print('Timings: ' + ', '.join(f"{phase} {seconds:.2f}s" for phase, seconds in report['timings'].items()))
+    if report.get('errors'):
+        print(f"{report['errors']} errors")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Expire old recordings and regroup flat files')
+    parser.add_argument('--days', type=int, default=None, help='full-rate days to keep (default: settings)')
+    parser.add_argument('--archive-days', type=int, default=ARCHIVE_DAYS_TO_KEEP, help='archive days to keep')
+    parser.add_argument('--dry-run', action='store_true', help='report and time the scan only')
+    parser.add_argument('--organize', action='store_true', help='move flat recording_*.mp4 files into day folders')
+    parser.add_argument('--workers', type=int, default=DELETE_WORKERS, help='parallel deletes')
+    parser.add_argument('--ops-per-second', type=int, default=OPS_PER_SECOND, help='0 = unlimited')
+    parser.add_argument('--no-throttle', action='store_true', help='keep normal I/O priority')
+    args = parser.parse_args(argv)
+
+    now = datetime.now()
+    print("\n" + "-" * 80)
+    print(f"Running maintenance job on {now.strftime('%d-%m-%Y at %H:%M:%S')}")
+    print("-" * 20)
+    report = run_maintenance(days_to_keep=args.days, archive_days_to_keep=args.archive_days,
+                             dry_run=args.dry_run, organize=args.organize, workers=args.workers,
+                             ops_per_second=args.ops_per_second, throttle=not args.no_throttle)
+    print_report(report)
+    return report
+
+
+if __name__ == "__main__":
+    main()
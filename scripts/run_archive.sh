@@ -0,0 +1,8 @@
+#!/bin/bash
+
+# Change to the project directory
+cd "$(dirname "$0")/.."
+
+# Run the archive script (before cleanup, so aging days are archived before they expire)
+python3 -m scripts.archive_recordings
+